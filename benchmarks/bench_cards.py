@@ -0,0 +1,114 @@
+# Result card benchmark: renders cards for simulated results inline on the
+# event loop and through CardRenderer's process pool, and reports event-loop
+# lag, cards/sec and how much the content-addressed cache saves on a repeat
+# pass. Avatars come from an offline fetcher that generates a PNG per user.
+#
+#   python benchmarks/bench_cards.py --results 300 --users 100 --workers 2
+
+import argparse
+import asyncio
+import io
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from card_renderer import CardRenderer, render_card  # noqa: E402
+
+FAIRY_TYPES = ("Aos Sí", "Leprechaun", "Pooka", "Banshee", "Selkie", "Merrow")
+LAG_INTERVAL = 0.01
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+class FakeAvatarFetcher:
+    # Serves a solid-colour 256px PNG per avatar URL after a simulated CDN delay
+    def __init__(self, latency: float):
+        self.latency = latency
+        self.calls = 0
+
+    async def __call__(self, url: str) -> bytes:
+        from PIL import Image
+        self.calls += 1
+        await asyncio.sleep(self.latency)
+        rng = random.Random(url)
+        out = io.BytesIO()
+        Image.new("RGB", (256, 256), tuple(rng.randrange(256) for _ in range(3))).save(out, format="PNG")
+        return out.getvalue()
+
+
+def make_results(count: int, users: int, seed: int) -> list[tuple]:
+    # (fairy_type, fairy_name, display_name, avatar_url, avatar_key); a user keeps their name and avatar
+    rng = random.Random(seed)
+    results = []
+    for _ in range(count):
+        user = rng.randrange(users)
+        fairy_type = FAIRY_TYPES[user % len(FAIRY_TYPES)]
+        results.append((fairy_type, f"{fairy_type} Dewdrop", f"tester{user}", f"https://cdn.example/{user}.png", f"a{user}"))
+    return results
+
+
+async def monitor_lag(lags: list[float], stop: asyncio.Event):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(LAG_INTERVAL)
+        lags.append(time.perf_counter() - started - LAG_INTERVAL)
+
+
+async def measure(label: str, results: list[tuple], render_one):
+    lags: list[float] = []
+    stop = asyncio.Event()
+    monitor = asyncio.create_task(monitor_lag(lags, stop))
+    started = time.perf_counter()
+    cards = await asyncio.gather(*(render_one(*result) for result in results))
+    elapsed = time.perf_counter() - started
+    stop.set()
+    await monitor
+    lags.sort()
+    made = sum(1 for card in cards if card)
+    print(f"{label:<22}{made / elapsed:>10.0f}{elapsed:>9.2f}{percentile(lags, 0.5) * 1000:>10.1f}"
+          f"{percentile(lags, 0.99) * 1000:>10.1f}{percentile(lags, 1.0) * 1000:>10.1f}")
+
+
+async def run(args):
+    results = make_results(args.results, args.users, args.seed)
+    fetcher = FakeAvatarFetcher(args.avatar_latency)
+
+    async def inline(fairy_type, fairy_name, display_name, avatar_url, avatar_key):
+        # The naive version: fetch, then draw on the event loop
+        return render_card(fairy_type, fairy_name, display_name, await fetcher(avatar_url))
+
+    renderer = CardRenderer(fetcher, max_workers=args.workers, timeout=60.0)
+    await renderer.warm()
+
+    print(f"{args.results} results from {args.users} users, {args.workers} render workers, "
+          f"avatar latency {args.avatar_latency * 1000:.0f}ms")
+    print(f"{'':<22}{'cards/s':>10}{'wall s':>9}{'lag p50':>10}{'lag p99':>10}{'lag max':>10}")
+    await measure("inline on the loop", results, inline)
+    fetcher.calls = 0
+    await measure("process pool, cold", results, renderer.render)
+    cold_fetches = fetcher.calls
+    await measure("process pool, cached", results, renderer.render)
+    print(f"cache: {renderer.hits} hits, {renderer.misses} misses; avatar fetches {cold_fetches} cold, "
+          f"{fetcher.calls - cold_fetches} cached")
+    renderer.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare inline and pooled result card rendering.")
+    parser.add_argument("--results", type=int, default=300)
+    parser.add_argument("--users", type=int, default=100, help="Distinct users; repeat results hit the cache.")
+    parser.add_argument("--workers", type=int, default=2)
+    parser.add_argument("--avatar-latency", type=float, default=0.05)
+    parser.add_argument("--seed", type=int, default=1)
+    asyncio.run(run(parser.parse_args()))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,203 @@
+# Cluster scaling benchmark: a local fake gateway generates quiz interactions
+# for many guilds, routes each one to the worker process that owns the guild's
+# shard (same rule as Discord), and measures interactions/sec as workers are
+# added.
+#
+#   python benchmarks/bench_cluster.py --workers 1,2,4 --shards 16 --users 4000
+#
+# Fake REST latency defaults to 0, so the numbers show the per-process CPU
+# ceiling that cluster mode is meant to lift; raise --latency to add I/O wait.
+
+import argparse
+import asyncio
+import logging
+import multiprocessing
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from cluster import shard_for_guild, shard_ranges  # noqa: E402
+from fakes import FakeInteraction, FakeRest, FakeTextChannel, FakeUser  # noqa: E402
+from loadtest import MODES, import_bot  # noqa: E402
+
+BATCH_SIZE = 256  # Events per queue put; keeps pickling overhead out of the measurement
+
+
+class _UserState:
+    __slots__ = ("user", "message", "last")
+
+    def __init__(self, user_id: int):
+        self.user = FakeUser(user_id)
+        self.message = None
+        self.last = None  # Task for this user's previous click; clicks run in order
+
+
+def quiz_events(bot, mode: str, guild_id: int, user_id: int, rng: random.Random) -> list[tuple]:
+    # One user's clicks, in order: (guild_id, user_id, kind, args)
+    gender_index = rng.randrange(len(bot.gender_options))
+    realm_index = rng.randrange(len(bot.realm_options))
+    answers = [rng.randrange(len(question.options)) for question in bot.packs.current.quiz.questions]
+    events = [(guild_id, user_id, "start", ())]
+    if mode == "stateless":
+        state = str(gender_index)
+        events.append((guild_id, user_id, "state", (state,)))
+        state += str(realm_index)
+        events.append((guild_id, user_id, "state", (state,)))
+        for answer in answers:
+            state += str(answer)
+            events.append((guild_id, user_id, "state", (state,)))
+    else:
+        events.append((guild_id, user_id, "gender", (bot.gender_options[gender_index][1],)))
+        events.append((guild_id, user_id, "realm", (bot.realm_options[realm_index][0],)))
+        for question_index, answer in enumerate(answers):
+            events.append((guild_id, user_id, "answer", (answer, question_index)))
+    return events
+
+
+def worker_main(index: int, shard_ids: list[int], shard_count: int, args, inbox, outbox):
+    os.environ["SHARD_COUNT"] = str(shard_count)
+    os.environ["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    bot = import_bot(args.mode, args.users)
+    logging.disable(logging.INFO)
+    outbox.put(("ready", index))
+    handled, misrouted, cpu = asyncio.run(serve(bot, set(shard_ids), shard_count, args, inbox))
+    outbox.put(("done", index, handled, misrouted, cpu))
+
+
+async def serve(bot, shard_ids: set[int], shard_count: int, args, inbox) -> tuple[int, int, float]:
+    loop = asyncio.get_running_loop()
+    rest = FakeRest(latency=args.latency, jitter=0.0)
+    start_view = bot.StartQuizView()
+    handlers = {
+        "start": start_view.start_button.callback,
+        "gender": bot.handle_gender_selection,
+        "realm": bot.handle_realm_selection,
+        "answer": bot.handle_quiz_answer,
+        "state": lambda interaction, state: bot.handle_stateless_click(interaction, bot.pack_tag(bot.packs.current), state),
+    }
+    channels: dict[int, FakeTextChannel] = {}
+    users: dict[int, _UserState] = {}
+    handled = misrouted = 0
+    failures = []
+
+    async def click(state: _UserState, previous, guild_id: int, kind: str, handler_args: tuple):
+        if previous is not None:
+            await previous
+        channel = channels.get(guild_id)
+        if channel is None:
+            channel = channels[guild_id] = FakeTextChannel(rest)
+        interaction = FakeInteraction(rest, state.user, channel, message=state.message)
+        interaction.guild_id = guild_id
+        try:
+            await handlers[kind](interaction, *handler_args)
+        except Exception as e:
+            failures.append(e)
+        state.message = interaction.original
+
+    cpu_started = time.process_time()
+    while True:
+        batch = await loop.run_in_executor(None, inbox.get)
+        if batch is None:
+            break
+        for guild_id, user_id, kind, handler_args in batch:
+            if shard_for_guild(guild_id, shard_count) not in shard_ids:
+                misrouted += 1
+                continue
+            state = users.get(user_id)
+            if state is None:
+                state = users[user_id] = _UserState(user_id)
+            state.last = loop.create_task(click(state, state.last, guild_id, kind, handler_args))
+            handled += 1
+    await asyncio.gather(*(state.last for state in users.values() if state.last is not None))
+    await bot.outbound.flush()
+    if failures:
+        print(f"worker saw {len(failures)} handler failures, first: {failures[0]!r}", file=sys.stderr)
+    return handled, misrouted, time.process_time() - cpu_started
+
+
+def run_cluster(workers: int, args, events: list[tuple]) -> dict:
+    ctx = multiprocessing.get_context("spawn")
+    ranges = shard_ranges(args.shards, workers)
+    owner = {shard_id: i for i, shard_ids in enumerate(ranges) for shard_id in shard_ids}
+    inboxes = [ctx.Queue() for _ in ranges]
+    outbox = ctx.Queue()
+    processes = [ctx.Process(target=worker_main, args=(i, shard_ids, args.shards, args, inboxes[i], outbox))
+                 for i, shard_ids in enumerate(ranges)]
+    for process in processes:
+        process.start()
+    for _ in processes:
+        outbox.get()  # "ready": imports are done, start the clock
+
+    started = time.perf_counter()
+    pending = [[] for _ in ranges]
+    for event in events:
+        target = owner[shard_for_guild(event[0], args.shards)]
+        pending[target].append(event)
+        if len(pending[target]) >= BATCH_SIZE:
+            inboxes[target].put(pending[target])
+            pending[target] = []
+    for i, batch in enumerate(pending):
+        if batch:
+            inboxes[i].put(batch)
+        inboxes[i].put(None)
+
+    handled = misrouted = 0
+    cpu = 0.0
+    per_worker = []
+    for _ in processes:
+        _, index, worker_handled, worker_misrouted, worker_cpu = outbox.get()
+        handled += worker_handled
+        misrouted += worker_misrouted
+        cpu += worker_cpu
+        per_worker.append(worker_handled)
+    elapsed = time.perf_counter() - started
+    for process in processes:
+        process.join()
+    return {"workers": len(ranges), "handled": handled, "misrouted": misrouted, "elapsed": elapsed, "cpu": cpu,
+            "min_share": min(per_worker), "max_share": max(per_worker)}
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Measure interactions/sec as cluster workers are added.")
+    parser.add_argument("--workers", default="1,2,4", help="Comma-separated worker counts to try.")
+    parser.add_argument("--shards", type=int, default=16)
+    parser.add_argument("--guilds", type=int, default=500)
+    parser.add_argument("--users", type=int, default=4000)
+    parser.add_argument("--mode", choices=MODES, default="ephemeral")
+    parser.add_argument("--latency", type=float, default=0.0, help="Fake REST latency in seconds.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    # Only the gateway side needs bot.py here, to build the click sequences
+    bot = import_bot(args.mode, args.users)
+    logging.disable(logging.INFO)
+    rng = random.Random(args.seed)
+    # Real-looking snowflakes: the shard is taken from the timestamp bits
+    guilds = [(rng.randrange(1 << 40, 1 << 41) << 22) | rng.randrange(1 << 22) for _ in range(args.guilds)]
+    sequences = [quiz_events(bot, args.mode, rng.choice(guilds), (1 << 50) + n, rng) for n in range(args.users)]
+    # Interleave users the way a busy gateway would: everyone's first click, then everyone's second...
+    events = [sequence[step] for step in range(max(map(len, sequences))) for sequence in sequences if step < len(sequence)]
+
+    print(f"{len(events)} interactions from {args.users} users in {args.guilds} guilds, {args.shards} shards, "
+          f"mode={args.mode}, latency={args.latency * 1000:.0f}ms, {os.cpu_count()} CPUs")
+    print(f"{'workers':>8}{'interactions/s':>16}{'speedup':>9}{'wall s':>9}{'cpu s':>8}{'share min/max':>16}")
+    baseline = None
+    for workers in (int(count) for count in args.workers.split(",")):
+        result = run_cluster(workers, args, events)
+        rate = result["handled"] / result["elapsed"]
+        baseline = baseline or rate
+        print(f"{result['workers']:>8}{rate:>16.0f}{rate / baseline:>8.2f}x{result['elapsed']:>9.2f}{result['cpu']:>8.2f}"
+              f"{result['min_share']:>8}/{result['max_share']}")
+        if result["misrouted"] or result["handled"] != len(events):
+            print(f"  routing error: {result['misrouted']} misrouted, {result['handled']}/{len(events)} handled",
+                  file=sys.stderr)
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,102 @@
+# Microbenchmark for the compiled quiz layer: per-click allocation and CPU time
+# of building a question message and a result embed, before and after.
+#
+#   python benchmarks/bench_compiled_quiz.py [iterations]
+
+import os
+import random
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("CHANNEL_ID", "0")
+os.environ.setdefault("SESSION_SNAPSHOT_PATH", "")
+
+import discord  # noqa: E402
+import bot  # noqa: E402
+
+
+# --- Before: the per-click code as it was written inline in bot.py ---
+
+def question_click_inline(question_index: int):
+    q_data = bot.questions[question_index]
+    embed = discord.Embed(
+        title=f"❓ Question {question_index + 1}/{len(bot.questions)}",
+        description=f"**{q_data['question']}**",
+        color=discord.Color.dark_purple()
+    )
+    view = discord.ui.View(timeout=180)
+    for i, option_text in enumerate(q_data["options"]):
+        view.add_item(discord.ui.Button(label=option_text, style=discord.ButtonStyle.secondary, custom_id=f"quiz_option_{i}"))
+    answer = f"✅ You chose: **{q_data['options'][0]}** for \"{q_data['question']}\""
+    return embed.to_dict(), view.to_components(), answer
+
+
+def result_inline(fairy_type: str):
+    chosen_prefix = fairy_type if fairy_type in bot.prefixes else random.choice(bot.prefixes)
+    fairy_name = f"{chosen_prefix} {random.choice(bot.suffixes)}"
+    lore_snippet = bot.fairy_lore.get(fairy_type, "A mysterious and enchanting fairy, with tales yet to be widely told.")
+    embed = discord.Embed(title="✨ Your Inner Fairy Revealed! ✨", color=discord.Color.random())
+    embed.set_author(name="Tester's Fairy Form")
+    embed.add_field(name="Fairy Type", value=f"**{fairy_type}**", inline=False)
+    embed.add_field(name="Your Fairy Name", value=f"**{fairy_name}**", inline=False)
+    embed.add_field(name="Gender Chosen", value="*Other*", inline=True)
+    embed.add_field(name="Realm Chosen", value="*Druids*", inline=True)
+    embed.add_field(name="About Your Kind", value=f"*{lore_snippet}*", inline=False)
+    embed.set_footer(text="(An image of your fairy form remains shrouded in mist... for now!)")
+    return embed.to_dict()
+
+
+# --- After: the compiled templates ---
+
+def question_click_compiled(question_index: int):
+    question = bot.packs.current.quiz.questions[question_index]
+    view = discord.ui.View(timeout=180)
+    for option_text, custom_id in question.buttons:
+        view.add_item(discord.ui.Button(label=option_text, style=discord.ButtonStyle.secondary, custom_id=custom_id))
+    return question.embed.to_dict(), view.to_components(), question.answer_texts[0]
+
+
+def result_compiled(fairy_type: str):
+    fairy_name = bot.packs.current.quiz.fairy_name(fairy_type)
+    return bot.packs.current.quiz.result_embed(fairy_type, fairy_name, "Tester", None, gender="Other", realm="Druids").to_dict()
+
+
+def measure(func, args_cycle, iterations: int) -> tuple[float, float]:
+    # Returns (CPU microseconds per click, peak bytes allocated per click)
+    start = time.process_time()
+    for i in range(iterations):
+        func(args_cycle[i % len(args_cycle)])
+    cpu_us = (time.process_time() - start) / iterations * 1e6
+
+    samples = min(iterations, 2000)
+    tracemalloc.start()
+    peak_total = 0
+    for i in range(samples):
+        tracemalloc.reset_peak()
+        baseline = tracemalloc.get_traced_memory()[0]
+        func(args_cycle[i % len(args_cycle)])
+        peak_total += tracemalloc.get_traced_memory()[1] - baseline
+    tracemalloc.stop()
+    return cpu_us, peak_total / samples
+
+
+def main():
+    iterations = int(sys.argv[1]) if len(sys.argv) > 1 else 20000
+    question_indexes = list(range(len(bot.questions)))
+    fairy_types = list(bot.packs.current.quiz.results)
+
+    rows = [
+        ("question click (inline)", measure(question_click_inline, question_indexes, iterations)),
+        ("question click (compiled)", measure(question_click_compiled, question_indexes, iterations)),
+        ("result embed (inline)", measure(result_inline, fairy_types, iterations)),
+        ("result embed (compiled)", measure(result_compiled, fairy_types, iterations)),
+    ]
+    print(f"{'case':<28}{'cpu us/click':>14}{'peak bytes/click':>18}")
+    for name, (cpu_us, peak_bytes) in rows:
+        print(f"{name:<28}{cpu_us:>14.2f}{peak_bytes:>18.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,183 @@
+# Graceful drain benchmark: N users are left at random points of the quiz,
+# some of them with a click still being handled, when the bot starts draining.
+# More clicks arrive during the drain and should be turned away. It reports
+# how long the drain took and how many sessions were handed off. A second copy
+# of the bot, started the way the next process of a rolling deploy would be,
+# then loads the snapshot. Every handed-off user carries on from the buttons
+# they already had, through the fallback view, and must finish their quiz.
+#
+#   python benchmarks/bench_drain.py --users 2000 --inflight 200 --late 200 --mode channel
+#
+# Exits non-zero if a session was lost or a handed-off quiz couldn't be finished.
+
+import argparse
+import asyncio
+import importlib.util
+import logging
+import os
+import random
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeInteraction, FakeRest, FakeTextChannel, FakeUser, button_custom_ids  # noqa: E402
+from loadtest import import_bot  # noqa: E402
+
+BOT_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "bot.py")
+
+
+class Walker:
+    # One user taking the quiz; `prompt` is the ephemeral message from the start button
+    def __init__(self, channel: FakeTextChannel):
+        self.user = FakeUser()
+        self.channel = channel
+        self.prompt = None
+
+    def live_message(self, bot):
+        # The message whose buttons the user would click next
+        session = bot.user_sessions.get(self.user.id, touch=False)
+        if session is not None and session.step >= bot.STEP_QUIZ_START and not bot.EPHEMERAL_QUIZ:
+            return self.channel.messages[-1]
+        return self.prompt
+
+    async def start(self, bot, rest: FakeRest):
+        interaction = FakeInteraction(rest, self.user, self.channel)
+        await bot.StartQuizView().start_button.callback(interaction)
+        self.prompt = interaction.original
+
+    async def advance(self, bot, rest: FakeRest, rng: random.Random):
+        # Clicks one button for the session's current step
+        session = bot.user_sessions.get(self.user.id, touch=False)
+        interaction = FakeInteraction(rest, self.user, self.channel, message=self.live_message(bot))
+        if session.step == bot.STEP_AWAITING_GENDER:
+            await bot.handle_gender_selection(interaction, rng.choice(bot.gender_options)[1])
+        elif session.step == bot.STEP_AWAITING_REALM:
+            await bot.handle_realm_selection(interaction, rng.choice(bot.realm_options)[0])
+        else:
+            options = session.pack.quiz.questions[session.step].options
+            await bot.handle_quiz_answer(interaction, rng.randrange(len(options)), session.step)
+
+
+def load_next_process(snapshot_path: str):
+    # A fresh copy of bot.py with its own state, like the process that replaces the drained one
+    os.environ["SESSION_SNAPSHOT_PATH"] = snapshot_path
+    spec = importlib.util.spec_from_file_location("bot_next", BOT_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+async def run(bot, args, snapshot_path: str) -> int:
+    rng = random.Random(args.seed)
+    rest = FakeRest(latency=args.latency, jitter=args.latency / 2, rng=rng)
+    slow_rest = FakeRest(latency=args.slow, jitter=args.slow / 2, rng=rng)
+    walkers = [Walker(FakeTextChannel(rest)) for _ in range(args.users)]
+    steps = len(bot.packs.current.quiz.questions) + 2  # Gender, realm, then the questions
+
+    async def leave_midway(walker: Walker):
+        await walker.start(bot, rest)
+        for _ in range(rng.randrange(steps)):
+            await walker.advance(bot, rest, rng)
+
+    await asyncio.gather(*(leave_midway(walker) for walker in walkers))
+    await bot.outbound.flush()
+
+    # Clicks that are still being handled when the signal arrives
+    busy = rng.sample(walkers, args.inflight)
+    inflight = [asyncio.create_task(walker.advance(bot, slow_rest, rng)) for walker in busy]
+    await asyncio.sleep(0)
+    started = time.perf_counter()
+    drain = asyncio.create_task(bot.drain())
+    await asyncio.sleep(0)
+    late_users = [Walker(FakeTextChannel(rest)) for _ in range(args.late)]
+    late = [walker.start(bot, rest) for walker in late_users]
+    idle = [walker for walker in walkers if walker not in busy]
+    late += [walker.advance(bot, rest, rng) for walker in rng.sample(idle, args.late)]
+    await asyncio.gather(*late)
+    await drain
+    drain_seconds = time.perf_counter() - started
+    await asyncio.gather(*inflight)
+
+    waiting = [walker for walker in walkers if walker.user.id in bot.user_sessions]
+    print(f"{args.users} users (mode={bot.QUIZ_MODE}), {args.inflight} clicks in flight with {args.slow * 1000:.0f}ms REST, "
+          f"{2 * args.late} clicks during the drain")
+    print(f"drain: {drain_seconds:.2f}s, {bot.handed_off_sessions} sessions handed off, "
+          f"{bot.drain_turned_away.total():.0f} clicks turned away")
+    problems = []
+    if bot.handed_off_sessions != len(waiting):
+        problems.append(f"{len(waiting)} sessions open but {bot.handed_off_sessions} handed off")
+    if any(walker.user.id in bot.user_sessions for walker in late_users):
+        problems.append("a start click was let in during the drain")
+
+    # The next process loads the handed-off sessions and takes the old buttons' clicks
+    next_bot = load_next_process(snapshot_path)
+    loaded_at = time.perf_counter()
+    restored = next_bot.user_sessions.load_snapshot(resolve_pack=next_bot.packs.get)
+    scheduled = next_bot.schedule_restored_sessions()
+    load_seconds = time.perf_counter() - loaded_at
+    if scheduled != restored or len(next_bot.view_expiry) != restored:
+        problems.append(f"{len(next_bot.view_expiry)} timeout deadlines for {restored} restored sessions")
+    fallback = next_bot.HandedOffStepView()
+
+    async def carry_on(walker: Walker) -> bool:
+        message = walker.live_message(next_bot)
+        interaction = FakeInteraction(rest, walker.user, walker.channel, message=message,
+                                      custom_id=rng.choice(button_custom_ids(message.view)))
+        if not await fallback.interaction_check(interaction):
+            return False
+        await fallback.handed_off_click(interaction)
+        while walker.user.id in next_bot.user_sessions:
+            await walker.advance(next_bot, rest, rng)
+        return True
+
+    async def foreign_click(walker: Walker, other: Walker) -> bool:
+        # Someone else clicking a handed-off channel question must be refused
+        message = walker.live_message(next_bot)
+        interaction = FakeInteraction(rest, other.user, other.channel, message=message,
+                                      custom_id=button_custom_ids(message.view)[0])
+        return not await fallback.interaction_check(interaction)
+
+    at_question = [walker for walker in waiting if not walker.live_message(next_bot).flags.ephemeral]
+    pairs = [(walker, other) for walker, other in zip(at_question, reversed(waiting)) if walker is not other][:50]
+    refused = sum([await foreign_click(walker, other) for walker, other in pairs])
+    outcomes = await asyncio.gather(*(carry_on(walker) for walker in waiting))
+    await next_bot.outbound.flush()
+    finished = sum(next_bot.completed_quizzes.values())
+    print(f"next process: {restored} sessions loaded in {load_seconds * 1000:.1f}ms, {finished} quizzes finished "
+          f"from the old buttons, {refused} of {len(pairs)} foreign clicks refused")
+    if restored != len(waiting) or finished != len(waiting) or outcomes.count(False):
+        problems.append(f"{restored} loaded and {finished} finished of {len(waiting)} handed off")
+    if len(next_bot.view_expiry):
+        problems.append(f"{len(next_bot.view_expiry)} timeout deadlines left after every quiz finished")
+    if refused != len(pairs):
+        problems.append("a foreign click on a handed-off question was accepted")
+    print(f"problems: {len(problems)}")
+    for problem in problems:
+        print("  " + problem)
+    return 1 if problems else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drain the bot mid-quiz and finish the handed-off quizzes in a new copy.")
+    parser.add_argument("--users", type=int, default=2000)
+    parser.add_argument("--inflight", type=int, default=200, help="Clicks still being handled when the drain starts.")
+    parser.add_argument("--late", type=int, default=200, help="Start clicks, and as many step clicks, arriving during the drain.")
+    parser.add_argument("--mode", choices=("channel", "ephemeral"), default="channel")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mean fake REST latency in seconds.")
+    parser.add_argument("--slow", type=float, default=0.5, help="Mean fake REST latency of the in-flight clicks.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bot = import_bot(args.mode, args.users + args.late)
+    logging.disable(logging.WARNING)
+    with tempfile.TemporaryDirectory() as tmp:
+        snapshot_path = os.path.join(tmp, "sessions.sqlite3")
+        bot.user_sessions.snapshot_path = bot.SESSION_SNAPSHOT_PATH = snapshot_path
+        return asyncio.run(run(bot, args, snapshot_path))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
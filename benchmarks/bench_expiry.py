@@ -0,0 +1,114 @@
+# Quiz step expiry benchmark: N users open the quiz and never click again, so
+# every gender selection view times out. Measures how long the expiry sweep
+# takes to end all the sessions, how the "timed out" edits are spread over
+# time, event-loop lag while that happens and how many asyncio tasks are alive
+# while the views wait.
+#
+#   python benchmarks/bench_expiry.py --users 5000 --channels 100 --timeout 3 --edit-rate 200
+#
+# With --spread 0 every deadline lands on the same tick, which is the burst the
+# bounded edit rate is there to flatten.
+
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeInteraction, FakeRest, FakeTextChannel, FakeUser  # noqa: E402
+from loadtest import MODES, import_bot, percentile  # noqa: E402
+
+EDIT_ROUTES = ("PATCH message", "PATCH original response")
+
+
+class RecordingRest(FakeRest):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.edit_times: list[float] = []
+
+    async def call(self, route: str):
+        if route in EDIT_ROUTES:
+            self.edit_times.append(time.perf_counter())
+        await super().call(route)
+
+
+async def monitor_loop_lag(lags: list[float], stop: asyncio.Event, interval: float = 0.01):
+    while not stop.is_set():
+        started = time.perf_counter()
+        await asyncio.sleep(interval)
+        lags.append(time.perf_counter() - started - interval)
+
+
+async def run(bot, args) -> int:
+    rest = RecordingRest(latency=args.latency, jitter=0.0)
+    # The outbound queue runs one request at a time per channel, so spread users over several
+    channels = [FakeTextChannel(rest) for _ in range(args.channels)]
+    start_view = bot.StartQuizView()
+
+    async def open_quiz(i: int, delay: float):
+        await asyncio.sleep(delay)
+        interaction = FakeInteraction(rest, FakeUser(), channels[i % len(channels)])
+        await start_view.start_button.callback(interaction)
+
+    await asyncio.gather(*(open_quiz(i, args.spread * i / args.users) for i in range(args.users)))
+    opened = time.perf_counter()
+    waiting_tasks = len(asyncio.all_tasks())
+    print(f"{len(bot.user_sessions)} sessions waiting, {len(bot.view_expiry)} deadlines in the wheel, "
+          f"{waiting_tasks} asyncio tasks alive")
+
+    lags: list[float] = []
+    stop = asyncio.Event()
+    lag_task = asyncio.create_task(monitor_loop_lag(lags, stop))
+    sweep_seconds = []
+    rest.edit_times.clear()
+    sessions_ended = None
+    # Same cadence as the bot's tasks.loop
+    while len(bot.user_sessions) or bot.pending_timeout_edits or bot.timeout_edit_tasks:
+        started = time.perf_counter()
+        await bot.expire_views()
+        sweep_seconds.append(time.perf_counter() - started)
+        if sessions_ended is None and not len(bot.user_sessions):
+            sessions_ended = time.perf_counter()
+        await asyncio.sleep(bot.view_expiry.tick)
+    await bot.outbound.flush()
+    stop.set()
+    await lag_task
+    done = time.perf_counter()
+
+    per_second = Counter(int(t - opened) for t in rest.edit_times)
+    lags.sort()
+    print(f"after the last quiz opened: all sessions ended at {sessions_ended - opened:.1f}s, "
+          f"last timeout edit sent at {done - opened:.1f}s (timeout {args.timeout:.0f}s, spread {args.spread:.0f}s)")
+    print(f"timeout edits: {len(rest.edit_times)}, peak {max(per_second.values(), default=0)}/s "
+          f"(limit {args.edit_rate:.0f}/s)")
+    print(f"sweep: {len(sweep_seconds)} ticks, slowest {max(sweep_seconds) * 1000:.1f}ms")
+    print(f"event-loop lag: p50 {percentile(lags, 0.5) * 1000:.2f}ms, p99 {percentile(lags, 0.99) * 1000:.2f}ms, "
+          f"max {lags[-1] * 1000:.2f}ms")
+    return 0 if len(rest.edit_times) == args.users else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time out N idle quiz sessions and measure the expiry sweep.")
+    parser.add_argument("--users", type=int, default=5000)
+    parser.add_argument("--mode", choices=[mode for mode in MODES if mode != "stateless"], default="ephemeral")
+    parser.add_argument("--timeout", type=float, default=3.0, help="VIEW_TIMEOUT for this run, in seconds.")
+    parser.add_argument("--edit-rate", type=float, default=200.0, help="TIMEOUT_EDIT_RATE for this run.")
+    parser.add_argument("--spread", type=float, default=0.0, help="Seconds over which the users open the quiz.")
+    parser.add_argument("--channels", type=int, default=100, help="Quiz channels the users are spread over.")
+    parser.add_argument("--latency", type=float, default=0.05, help="Fake REST latency in seconds.")
+    args = parser.parse_args()
+
+    os.environ["VIEW_TIMEOUT"] = str(args.timeout)
+    os.environ["TIMEOUT_EDIT_RATE"] = str(args.edit_rate)
+    bot = import_bot(args.mode, args.users)
+    logging.disable(logging.INFO)
+    return asyncio.run(run(bot, args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
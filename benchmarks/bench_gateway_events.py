@@ -0,0 +1,169 @@
+# Gateway event-volume benchmark: replays one synthetic event stream from busy
+# guilds through discord.py's connection state, once per configuration: the
+# default intents, LEAN_CACHE=1 and INTERACTIONS_ONLY=1. Chat messages, edits,
+# deletes, typing, reactions and member updates make up most of the stream,
+# with a small share of button clicks. Discord only sends an event if one of
+# the bot's intents covers it, and strips message content without the
+# message_content intent. Whatever reaches the bot is JSON-decoded and parsed
+# the way the gateway does it. Each configuration runs in its own process, and
+# the report shows the CPU time and memory that 10k events cost each one.
+#
+#   python benchmarks/bench_gateway_events.py --events 50000 --guilds 20
+#
+# The clicks target a custom_id nothing listens to, so only their dispatch cost
+# counts. It is the same in every configuration.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from bench_lean_cache import guild_payload, member_payload, message_payload  # noqa: E402
+
+CONFIGS = {"default": {}, "lean": {"LEAN_CACHE": "1"}, "interactions-only": {"INTERACTIONS_ONLY": "1"}}
+# Share of each event type in the stream, and the intent Discord needs before it sends it
+EVENT_MIX = (
+    ("MESSAGE_CREATE", 0.62, "guild_messages"),
+    ("TYPING_START", 0.14, "guild_typing"),
+    ("MESSAGE_REACTION_ADD", 0.10, "guild_reactions"),
+    ("MESSAGE_UPDATE", 0.06, "guild_messages"),
+    ("MESSAGE_DELETE", 0.03, "guild_messages"),
+    ("GUILD_MEMBER_UPDATE", 0.03, "members"),
+    ("INTERACTION_CREATE", 0.02, None),
+)
+STREAM_SEED = 7
+
+
+def event_stream(count: int, guilds: list[tuple[int, int, list[int]]], content: bool):
+    # Yields (event name, intent, raw gateway frame) like the decompressed websocket text
+    rng = random.Random(STREAM_SEED)
+    names, weights, intents = zip(*EVENT_MIX)
+    intent_of = dict(zip(names, intents))
+    message_id = 1 << 52
+    now = "2024-01-01T00:00:00+00:00"
+    for seq in range(1, count + 1):
+        name = rng.choices(names, weights)[0]
+        guild_id, channel_id, member_ids = rng.choice(guilds)
+        author_id = rng.choice(member_ids)
+        member = {key: value for key, value in member_payload(author_id).items() if key != "user"}
+        if name == "MESSAGE_CREATE":
+            message_id += 1
+            data = message_payload(message_id, guild_id, channel_id, author_id)
+        elif name == "MESSAGE_UPDATE":
+            data = dict(message_payload(message_id - rng.randrange(50), guild_id, channel_id, author_id),
+                        edited_timestamp=now, content="edit: did anyone else get Selkie?")
+        elif name == "MESSAGE_DELETE":
+            data = {"id": str(message_id - rng.randrange(50)), "channel_id": str(channel_id), "guild_id": str(guild_id)}
+        elif name == "TYPING_START":
+            data = {"channel_id": str(channel_id), "guild_id": str(guild_id), "user_id": str(author_id), "timestamp": seq,
+                    "member": member_payload(author_id)}
+        elif name == "MESSAGE_REACTION_ADD":
+            data = {"user_id": str(author_id), "channel_id": str(channel_id), "message_id": str(message_id),
+                    "guild_id": str(guild_id), "emoji": {"id": None, "name": "✨"}, "member": member_payload(author_id),
+                    "type": 0, "burst": False, "message_author_id": str(author_id)}
+        elif name == "GUILD_MEMBER_UPDATE":
+            data = dict(member_payload(author_id), guild_id=str(guild_id))
+        else:
+            data = {"id": str(message_id + seq), "application_id": "1", "type": 3, "version": 1, "token": f"token-{seq}",
+                    "guild_id": str(guild_id), "channel_id": str(channel_id),
+                    "channel": {"id": str(channel_id), "type": 0, "guild_id": str(guild_id), "name": "fairy-quiz",
+                                "position": 0, "permission_overwrites": []},
+                    "member": dict(member, permissions="0"), "app_permissions": "2048", "locale": "en-US",
+                    "entitlements": [], "authorizing_integration_owners": {}, "context": 0, "attachment_size_limit": 8388608,
+                    "message": message_payload(message_id, guild_id, channel_id, 1),
+                    "data": {"custom_id": "not_a_quiz_button", "component_type": 2}}
+            data["member"]["user"] = member_payload(author_id)["user"]
+        if not content and name in ("MESSAGE_CREATE", "MESSAGE_UPDATE"):
+            data["content"] = ""  # What Discord sends without the message_content intent
+        yield name, intent_of[name], json.dumps({"op": 0, "s": seq, "t": name, "d": data})
+
+
+async def run_child(args) -> dict:
+    from loadtest import import_bot
+    bot_module = import_bot("ephemeral", 1000)
+    logging.disable(logging.WARNING)
+    client = bot_module.bot
+    await client._async_setup_hook()  # Binds the client to this loop so dispatched events can run
+    state = client._connection
+    from discord import ClientUser, utils
+    state.user = ClientUser(state=state, data={"id": "1", "username": "fairy", "discriminator": "0", "avatar": None,
+                                               "bot": True, "mfa_enabled": False, "verified": True})
+    state.application_id = 1
+    intents = client.intents
+
+    guilds = []
+    next_id = 1 << 40
+    for g in range(args.guilds):
+        guild_id, channel_id = (1 << 50) + g, (1 << 51) + g
+        state._add_guild_from_data(guild_payload(guild_id, channel_id, [], args.members))
+        guilds.append((guild_id, channel_id, list(range(next_id, next_id + args.members))))
+        next_id += args.members
+    # Frames are built up front so that only the bot's side of the work is timed
+    frames = list(event_stream(args.events, guilds, intents.message_content))
+
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    delivered = delivered_bytes = 0
+    started = time.process_time()
+    for i, (name, intent, frame) in enumerate(frames):
+        if intent is not None and not getattr(intents, intent):
+            continue  # Discord never sends it
+        delivered += 1
+        delivered_bytes += len(frame)
+        message = utils._from_json(frame)
+        state.parsers[message["t"]](message["d"])
+        if i % 100 == 0:
+            await asyncio.sleep(0)  # Let the dispatched on_message/command tasks run
+    await asyncio.sleep(0)
+    elapsed = time.process_time() - started
+
+    return {
+        "intents": intents.value,
+        "delivered": delivered,
+        "delivered_mib": delivered_bytes / 2**20,
+        "cpu_s": elapsed,
+        "rss_growth_mib": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024,
+        "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "messages": len(state._messages) if state._messages is not None else 0,
+        "users": len(state._users),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Replay a synthetic gateway event stream under each intent configuration.")
+    parser.add_argument("--events", type=int, default=50000, help="Events in the stream, before intent filtering.")
+    parser.add_argument("--guilds", type=int, default=20)
+    parser.add_argument("--members", type=int, default=500, help="Active members per guild.")
+    parser.add_argument("--config", choices=CONFIGS, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.config:
+        print(json.dumps(asyncio.run(run_child(args))))
+        return 0
+
+    per = 10_000 / args.events
+    print(f"{args.events} events from {args.guilds} guilds; costs are per 10k events of the stream")
+    print(f"{'config':<19}{'intents':>9}{'delivered':>11}{'gateway':>10}{'cpu':>10}{'rss growth':>12}{'peak rss':>10}"
+          f"{'msgs cached':>13}{'users':>8}")
+    for config, overrides in CONFIGS.items():
+        env = {**os.environ, "LEAN_CACHE": "0", "INTERACTIONS_ONLY": "0", **overrides}
+        output = subprocess.run([sys.executable, __file__, "--config", config, "--events", str(args.events),
+                                 "--guilds", str(args.guilds), "--members", str(args.members)],
+                                env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{config:<19}{r['intents']:>9}{r['delivered'] * per:>11.0f}{r['delivered_mib'] * per:>8.2f}Mi"
+              f"{r['cpu_s'] * per * 1000:>8.0f}ms{r['rss_growth_mib'] * per:>10.2f}Mi{r['rss_mib']:>8.1f}Mi"
+              f"{r['messages']:>13}{r['users']:>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
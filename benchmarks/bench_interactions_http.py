@@ -0,0 +1,237 @@
+# HTTP interactions benchmark and signed-request generator. Simulated users
+# take the quiz by POSTing Ed25519-signed MESSAGE_COMPONENT interactions, built
+# the way Discord builds them, to the bot's interactions endpoint. Each user
+# follows the buttons in the replies until the result is posted. It reports
+# requests/sec, reply latency percentiles, how many responses went out inline
+# in the HTTP reply and the REST calls left per quiz. It also checks that a
+# PING gets a PONG and that a badly signed request gets a 401.
+#
+#   python benchmarks/bench_interactions_http.py --users 500 --concurrency 50
+#
+# By default the endpoint runs in this process with a fake REST layer, so no
+# token is needed. To drive a real deployment, start it with DISCORD_PUBLIC_KEY
+# set to a key from --print-key and pass --url and --private-key. Against a
+# real deployment only the inline (EPHEMERAL_QUIZ=1) flow can be followed,
+# since the channel flow's questions arrive as channel messages.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import random
+import sys
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+import aiohttp  # noqa: E402
+from nacl.signing import SigningKey  # noqa: E402
+
+from fakes import next_snowflake  # noqa: E402
+from interactions_http import SIGNATURE_HEADER, TIMESTAMP_HEADER, sign  # noqa: E402
+from loadtest import percentile  # noqa: E402
+
+APPLICATION_ID = 1 << 41
+GUILD_ID = (1 << 42) + 7
+CHANNEL_ID = (1 << 42) + 8
+START_MESSAGE_ID = (1 << 42) + 9
+
+
+def user_payload(user_id: int) -> dict:
+    return {"id": str(user_id), "username": f"tester{user_id % 100000}", "discriminator": "0",
+            "global_name": f"Tester {user_id % 100000}", "avatar": None}
+
+
+def message_payload(message_id: int, components: list, author_id: int = APPLICATION_ID, content: str = "") -> dict:
+    return {
+        "id": str(message_id), "channel_id": str(CHANNEL_ID), "type": 0, "content": content, "components": components,
+        "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None, "tts": False, "mention_everyone": False,
+        "mentions": [], "mention_roles": [], "attachments": [], "embeds": [], "pinned": False, "flags": 0,
+        "author": {"id": str(author_id), "username": "fairy", "discriminator": "0", "avatar": None, "bot": True},
+    }
+
+
+def start_components() -> list:
+    return [{"type": 1, "components": [{"type": 2, "style": 3, "label": "Start Quiz", "custom_id": "start_quiz_button"}]}]
+
+
+def component_interaction(user_id: int, message: dict, custom_id: str) -> dict:
+    return {
+        "id": str(next_snowflake()), "application_id": str(APPLICATION_ID), "type": 3, "version": 1,
+        "token": f"token-{next_snowflake()}", "guild_id": str(GUILD_ID), "channel_id": str(CHANNEL_ID),
+        "channel": {"id": str(CHANNEL_ID), "type": 0, "guild_id": str(GUILD_ID), "name": "fairy-quiz", "position": 0,
+                    "permission_overwrites": []},
+        "member": {"user": user_payload(user_id), "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False,
+                   "mute": False, "flags": 0, "permissions": "0"},
+        "app_permissions": "2048", "locale": "en-US", "guild_locale": "en-US", "entitlements": [],
+        "authorizing_integration_owners": {"0": str(GUILD_ID)}, "context": 0, "attachment_size_limit": 8388608,
+        "message": message, "data": {"custom_id": custom_id, "component_type": 2},
+    }
+
+
+def button_ids(components: list) -> list[str]:
+    return [button["custom_id"] for row in components or [] for button in row.get("components", []) if "custom_id" in button]
+
+
+class Client:
+    def __init__(self, session: aiohttp.ClientSession, url: str, signing_key: SigningKey):
+        self.session = session
+        self.url = url
+        self.signing_key = signing_key
+        self.latencies: list[float] = []
+        self.statuses = Counter()
+
+    async def post(self, payload: dict, bad_signature: bool = False) -> tuple[int, dict | None]:
+        body = json.dumps(payload).encode()
+        timestamp = str(int(time.time()))
+        signature = sign(self.signing_key, timestamp, body)
+        if bad_signature:
+            signature = sign(self.signing_key, timestamp, body + b" ")
+        started = time.perf_counter()
+        async with self.session.post(self.url, data=body, headers={
+                SIGNATURE_HEADER: signature, TIMESTAMP_HEADER: timestamp, "Content-Type": "application/json"}) as response:
+            reply = await response.json() if response.content_type == "application/json" else None
+        self.latencies.append(time.perf_counter() - started)
+        self.statuses[response.status] += 1
+        return response.status, reply
+
+
+async def take_quiz(client: Client, user_id: int, rng: random.Random, posted: dict[int, list]) -> bool:
+    # Clicks a random button on each prompt until no prompt comes back
+    message = message_payload(START_MESSAGE_ID, start_components())
+    custom_id = "start_quiz_button"
+    for _ in range(64):
+        status, reply = await client.post(component_interaction(user_id, message, custom_id))
+        if status != 200 or reply is None:
+            return False
+        data = reply.get("data") or {}
+        if reply["type"] == 4:  # The ephemeral prompt from the start button
+            message = message_payload(next_snowflake(), data.get("components", []), content=data.get("content", ""))
+        elif reply["type"] == 7:  # The prompt edited in place
+            message = dict(message, components=data.get("components", []), content=data.get("content", ""))
+        choices = button_ids(message["components"])
+        if not choices and user_id in posted:
+            # Channel flow: the next question was posted to the channel instead
+            message = message_payload(next_snowflake(), posted.pop(user_id))
+            choices = button_ids(message["components"])
+        if not choices:
+            return True
+        custom_id = rng.choice(choices)
+    return False
+
+
+def install_fake_rest(bot, posted: dict[int, list], calls: Counter):
+    # Stands in for discord.com: channel messages are recorded, everything else succeeds
+    async def fake_request(route, **kwargs):
+        calls[f"{route.method} {route.path}"] += 1
+        payload = kwargs.get("json") or {}
+        if route.method == "POST" and route.path == "/channels/{channel_id}/messages":
+            components = payload.get("components") or []
+            ids = button_ids(components)
+            if ids and ids[0].startswith(f"{bot.STATELESS_CUSTOM_ID_PREFIX}:"):
+                posted[int(ids[0].split(":")[1])] = components
+            return message_payload(next_snowflake(), components, content=payload.get("content") or "")
+        return {}
+    bot._http_request = fake_request
+
+
+async def start_local_endpoint(bot, public_key: str):
+    from discord import ClientUser
+    from interactions_http import InteractionsEndpoint
+
+    client = bot.bot
+    await client._async_setup_hook()
+    state = client._connection
+    state.user = ClientUser(state=state, data={"id": str(APPLICATION_ID), "username": "fairy", "discriminator": "0",
+                                               "avatar": None, "bot": True})
+    state.application_id = APPLICATION_ID
+    await client.setup_hook()
+    bot.interactions_endpoint = InteractionsEndpoint(public_key, state.parse_interaction_create)
+    runner = await bot.interactions_endpoint.start("127.0.0.1", 0)
+    port = runner.addresses[0][1]
+    return runner, f"http://127.0.0.1:{port}/interactions"
+
+
+async def run(args) -> int:
+    signing_key = SigningKey(bytes.fromhex(args.private_key)) if args.private_key else SigningKey.generate()
+    bot = runner = None
+    posted: dict[int, list] = {}
+    rest_calls = Counter()
+    url = args.url
+    if url is None:
+        os.environ["INTERACTIONS_PORT"] = "1"  # Only switches on stateless mode here; the endpoint is started below
+        os.environ["DISCORD_PUBLIC_KEY"] = signing_key.verify_key.encode().hex()
+        from loadtest import import_bot
+        bot = import_bot("ephemeral" if args.mode == "inline" else "channel", args.users)
+        logging.disable(logging.WARNING)
+        install_fake_rest(bot, posted, rest_calls)
+        runner, url = await start_local_endpoint(bot, os.environ["DISCORD_PUBLIC_KEY"])
+
+    rng = random.Random(args.seed)
+    limit = asyncio.Semaphore(args.concurrency)
+    connector = aiohttp.TCPConnector(limit=args.concurrency)
+    async with aiohttp.ClientSession(connector=connector) as session:
+        client = Client(session, url, signing_key)
+        ping_status, pong = await client.post({"id": "1", "application_id": str(APPLICATION_ID), "type": 1,
+                                               "token": "ping", "version": 1})
+        forged_status, _ = await client.post(component_interaction(1, message_payload(START_MESSAGE_ID, start_components()),
+                                                                   "start_quiz_button"), bad_signature=True)
+        client.latencies.clear()
+        client.statuses.clear()
+
+        async def one_user(user_id: int, user_rng: random.Random) -> bool:
+            async with limit:
+                return await take_quiz(client, user_id, user_rng, posted)
+
+        started = time.perf_counter()
+        outcomes = await asyncio.gather(*(one_user((1 << 50) + n, random.Random(rng.random())) for n in range(args.users)))
+        elapsed = time.perf_counter() - started
+
+    if bot is not None:
+        await bot.outbound.flush()
+    latencies = sorted(client.latencies)
+    print(f"ping -> {ping_status} {pong}, forged signature -> {forged_status}")
+    print(f"{args.users} users, mode={args.mode}, {len(latencies)} signed requests in {elapsed:.2f}s "
+          f"-> {len(latencies) / elapsed:.0f} req/s, statuses {dict(client.statuses)}")
+    print(f"reply latency: p50 {percentile(latencies, 0.5) * 1000:.1f}ms, p99 {percentile(latencies, 0.99) * 1000:.1f}ms, "
+          f"max {latencies[-1] * 1000:.1f}ms")
+    failed = outcomes.count(False)
+    if bot is not None:
+        endpoint = bot.interactions_endpoint
+        completed = bot.results.guild(GUILD_ID).completed
+        print(f"responses inline {endpoint.inlined}, deferred {endpoint.deferred}; completed quizzes {completed}")
+        print(f"REST calls left: {sum(rest_calls.values())} ({sum(rest_calls.values()) / max(completed, 1):.1f} per quiz): "
+              f"{dict(rest_calls)}")
+        failed += args.users - completed
+        await runner.cleanup()
+    print(f"failed quizzes: {failed}")
+    ok = ping_status == 200 and pong == {"type": 1} and forged_status == 401 and not failed
+    return 0 if ok else 1
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Drive the HTTP interactions endpoint with signed quiz clicks.")
+    parser.add_argument("--users", type=int, default=500)
+    parser.add_argument("--concurrency", type=int, default=50, help="Users clicking at the same time.")
+    parser.add_argument("--mode", choices=("inline", "channel"), default="inline",
+                        help="inline: EPHEMERAL_QUIZ=1, every step in the HTTP reply; channel: questions posted over REST.")
+    parser.add_argument("--url", help="Endpoint of a running bot; by default one is started in this process.")
+    parser.add_argument("--private-key", help="Hex Ed25519 private key matching the bot's DISCORD_PUBLIC_KEY.")
+    parser.add_argument("--print-key", action="store_true", help="Print a new key pair and exit.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    if args.print_key:
+        key = SigningKey.generate()
+        print(f"private key: {key.encode().hex()}\nDISCORD_PUBLIC_KEY={key.verify_key.encode().hex()}")
+        return 0
+    if args.url and not args.private_key:
+        parser.error("--url needs --private-key")
+    return asyncio.run(run(args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
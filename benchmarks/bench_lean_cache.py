@@ -0,0 +1,138 @@
+# Lean-cache benchmark: feeds synthetic GUILD_CREATE, member chunk and
+# MESSAGE_CREATE payloads into discord.py's connection state, once with the
+# default caches (members intent, chunking at startup) and once with
+# LEAN_CACHE=1, and reports RSS, time spent processing the startup payloads
+# and what ended up cached. Each mode runs in its own process so RSS is clean.
+#
+#   python benchmarks/bench_lean_cache.py --guilds 50 --members 2000
+#
+# The time column is CPU time in the bot process only. With chunking on, a real
+# startup also waits on one gateway chunk request per guild, which discord.py
+# sends under the gateway's 120-commands-per-minute limit; that count is shown
+# separately.
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import resource
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+CHUNK_SIZE = 1000  # Members per GUILD_MEMBERS_CHUNK, as Discord sends them
+LARGE_THRESHOLD = 250  # Members included in GUILD_CREATE for guilds above this size: none
+
+
+def member_payload(user_id: int) -> dict:
+    return {
+        "user": {"id": str(user_id), "username": f"member{user_id}", "discriminator": "0", "global_name": f"Member {user_id}",
+                 "avatar": f"{user_id:032x}"[-32:]},
+        "roles": [], "joined_at": "2024-01-01T00:00:00+00:00", "deaf": False, "mute": False, "flags": 0,
+    }
+
+
+def guild_payload(guild_id: int, channel_id: int, members: list[dict], member_count: int) -> dict:
+    return {
+        "id": str(guild_id), "name": f"Guild {guild_id}", "owner_id": "1", "member_count": member_count,
+        "large": member_count > LARGE_THRESHOLD, "members": members, "presences": [], "voice_states": [],
+        "channels": [{"id": str(channel_id), "type": 0, "name": "fairy-quiz", "position": 0, "permission_overwrites": []}],
+        "roles": [{"id": str(guild_id), "name": "@everyone", "permissions": "0", "position": 0, "color": 0,
+                   "hoist": False, "managed": False, "mentionable": False}],
+        "emojis": [], "stickers": [], "features": [], "threads": [], "stage_instances": [], "guild_scheduled_events": [],
+        "premium_tier": 0, "verification_level": 0, "default_message_notifications": 0, "explicit_content_filter": 0,
+        "mfa_level": 0, "nsfw_level": 0, "preferred_locale": "en-US", "afk_timeout": 300, "system_channel_flags": 0,
+    }
+
+
+def message_payload(message_id: int, guild_id: int, channel_id: int, author_id: int) -> dict:
+    return {
+        "id": str(message_id), "channel_id": str(channel_id), "guild_id": str(guild_id), "type": 0,
+        "content": "did anyone else get Pooka?", "timestamp": "2024-01-01T00:00:00+00:00", "edited_timestamp": None,
+        "tts": False, "mention_everyone": False, "mentions": [], "mention_roles": [], "attachments": [], "embeds": [],
+        "pinned": False, "author": member_payload(author_id)["user"],
+        "member": {k: v for k, v in member_payload(author_id).items() if k != "user"},
+    }
+
+
+async def run_child(args) -> dict:
+    from loadtest import import_bot
+    bot_module = import_bot("ephemeral", 1000)
+    logging.disable(logging.INFO)
+    client = bot_module.bot
+    await client._async_setup_hook()  # Binds the client to this loop so dispatched events can run
+    state = client._connection
+    from discord import ClientUser, Member
+    state.user = ClientUser(state=state, data={"id": "1", "username": "fairy", "discriminator": "0", "avatar": None,
+                                               "bot": True, "mfa_enabled": False, "verified": True})
+
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    chunked = state.member_cache_flags.joined and client.intents.members and state._chunk_guilds
+    chunk_requests = 0
+    started = time.process_time()
+    next_id = 1 << 40
+    channels = []
+    for g in range(args.guilds):
+        guild_id, channel_id = (1 << 50) + g, (1 << 51) + g
+        member_ids = range(next_id, next_id + args.members)
+        next_id += args.members
+        # Discord only sends members in GUILD_CREATE with the members intent, and only for small guilds
+        inline = [member_payload(i) for i in member_ids] if client.intents.members and args.members <= LARGE_THRESHOLD else []
+        guild = state._add_guild_from_data(guild_payload(guild_id, channel_id, inline, args.members))
+        channels.append((guild_id, channel_id, member_ids))
+        if chunked and not inline:
+            chunk_requests += 1
+            for start in range(0, args.members, CHUNK_SIZE):
+                # What discord.py's chunk request does with each GUILD_MEMBERS_CHUNK at startup
+                for i in member_ids[start:start + CHUNK_SIZE]:
+                    guild._add_member(Member(data=member_payload(i), guild=guild, state=state))
+
+    message_id = 1 << 52
+    for n in range(args.messages):
+        guild_id, channel_id, member_ids = channels[n % len(channels)]
+        state.parse_message_create(message_payload(message_id + n, guild_id, channel_id, member_ids[n % len(member_ids)]))
+    await asyncio.sleep(0)  # Let the dispatched on_message tasks run
+    elapsed = time.process_time() - started
+
+    return {
+        "lean": bot_module.LEAN_CACHE,
+        "rss_mib": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024,
+        "rss_growth_mib": (resource.getrusage(resource.RUSAGE_SELF).ru_maxrss - rss_before_kb) / 1024,
+        "startup_cpu_s": elapsed,
+        "chunk_requests": chunk_requests,
+        "members": sum(len(guild._members) for guild in client.guilds),
+        "users": len(state._users),
+        "messages": len(state._messages) if state._messages is not None else 0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Compare memory and startup cost with and without LEAN_CACHE.")
+    parser.add_argument("--guilds", type=int, default=50)
+    parser.add_argument("--members", type=int, default=2000, help="Members per guild.")
+    parser.add_argument("--messages", type=int, default=5000, help="MESSAGE_CREATE events after startup.")
+    parser.add_argument("--child", action="store_true", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        print(json.dumps(asyncio.run(run_child(args))))
+        return 0
+
+    print(f"{args.guilds} guilds x {args.members} members, {args.messages} messages")
+    print(f"{'mode':<10}{'peak RSS':>10}{'growth':>10}{'startup cpu':>13}{'chunk reqs':>12}{'members':>10}{'users':>9}{'messages':>10}")
+    for lean in ("0", "1"):
+        env = dict(os.environ, LEAN_CACHE=lean)
+        output = subprocess.run([sys.executable, __file__, "--child", "--guilds", str(args.guilds), "--members", str(args.members),
+                                 "--messages", str(args.messages)], env=env, capture_output=True, text=True, check=True).stdout
+        r = json.loads(output.strip().splitlines()[-1])
+        print(f"{'lean' if r['lean'] else 'default':<10}{r['rss_mib']:>8.1f}Mi{r['rss_growth_mib']:>8.1f}Mi{r['startup_cpu_s']:>12.2f}s"
+              f"{r['chunk_requests']:>12}{r['members']:>10}{r['users']:>9}{r['messages']:>10}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,175 @@
+# Local stand-ins for the discord.py objects the quiz handlers touch.
+#
+# Every call that would be a REST request goes through FakeRest, which sleeps
+# for a configurable latency and can inject 429s. A 429 is handled the way
+# discord.py handles it: wait for retry_after, then retry the request.
+
+import asyncio
+import itertools
+import random
+from collections import Counter
+
+import discord
+
+_snowflakes = itertools.count(1 << 40)
+
+
+def next_snowflake() -> int:
+    return next(_snowflakes)
+
+
+class FakeRest:
+    def __init__(self, latency: float = 0.05, jitter: float = 0.02, rate_limit_chance: float = 0.0,
+                 retry_after: float = 0.5, rng: random.Random | None = None):
+        self.latency = latency
+        self.jitter = jitter
+        self.rate_limit_chance = rate_limit_chance
+        self.retry_after = retry_after
+        self.rng = rng or random.Random()
+        self.calls = Counter()
+        self.rate_limited = Counter()
+
+    async def call(self, route: str):
+        self.calls[route] += 1
+        while self.rate_limit_chance and self.rng.random() < self.rate_limit_chance:
+            self.rate_limited[route] += 1
+            await asyncio.sleep(self.retry_after)
+        await asyncio.sleep(max(0.0, self.latency + self.rng.uniform(-self.jitter, self.jitter)))
+
+    @property
+    def total_calls(self) -> int:
+        return sum(self.calls.values())
+
+
+class FakeAsset:
+    def __init__(self, key: str):
+        self.key = key
+        self.url = f"https://cdn.discordapp.com/embed/avatars/{key}.png"
+
+    def with_size(self, size: int) -> "FakeAsset":
+        return self
+
+
+class FakeUser:
+    def __init__(self, user_id: int | None = None):
+        self.id = user_id or next_snowflake()
+        self.name = f"tester{self.id % 100000}"
+        self.display_name = self.name
+        self.mention = f"<@{self.id}>"
+        self.avatar = None
+        self.display_avatar = FakeAsset(str((self.id >> 22) % 6))  # Default avatars, as for users without one
+        self.bot = False
+
+    def __str__(self):
+        return self.name
+
+
+class FakeMessage:
+    def __init__(self, rest: FakeRest, channel, content=None, embed=None, view=None, ephemeral: bool = False):
+        self.id = next_snowflake()
+        self.rest = rest
+        self.channel = channel
+        self.content = content
+        self.embed = embed
+        self.view = view
+        self.flags = discord.MessageFlags(ephemeral=ephemeral)
+
+    @property
+    def embeds(self) -> list:
+        return [self.embed] if self.embed is not None else []
+
+    async def edit(self, **kwargs):
+        await self.rest.call("PATCH message")
+        self._apply(kwargs)
+        return self
+
+    def _apply(self, kwargs):
+        for field in ("content", "embed", "view"):
+            if field in kwargs:
+                setattr(self, field, kwargs[field])
+
+
+class FakeTextChannel:
+    def __init__(self, rest: FakeRest, channel_id: int | None = None):
+        self.id = channel_id or next_snowflake()
+        self.rest = rest
+        self.guild = None
+        self.messages: list[FakeMessage] = []
+
+    async def send(self, content=None, *, embed=None, view=None, **kwargs):
+        await self.rest.call("POST channel message")
+        message = FakeMessage(self.rest, self, content=content, embed=embed, view=view)
+        self.messages.append(message)
+        return message
+
+
+class FakeInteractionResponse:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+        self._done = False
+
+    def is_done(self) -> bool:
+        return self._done
+
+    def _respond(self):
+        if self._done:
+            raise RuntimeError("This interaction has already been responded to before")
+        self._done = True
+
+    async def send_message(self, content=None, *, embed=None, view=None, ephemeral=False, **kwargs):
+        self._respond()
+        await self._interaction.rest.call("POST interaction callback")
+        self._interaction.original = FakeMessage(self._interaction.rest, self._interaction.channel,
+                                                 content=content, embed=embed, view=view, ephemeral=ephemeral)
+
+    async def defer(self, **kwargs):
+        self._respond()
+        await self._interaction.rest.call("POST interaction callback")
+
+    async def edit_message(self, **kwargs):
+        self._respond()
+        await self._interaction.rest.call("POST interaction callback")
+        if self._interaction.message is not None:
+            self._interaction.message._apply(kwargs)
+            self._interaction.original = self._interaction.message
+
+
+class FakeFollowup:
+    def __init__(self, interaction: "FakeInteraction"):
+        self._interaction = interaction
+
+    async def send(self, content=None, *, embed=None, view=None, ephemeral=False, **kwargs):
+        await self._interaction.rest.call("POST followup")
+        return FakeMessage(self._interaction.rest, self._interaction.channel, content=content, embed=embed, view=view)
+
+
+class FakeInteraction:
+    # `message` is the message whose component was clicked, if any
+    def __init__(self, rest: FakeRest, user: FakeUser, channel: FakeTextChannel,
+                 message: FakeMessage | None = None, custom_id: str | None = None):
+        self.id = next_snowflake()
+        self.rest = rest
+        self.user = user
+        self.channel = channel
+        self.channel_id = channel.id
+        self.guild = None
+        self.guild_id = None
+        self.message = message
+        self.original = message
+        self.data = {"custom_id": custom_id} if custom_id else {}
+        self.response = FakeInteractionResponse(self)
+        self.followup = FakeFollowup(self)
+
+    async def original_response(self):
+        await self.rest.call("GET original response")
+        return self.original
+
+    async def edit_original_response(self, **kwargs):
+        await self.rest.call("PATCH original response")
+        if self.original is not None:
+            self.original._apply(kwargs)
+        return self.original
+
+
+def button_custom_ids(view) -> list[str]:
+    return [child.custom_id for child in getattr(view, "children", []) if getattr(child, "custom_id", None)]
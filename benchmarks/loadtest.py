@@ -0,0 +1,188 @@
+# Offline load test: N simulated users take the quiz concurrently against local
+# stand-ins for Discord (see fakes.py), with fake REST latency and injected 429s.
+#
+#   python benchmarks/loadtest.py --users 2000 --mode ephemeral --latency 0.05 --rate-limit 0.01
+#
+# Reports per-step latency percentiles, event-loop lag, peak memory and
+# completed sessions per second.
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import resource
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeInteraction, FakeRest, FakeTextChannel, FakeUser  # noqa: E402
+
+MODES = ("channel", "ephemeral", "stateless")
+LAG_INTERVAL = 0.01
+
+
+def percentile(sorted_values: list[float], fraction: float) -> float:
+    if not sorted_values:
+        return 0.0
+    return sorted_values[min(len(sorted_values) - 1, int(len(sorted_values) * fraction))]
+
+
+def import_bot(mode: str, users: int):
+    # bot.py reads its configuration at import time
+    os.environ.setdefault("CHANNEL_ID", "0")
+    os.environ["SESSION_SNAPSHOT_PATH"] = ""
+    os.environ["RESULTS_DB_PATH"] = ""
+    os.environ["RESULT_CARDS"] = "0"
+    os.environ["SESSION_MAX"] = str(max(users * 2, 1000))
+    os.environ["EPHEMERAL_QUIZ"] = "1" if mode == "ephemeral" else "0"
+    os.environ["STATELESS_QUIZ"] = "1" if mode == "stateless" else "0"
+    import bot
+    return bot
+
+
+class LoadTest:
+    def __init__(self, bot, args):
+        self.bot = bot
+        self.args = args
+        self.rng = random.Random(args.seed)
+        self.rest = FakeRest(latency=args.latency, jitter=args.jitter, rate_limit_chance=args.rate_limit,
+                             retry_after=args.retry_after, rng=self.rng)
+        self.channel = FakeTextChannel(self.rest)
+        self.start_view = None
+        self.step_latencies: dict[str, list[float]] = {}
+        self.loop_lag: list[float] = []
+        self.completed = 0
+        self.failed = 0
+
+    def record(self, step: str, started: float):
+        self.step_latencies.setdefault(step, []).append(time.perf_counter() - started)
+
+    async def think(self):
+        if self.args.think:
+            await asyncio.sleep(self.rng.uniform(0, self.args.think))
+
+    async def click(self, step: str, user: FakeUser, message, handler, *handler_args):
+        interaction = FakeInteraction(self.rest, user, self.channel, message=message)
+        started = time.perf_counter()
+        await handler(interaction, *handler_args)
+        self.record(step, started)
+        return interaction
+
+    async def run_user(self, delay: float):
+        await asyncio.sleep(delay)
+        bot = self.bot
+        user = FakeUser()
+        try:
+            interaction = await self.click("start", user, None, self.start_view.start_button.callback)
+            message = interaction.original
+
+            gender_index = self.rng.randrange(len(bot.gender_options))
+            realm_index = self.rng.randrange(len(bot.realm_options))
+            answers = [self.rng.randrange(len(question.options)) for question in bot.packs.current.quiz.questions]
+
+            if self.args.mode == "stateless":
+                # Each button's custom_id carries the state after the click
+                states = [str(gender_index), f"{gender_index}{realm_index}"]
+                for answer in answers:
+                    states.append(states[-1] + str(answer))
+                steps = ["gender", "realm"] + ["answer"] * len(answers)
+                for step, state in zip(steps, states):
+                    await self.think()
+                    interaction = await self.click(step, user, message, bot.handle_stateless_click,
+                                                   bot.pack_tag(bot.packs.current), state)
+            else:
+                await self.think()
+                interaction = await self.click("gender", user, message, bot.handle_gender_selection,
+                                               bot.gender_options[gender_index][1])
+                await self.think()
+                interaction = await self.click("realm", user, interaction.original, bot.handle_realm_selection,
+                                               bot.realm_options[realm_index][0])
+                for question_index, answer in enumerate(answers):
+                    await self.think()
+                    interaction = await self.click("answer", user, interaction.original, bot.handle_quiz_answer,
+                                                   answer, question_index)
+                if user.id in bot.user_sessions:
+                    raise RuntimeError("session still open after the last answer")
+            self.completed += 1
+        except Exception as e:
+            self.failed += 1
+            if self.failed <= 5:
+                print(f"simulated user {user.id} failed: {e!r}", file=sys.stderr)
+
+    async def monitor_loop_lag(self, stop: asyncio.Event):
+        while not stop.is_set():
+            started = time.perf_counter()
+            await asyncio.sleep(LAG_INTERVAL)
+            self.loop_lag.append(time.perf_counter() - started - LAG_INTERVAL)
+
+    async def run(self) -> float:
+        self.start_view = self.bot.StartQuizView()
+        stop = asyncio.Event()
+        monitor = asyncio.create_task(self.monitor_loop_lag(stop))
+        started = time.perf_counter()
+        await asyncio.gather(*(self.run_user(self.rng.uniform(0, self.args.ramp)) for _ in range(self.args.users)))
+        await self.bot.outbound.flush()
+        elapsed = time.perf_counter() - started
+        stop.set()
+        await monitor
+        return elapsed
+
+
+def report(test: LoadTest, elapsed: float, rss_before_kb: int, traced_peak: int | None):
+    print(f"mode={test.args.mode} users={test.args.users} latency={test.args.latency * 1000:.0f}ms "
+          f"rate_limit={test.args.rate_limit:.3f} think<={test.args.think}s ramp={test.args.ramp}s")
+    print(f"{'step':<10}{'count':>8}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'max ms':>10}")
+    for step in ("start", "gender", "realm", "answer"):
+        values = sorted(test.step_latencies.get(step, []))
+        if values:
+            print(f"{step:<10}{len(values):>8}" + "".join(f"{percentile(values, f) * 1000:>10.1f}" for f in (0.5, 0.95, 0.99, 1.0)))
+
+    lag = sorted(test.loop_lag)
+    print(f"event-loop lag: p50 {percentile(lag, 0.5) * 1000:.2f}ms, p99 {percentile(lag, 0.99) * 1000:.2f}ms, "
+          f"max {percentile(lag, 1.0) * 1000:.2f}ms")
+    rest_per_quiz = test.rest.total_calls / test.completed if test.completed else 0.0
+    print(f"REST calls: {test.rest.total_calls} ({rest_per_quiz:.1f} per completed quiz), "
+          f"429s injected: {sum(test.rest.rate_limited.values())}")
+    rss_peak_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    memory = f"peak RSS {rss_peak_kb / 1024:.1f} MiB (+{(rss_peak_kb - rss_before_kb) / 1024:.1f} MiB during run)"
+    if traced_peak is not None:
+        memory += f", traced Python peak {traced_peak / 1024 / 1024:.1f} MiB"
+    print(memory)
+    print(f"completed {test.completed}, failed {test.failed} in {elapsed:.2f}s -> {test.completed / elapsed:.1f} sessions/sec")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Simulate concurrent quiz takers against fake Discord objects.")
+    parser.add_argument("--users", type=int, default=1000)
+    parser.add_argument("--mode", choices=MODES, default="channel")
+    parser.add_argument("--latency", type=float, default=0.05, help="Mean fake REST latency in seconds.")
+    parser.add_argument("--jitter", type=float, default=0.02)
+    parser.add_argument("--rate-limit", type=float, default=0.0, help="Chance that a REST call gets a 429 first.")
+    parser.add_argument("--retry-after", type=float, default=0.5)
+    parser.add_argument("--think", type=float, default=0.5, help="Max think time between clicks in seconds.")
+    parser.add_argument("--ramp", type=float, default=2.0, help="Spread user arrivals over this many seconds.")
+    parser.add_argument("--seed", type=int, default=1)
+    parser.add_argument("--tracemalloc", action="store_true", help="Also report the traced Python heap peak (slower).")
+    parser.add_argument("--verbose", action="store_true", help="Keep the bot's INFO logging.")
+    args = parser.parse_args()
+
+    bot = import_bot(args.mode, args.users)
+    if not args.verbose:
+        logging.disable(logging.INFO)
+
+    rss_before_kb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    if args.tracemalloc:
+        tracemalloc.start()
+    test = LoadTest(bot, args)
+    elapsed = asyncio.run(test.run())
+    traced_peak = tracemalloc.get_traced_memory()[1] if args.tracemalloc else None
+    report(test, elapsed, rss_before_kb, traced_peak)
+    return 1 if test.failed else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
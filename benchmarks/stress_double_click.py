@@ -0,0 +1,151 @@
+# Double-click stress test: each simulated user fires every click of the quiz
+# --clicks times at once (start button, gender, realm, each answer) and also
+# has some interactions delivered twice. It then checks that every quiz still
+# ran exactly once: one set of question messages, one answer per question, one
+# completed result per user and no leftover session. In stateless mode every
+# start click gets its own prompt, as nothing is kept to tell them apart, and
+# the bursts land on the state-carrying buttons instead.
+#
+#   python benchmarks/stress_double_click.py --users 200 --clicks 5 --mode channel
+#
+# Exits non-zero if any quiz broke one of those rules.
+
+import argparse
+import asyncio
+import logging
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from fakes import FakeInteraction, FakeRest, FakeTextChannel, FakeUser  # noqa: E402
+from loadtest import import_bot  # noqa: E402
+
+HANDLERS = ("start_button", "gender_selection", "realm_selection", "quiz_answer", "stateless_click")
+
+
+class Burst:
+    def __init__(self, rest: FakeRest, user: FakeUser, channel: FakeTextChannel, clicks: int, redeliver: float,
+                 rng: random.Random):
+        self.rest = rest
+        self.user = user
+        self.channel = channel
+        self.clicks = clicks
+        self.redeliver = redeliver
+        self.rng = rng
+
+    def interactions(self, message) -> list[FakeInteraction]:
+        # `clicks` distinct clicks, some of which Discord also delivers a second time
+        clicks = [FakeInteraction(self.rest, self.user, self.channel, message=message) for _ in range(self.clicks)]
+        for click in list(clicks):
+            if self.rng.random() < self.redeliver:
+                again = FakeInteraction(self.rest, self.user, self.channel, message=message)
+                again.id = click.id
+                clicks.append(again)
+        self.rng.shuffle(clicks)
+        return clicks
+
+    async def fire(self, handler, message, *handler_args) -> list[FakeInteraction]:
+        clicks = self.interactions(message)
+        await asyncio.gather(*(handler(click, *handler_args) for click in clicks))
+        return clicks
+
+
+async def run_user(bot, rest: FakeRest, args, rng: random.Random) -> list[str]:
+    user = FakeUser()
+    channel = FakeTextChannel(rest)
+    burst = Burst(rest, user, channel, args.clicks, args.redeliver, rng)
+    quiz = bot.packs.current.quiz
+
+    starts = await burst.fire(bot.StartQuizView().start_button.callback, None)
+    problems = []
+    if bot.STATELESS_QUIZ:
+        return await run_stateless_user(bot, burst, starts[0].original, rng, problems)
+    prompts = [click for click in starts if click.original is not None and isinstance(click.original.view, bot.GenderSelectionView)]
+    if len(prompts) != 1:
+        problems.append(f"{len(prompts)} gender prompts from one burst of start clicks")
+    if not prompts:
+        return problems
+    prompt = prompts[0].original
+
+    await burst.fire(bot.handle_gender_selection, prompt, rng.choice(bot.gender_options)[1])
+    await burst.fire(bot.handle_realm_selection, prompt, rng.choice(bot.realm_options)[0])
+    for question_index, question in enumerate(quiz.questions):
+        # Channel mode posts each question as a new message; ephemeral mode edits the prompt in place
+        message = channel.messages[-1] if channel.messages and not bot.EPHEMERAL_QUIZ else prompt
+        session = bot.user_sessions.get(user.id, touch=False)
+        if session is not None and session.step != question_index:
+            problems.append(f"session at step {session.step} before question {question_index + 1}")
+        await burst.fire(bot.handle_quiz_answer, message, rng.randrange(len(question.options)), question_index)
+    await bot.outbound.flush()
+
+    expected_messages = 1 if bot.EPHEMERAL_QUIZ else len(quiz.questions) + 1
+    if len(channel.messages) != expected_messages:
+        problems.append(f"{len(channel.messages)} channel messages, expected {expected_messages}")
+    if user.id in bot.user_sessions:
+        problems.append("session left behind after the result")
+    return problems
+
+
+async def run_stateless_user(bot, burst: Burst, prompt, rng: random.Random, problems: list[str]) -> list[str]:
+    # Every burst clicks the same button, so they all carry the same state
+    quiz = bot.packs.current.quiz
+    tag = bot.pack_tag(bot.packs.current)
+    state = str(rng.randrange(len(bot.gender_options)))
+    await burst.fire(bot.handle_stateless_click, prompt, tag, state)
+    state += str(rng.randrange(len(bot.realm_options)))
+    await burst.fire(bot.handle_stateless_click, prompt, tag, state)
+    for question in quiz.questions:
+        message = burst.channel.messages[-1] if burst.channel.messages else prompt
+        state += str(rng.randrange(len(question.options)))
+        await burst.fire(bot.handle_stateless_click, message, tag, state)
+    await bot.outbound.flush()
+
+    if len(burst.channel.messages) != len(quiz.questions) + 1:
+        problems.append(f"{len(burst.channel.messages)} channel messages, expected {len(quiz.questions) + 1}")
+    return problems
+
+
+async def run(bot, args) -> int:
+    rng = random.Random(args.seed)
+    rest = FakeRest(latency=args.latency, jitter=args.latency / 2, rng=rng)
+    started = time.perf_counter()
+    outcomes = await asyncio.gather(*(run_user(bot, rest, args, random.Random(rng.random())) for _ in range(args.users)))
+    elapsed = time.perf_counter() - started
+
+    broken = [problems for problems in outcomes if problems]
+    # Stateless quizzes keep no session to count them by, so their results are counted instead
+    completed = bot.results.guild(None).completed if bot.STATELESS_QUIZ else sum(bot.completed_quizzes.values())
+    if completed != args.users:
+        broken.append([f"{completed} completed results for {args.users} users"])
+    dropped = sum(bot.duplicate_interactions.value(handler) for handler in HANDLERS)
+    waited = sum(bot.user_lock_waits.value(handler) for handler in HANDLERS)
+    print(f"{args.users} users x {args.clicks} concurrent clicks per step (mode={args.mode}) in {elapsed:.1f}s")
+    print(f"duplicate interactions dropped: {dropped:.0f}, clicks that waited on the user's lock: {waited:.0f}")
+    print(f"REST calls: {rest.total_calls} ({rest.total_calls / args.users:.1f} per user)")
+    print(f"problems: {len(broken)}")
+    for problems in broken[:5]:
+        print("  " + "; ".join(problems))
+    return 1 if broken else 0
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Hammer the quiz handlers with concurrent clicks from the same user.")
+    parser.add_argument("--users", type=int, default=200)
+    parser.add_argument("--clicks", type=int, default=5, help="Concurrent clicks per step and user.")
+    parser.add_argument("--redeliver", type=float, default=0.2, help="Chance that a click is also delivered a second time.")
+    parser.add_argument("--mode", choices=("channel", "ephemeral", "stateless"), default="channel")
+    parser.add_argument("--latency", type=float, default=0.02, help="Mean fake REST latency in seconds.")
+    parser.add_argument("--seed", type=int, default=1)
+    args = parser.parse_args()
+
+    bot = import_bot(args.mode, args.users)
+    logging.disable(logging.WARNING)
+    return asyncio.run(run(bot, args))
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,38 +1,265 @@
+import asyncio
+import io
+import json
 import discord
+from discord import app_commands
 from discord.ext import commands
-import random
-from collections import Counter # For score tallying
 import os
+from collections import Counter, deque # For REST call tallying
 import dotenv
+from contextvars import ContextVar
 import traceback # For detailed error logging
 import logging # For better logging than print
+import re
+import signal
 import time # For timing operations
-import aiohttp # For diagnostic HTTP test
-
-# --- Basic Logging Setup ---
-if not logging.getLogger().hasHandlers():
-    logging.basicConfig(level=logging.INFO, format='%(asctime)s %(levelname)s [%(funcName)s]: %(message)s')
+import functools
+from discord.ext import tasks
+from discord.http import Route
+from discord.webhook.async_ import AsyncWebhookAdapter
+from session_store import SessionStore
+from expiry_wheel import TimingWheel
+from user_guard import UserGuard
+from interactions_http import InteractionsEndpoint
+from compiled_quiz import CompiledQuiz
+from quiz_pack import MAX_OPTIONS, MAX_STATELESS_QUESTIONS, PackError, PackRegistry, build_pack, load_pack
+from outbound import OutboundScheduler, PRIORITY_COSMETIC
+from metrics import Registry, start_metrics_server
+from log_setup import CLICK_LOGGER, click_fields, configure_logging
+from guild_config import GuildConfig, GuildConfigStore
+from results_store import GuildStats, QuizResult, ResultsStore
+from card_renderer import CARD_FILENAME, CardRenderer, HttpAvatarFetcher, cards_available
 
 # Load environment variables
 dotenv.load_dotenv()
 
+# --- Basic Logging Setup ---
+# LOG_MODE=json moves formatting and output to a background thread; LOG_CLICK_SAMPLE_RATE keeps
+# that fraction of the per-click INFO lines (warnings and errors are always kept)
+configure_logging(os.getenv('LOG_MODE', 'text'), float(os.getenv('LOG_CLICK_SAMPLE_RATE', '1')))
+click_log = logging.getLogger(CLICK_LOGGER)
+
+# LEAN_CACHE drops the members intent and keeps discord.py's member, user and message caches
+# near empty; handlers take the user from the interaction instead of looking it up
+LEAN_CACHE = os.getenv('LEAN_CACHE', '0').lower() in ('1', 'true', 'yes')
+# INTERACTIONS_ONLY subscribes to the guilds intent alone. Quiz clicks and slash commands arrive as
+# interactions whatever the intents, so message, typing and reaction events are never sent at all
+INTERACTIONS_ONLY = os.getenv('INTERACTIONS_ONLY', '0').lower() in ('1', 'true', 'yes')
+LEAN_CACHE = LEAN_CACHE or INTERACTIONS_ONLY
+
 # Initialize intents
-intents = discord.Intents.default()
-intents.messages = True
-intents.message_content = True
-intents.members = True
+if INTERACTIONS_ONLY:
+    intents = discord.Intents.none()
+    intents.guilds = True
+else:
+    intents = discord.Intents.default()
+    intents.messages = True
+    intents.message_content = True
+    intents.members = not LEAN_CACHE
+cache_options = {}
+if LEAN_CACHE:
+    cache_options = dict(member_cache_flags=discord.MemberCacheFlags.none(), chunk_guilds_at_startup=False, max_messages=None)
+
+# Without message events there are no `!` commands, only their slash versions
+command_prefix = commands.when_mentioned if INTERACTIONS_ONLY else "!"
+
+# Initialize the bot with a command prefix and intents. In cluster mode (see cluster.py) each worker
+# process runs the shards listed in SHARD_IDS out of SHARD_COUNT total
+SHARD_COUNT = int(os.getenv('SHARD_COUNT', '0'))
+SHARD_IDS = [int(shard_id) for shard_id in os.getenv('SHARD_IDS', '').split(',') if shard_id.strip()] or None
+CLUSTER_WORKER = int(os.getenv('CLUSTER_WORKER', '0'))  # Set by cluster.py; worker 0 does the once-per-bot work
+if SHARD_COUNT:
+    bot = commands.AutoShardedBot(command_prefix=command_prefix, intents=intents, shard_count=SHARD_COUNT, shard_ids=SHARD_IDS,
+                                  **cache_options)
+else:
+    bot = commands.Bot(command_prefix=command_prefix, intents=intents, **cache_options)
+
+# --- Instrumentation ---
+metrics = Registry()
+handler_seconds = metrics.histogram("fairy_handler_seconds", "Time spent in an interaction handler.", ("handler",))
+handler_rest_calls = metrics.histogram("fairy_handler_rest_calls", "REST calls made by one handler invocation.", ("handler",),
+                                       buckets=(1, 2, 3, 4, 5, 6, 8, 10))
+handler_errors = metrics.counter("fairy_handler_errors_total", "Exceptions that escaped an interaction handler.", ("handler",))
+interaction_ack_seconds = metrics.histogram("fairy_interaction_ack_seconds",
+                                            "Click to acknowledged response (defer/send/edit); Discord gives up after 3s.", ("handler",))
+interaction_callback_seconds = metrics.histogram("fairy_interaction_callback_seconds",
+                                                 "Round trip of the interaction response request itself.", ("handler",))
+rest_seconds = metrics.histogram("fairy_rest_request_seconds", "REST round trip by route.", ("route",))
+rest_errors = metrics.counter("fairy_rest_errors_total", "REST requests that failed, by error type.", ("error",))
+duplicate_interactions = metrics.counter("fairy_duplicate_interactions_total",
+                                         "Interactions delivered more than once and dropped.", ("handler",))
+user_lock_waits = metrics.counter("fairy_user_lock_waits_total",
+                                  "Clicks that waited for the same user's previous click to finish.", ("handler",))
+drain_turned_away = metrics.counter("fairy_drain_turned_away_total",
+                                    "Clicks turned away because the process was draining.", ("handler",))
+view_timeouts = metrics.counter("fairy_view_timeouts_total", "Quiz views that timed out.", ("step",))
+
+rest_calls = Counter()  # "METHOD /path" -> calls made by this process
+rest_call_session = ContextVar("rest_call_session", default=None)  # Quiz session the current handler works for
+current_handler = ContextVar("current_handler", default=None)  # HandlerContext of the running handler
+
+class HandlerContext:
+    __slots__ = ("name", "interaction", "rest_calls")
+
+    def __init__(self, name: str, interaction):
+        self.name = name
+        self.interaction = interaction
+        self.rest_calls = 0
+
+def instrumented(handler_name: str, interaction_arg: int = 0):
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            context = HandlerContext(handler_name, args[interaction_arg])
+            token = current_handler.set(context)
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            except Exception:
+                handler_errors.inc(handler_name)
+                raise
+            finally:
+                handler_seconds.observe(time.perf_counter() - started, handler_name)
+                handler_rest_calls.observe(context.rest_calls, handler_name)
+                current_handler.reset(token)
+        return wrapper
+    return decorator
+
+def serialized_per_user(handler_name: str, interaction_arg: int = 0):
+    # Handles each interaction once, and one at a time per user, so a double click
+    # can't advance a session twice. Once the process is draining, clicks are turned away here.
+    def decorator(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            interaction = args[interaction_arg]
+            if user_guard.seen(interaction.id):
+                duplicate_interactions.inc(handler_name)
+                logging.warning(f"Dropping duplicate interaction {interaction.id} for {handler_name}")
+                return None
+            if draining:
+                # Nothing new is let into user_guard, so the clicks already in it can finish and the drain can hand off
+                return await turn_away_while_draining(interaction, handler_name)
+            if user_guard.busy(interaction.user.id):
+                user_lock_waits.inc(handler_name)
+            async with user_guard.hold(interaction.user.id):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorator
+
+async def _timed_rest_call(route, request):
+    key = f"{route.method} {route.path}"
+    rest_calls[key] += 1
+    session = rest_call_session.get()
+    if session is not None:
+        session.rest_calls += 1
+    handler = current_handler.get()
+    if handler is not None:
+        handler.rest_calls += 1
+
+    started = time.perf_counter()
+    try:
+        return await request
+    except discord.HTTPException as e:
+        rest_errors.inc(type(e).__name__ if type(e) is not discord.HTTPException else f"HTTP {e.status}")
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        rest_seconds.observe(elapsed, key)
+        if handler is not None and route.path.endswith("/callback"):
+            # The interaction callback is what Discord's 3-second deadline is measured against
+            interaction_callback_seconds.observe(elapsed, handler.name)
+            clicked_at = discord.utils.snowflake_time(handler.interaction.id)
+            interaction_ack_seconds.observe((discord.utils.utcnow() - clicked_at).total_seconds(), handler.name)
 
-# Initialize the bot with a command prefix and intents
-bot = commands.Bot(command_prefix="!", intents=intents)
+_http_request = bot.http.request
+
+async def _counted_request(route, **kwargs):
+    return await _timed_rest_call(route, _http_request(route, **kwargs))
+
+bot.http.request = _counted_request
+
+# Interaction responses, followups and original-response edits go through the webhook adapter instead
+_webhook_request = AsyncWebhookAdapter.request
+
+async def _counted_webhook_request(self, route, *args, **kwargs):
+    if interactions_endpoint is not None and route.method == "POST" and route.path.endswith("/callback"):
+        reply = interactions_endpoint.pending(route.webhook_id)
+        if reply is not None:
+            return await _respond_over_http(self, reply, kwargs)
+    return await _timed_rest_call(route, _webhook_request(self, route, *args, **kwargs))
+
+async def _respond_over_http(adapter, reply, kwargs):
+    # The interaction arrived on the HTTP endpoint: its first response becomes the HTTP reply
+    payload, multipart = kwargs.get("payload"), kwargs.get("multipart")
+    handler = current_handler.get()
+    if not reply.deferred:
+        if handler is not None:
+            clicked_at = discord.utils.snowflake_time(handler.interaction.id)
+            interaction_ack_seconds.observe((discord.utils.utcnow() - clicked_at).total_seconds(), handler.name)
+        return await interactions_endpoint.respond_inline(reply, payload, multipart)
+    # Too late for the HTTP reply, which already deferred; send it to the interaction webhook instead
+    method, path, data = interactions_endpoint.late_response(reply, payload, multipart)
+    if method:
+        route = Route(method, path, webhook_id=reply.application_id, webhook_token=reply.token)
+        await _timed_rest_call(route, _webhook_request(adapter, route, session=kwargs["session"], proxy=kwargs.get("proxy"),
+                                                       proxy_auth=kwargs.get("proxy_auth"), payload=data))
+    return {"interaction": {"id": str(reply.interaction_id), "type": reply.interaction_type}}
+
+AsyncWebhookAdapter.request = _counted_webhook_request
 
 # --- Constants ---
 STEP_AWAITING_GENDER = -1
 STEP_AWAITING_REALM = -2
 STEP_QUIZ_START = 0
 
+# Stateless quiz custom_ids look like "fq:<user_id>:<pack>:<state>", where <pack> is the start of
+# the quiz pack version and <state> is the gender index, the realm index and then one option
+# index per answered question.
+STATELESS_CUSTOM_ID_PREFIX = "fq"
+STATELESS_PACK_TAG_LENGTH = 6  # Hex digits of the pack version; keeps custom_ids under Discord's 100 characters
+STATELESS_KEPT_PACKS = 2  # Retired pack versions kept for stateless quizzes still in progress after a reload
+STATELESS_STATE_GENDER_ONLY = 1
+STATELESS_STATE_ANSWERS_START = 2
+STATELESS_STATE_MAX_DIGITS = STATELESS_STATE_ANSWERS_START + MAX_STATELESS_QUESTIONS
+
 # --- Configuration ---
 TOKEN = os.getenv('TOKEN')
-CHANNEL_ID = int(os.getenv('CHANNEL_ID'))  # Channel where the quiz will be conducted
+CHANNEL_ID = int(os.getenv('CHANNEL_ID', '0'))  # Legacy single quiz channel; seeds its guild's config on first start
+GUILD_CONFIG_PATH = os.getenv('GUILD_CONFIG_PATH', 'guild_config.sqlite3')  # Per-guild quiz channel and settings
+GUILD_CONFIG_CACHE = int(os.getenv('GUILD_CONFIG_CACHE', '4096'))  # Guild configs kept in memory
+STARTUP_CONCURRENCY = int(os.getenv('STARTUP_CONCURRENCY', '8'))  # Guilds whose start message is set up at once
+RESULTS_DB_PATH = os.getenv('RESULTS_DB_PATH', 'results.sqlite3')  # Completed quizzes and stats; empty keeps stats in memory only
+RESULTS_FLUSH_INTERVAL = float(os.getenv('RESULTS_FLUSH_INTERVAL', '2'))  # Seconds between batched result writes
+QUIZ_PACK_PATH = os.getenv('QUIZ_PACK_PATH', '')  # JSON/TOML quiz pack; empty uses the built-in content below
+QUIZ_PACK_WATCH_INTERVAL = float(os.getenv('QUIZ_PACK_WATCH_INTERVAL', '5'))  # Seconds between pack file checks; 0 disables
+RESULT_CARDS = os.getenv('RESULT_CARDS', '1').lower() in ('1', 'true', 'yes')  # Attach a rendered image card to results
+CARD_WORKERS = int(os.getenv('CARD_WORKERS', '2'))  # Processes rendering result cards
+CARD_CACHE_MB = float(os.getenv('CARD_CACHE_MB', '32'))  # Finished cards kept in memory
+CARD_CACHE_DIR = os.getenv('CARD_CACHE_DIR', '')  # Also keep finished cards on disk here; empty disables
+CARD_TIMEOUT = float(os.getenv('CARD_TIMEOUT', '3'))  # Send the result without a card if rendering takes longer
+VIEW_TIMEOUT = float(os.getenv('VIEW_TIMEOUT', '180'))  # Seconds a quiz step waits for a click
+TIMEOUT_EDIT_RATE = float(os.getenv('TIMEOUT_EDIT_RATE', '20'))  # "Timed out" edits sent per second at most
+INTERACTION_DEDUPE_TTL = float(os.getenv('INTERACTION_DEDUPE_TTL', '60'))  # Seconds an interaction ID is remembered to drop redeliveries
+SESSION_MAX = int(os.getenv('SESSION_MAX', '50000'))  # Hard cap on in-flight quiz sessions
+SESSION_TTL = float(os.getenv('SESSION_TTL', '900'))  # Seconds of inactivity before a session is evicted
+SESSION_SNAPSHOT_PATH = os.getenv('SESSION_SNAPSHOT_PATH', 'sessions.sqlite3')  # Empty disables snapshots
+SESSION_SNAPSHOT_INTERVAL = float(os.getenv('SESSION_SNAPSHOT_INTERVAL', '60'))
+DRAIN_TIMEOUT = float(os.getenv('DRAIN_TIMEOUT', '20'))  # Seconds a SIGTERM/SIGINT drain waits for in-flight clicks and queued sends
+BOT_STATE_PATH = os.getenv('BOT_STATE_PATH', 'bot_state.json')  # Pre-guild-config start message record, read once to migrate
+EPHEMERAL_QUIZ = os.getenv('EPHEMERAL_QUIZ', '0').lower() in ('1', 'true', 'yes')  # Run the quiz in one ephemeral message
+QUIZ_MODE = "ephemeral" if EPHEMERAL_QUIZ else "channel"
+OUTBOUND_MIN_INTERVAL = float(os.getenv('OUTBOUND_MIN_INTERVAL', '0'))  # Extra pause between sends/edits on one channel
+OUTBOUND_CONCURRENCY = int(os.getenv('OUTBOUND_CONCURRENCY', '4'))  # Sends/edits in flight at once per channel
+METRICS_PORT = int(os.getenv('METRICS_PORT', '0'))  # Serve Prometheus metrics on this port; 0 disables
+METRICS_HOST = os.getenv('METRICS_HOST', '0.0.0.0')
+INTERACTIONS_PORT = int(os.getenv('INTERACTIONS_PORT', '0'))  # Take interactions as signed HTTP requests on this port instead of the gateway
+INTERACTIONS_HOST = os.getenv('INTERACTIONS_HOST', '0.0.0.0')
+# Slash commands are synced by one process: by default the gateway process (worker 0 under cluster.py), never an HTTP replica
+SYNC_COMMANDS = os.getenv('SYNC_COMMANDS', '0' if INTERACTIONS_PORT or CLUSTER_WORKER else '1').lower() in ('1', 'true', 'yes')
+DISCORD_PUBLIC_KEY = os.getenv('DISCORD_PUBLIC_KEY', '')  # Application public key (hex) that HTTP interactions are signed with
+STATELESS_QUIZ = os.getenv('STATELESS_QUIZ', '0').lower() in ('1', 'true', 'yes')  # Keep quiz state in custom_ids instead of user_sessions
+STATELESS_QUIZ = STATELESS_QUIZ or bool(INTERACTIONS_PORT)  # HTTP replicas share nothing, so the state has to travel with the click
+PACK_MAX_QUESTIONS = MAX_STATELESS_QUESTIONS if STATELESS_QUIZ else None  # Longer packs would outgrow the custom_ids
 
 # --- Data Structures ---
 questions = [
@@ -53,6 +280,20 @@ questions = [
     }
 ]
 
+gender_options = [
+    ("Man", "Man", discord.ButtonStyle.primary),
+    ("Woman", "Woman", discord.ButtonStyle.primary),
+    ("Other/Prefer Not to Say", "Other", discord.ButtonStyle.secondary),
+]
+
+realm_options = [
+    ("Fairy Folk", discord.ButtonStyle.green),
+    ("Celtic Gods", discord.ButtonStyle.blurple),
+    ("Druids", discord.ButtonStyle.grey),
+    ("Warriors", discord.ButtonStyle.red),
+    ("Mythical Creatures", discord.ButtonStyle.blurple),
+]
+
 prefixes = ["Pooka", "Fae", "Briar", "Niamh", "Siobhan", "Gloam", "Donn", "Cael", "Aos Sí", "Selkie", "Banshee", "Clurichaun", "Leprechaun"]
 suffixes = ["of the Glens", "Shadowstep", "Mistwhisper", "Nightwail", "Goldhand", "Ó Faery", "Gleannán", "Fogdrift"]
 fairy_lore = {
@@ -66,7 +307,101 @@ fairy_lore = {
     "Dullahan": "A grim and powerful figure, often a silent observer who commands respect, and perhaps a little fear. You carry an aura of significant, unspoken power.",
 }
 
-user_sessions = {}
+# The content above is the built-in quiz pack. QUIZ_PACK_PATH swaps in a pack file instead, which
+# can be reloaded while the bot runs; sessions stay on the pack version they started with.
+BUILTIN_PACK = {"name": "builtin", "questions": questions, "fairy_lore": fairy_lore, "prefixes": prefixes, "suffixes": suffixes}
+
+quiz_pack_signature = None  # (mtime, size) of the pack file at the last check
+
+def pack_file_signature() -> tuple[int, int] | None:
+    try:
+        stat = os.stat(QUIZ_PACK_PATH)
+    except OSError:
+        return None  # Mid-replace or removed
+    return stat.st_mtime_ns, stat.st_size
+
+def initial_pack():
+    global quiz_pack_signature
+    if QUIZ_PACK_PATH:
+        # Taken before the read, so watch_quiz_pack still sees an edit that lands from here on
+        quiz_pack_signature = pack_file_signature()
+        try:
+            return load_pack(QUIZ_PACK_PATH, PACK_MAX_QUESTIONS)
+        except (OSError, PackError) as e:
+            logging.error(f"Couldn't load quiz pack {QUIZ_PACK_PATH}, using the built-in quiz: {e}")
+    return build_pack(BUILTIN_PACK, "bot.py", max_questions=PACK_MAX_QUESTIONS)
+
+# Stateless quizzes hold no session that would keep their pack alive, so the registry keeps a few itself
+packs = PackRegistry(initial_pack(), keep_previous=STATELESS_KEPT_PACKS if STATELESS_QUIZ else 0)
+
+# Serializes each user's clicks and drops redelivered interactions
+user_guard = UserGuard(dedupe_ttl=INTERACTION_DEDUPE_TTL)
+interactions_endpoint = None  # Set by serve_interactions() in HTTP interactions mode
+draining = False  # Set on SIGTERM/SIGINT; clicks are turned away while the sessions are handed off
+drained = asyncio.Event()  # Set once the drain has handed off the sessions, or on a second signal
+drain_task = None
+drain_signal = None  # (signum, loop time) of the signal that started the drain
+DRAIN_REPEAT_WINDOW = 1.0  # Seconds in which a repeat of the same signal is one keypress/process-group echo, not a second request
+handed_off_sessions = None  # Sessions written by the drain; the shutdown path doesn't snapshot again if set
+
+# Per-channel queue for quiz sends and timeout edits
+outbound = OutboundScheduler(min_interval=OUTBOUND_MIN_INTERVAL, concurrency=OUTBOUND_CONCURRENCY)
+
+# Deadlines of every live quiz step view, keyed by user; swept once per tick by expire_views()
+view_expiry = TimingWheel()
+pending_timeout_edits = deque()  # Expired views whose "timed out" edit hasn't been sent yet
+timeout_edit_tasks = set()
+
+completed_quizzes = Counter()  # Quiz mode -> completed quizzes
+completed_quiz_rest_calls = Counter()  # Quiz mode -> REST calls spent on those quizzes
+start_message_ready = False  # Set once the start buttons have been posted or verified in this process
+start_retry_guilds: set[int] = set()  # Guilds whose start message failed; the next on_ready retries just these
+guild_configs = GuildConfigStore(GUILD_CONFIG_PATH, cache_size=GUILD_CONFIG_CACHE)
+
+results = ResultsStore(RESULTS_DB_PATH or None, flush_interval=RESULTS_FLUSH_INTERVAL)
+card_renderer = None
+if RESULT_CARDS:
+    if cards_available():
+        card_renderer = CardRenderer(HttpAvatarFetcher(), max_workers=CARD_WORKERS, cache_bytes=int(CARD_CACHE_MB * 1024 * 1024),
+                                     cache_dir=CARD_CACHE_DIR or None, timeout=CARD_TIMEOUT)
+    else:
+        logging.warning("RESULT_CARDS is on but Pillow isn't installed; results are sent without image cards.")
+user_sessions = SessionStore(max_sessions=SESSION_MAX, ttl=SESSION_TTL, snapshot_path=SESSION_SNAPSHOT_PATH or None,
+                             on_evict=lambda session: results.record_abandoned(session.guild_id, session.step))
+def quiz_steps(quiz: CompiledQuiz) -> list[int]:
+    # The steps of a quiz in order, for the abandonment funnel in !fairystats
+    return [STEP_AWAITING_GENDER, STEP_AWAITING_REALM, *range(STEP_QUIZ_START, len(quiz.questions))]
+
+def abandon_session(user_id: int):
+    session = user_sessions.pop(user_id)
+    if session is not None:
+        results.record_abandoned(session.guild_id, session.step)
+
+def expire_later(user_id: int, view):
+    previous = view_expiry.schedule(user_id, view, VIEW_TIMEOUT)
+    if previous is not None and previous is not view:
+        previous.stop()  # Superseded by the user's next step; drop it from discord.py's view store
+
+def step_label(step: int) -> str:
+    if step == STEP_AWAITING_GENDER:
+        return "gender"
+    if step == STEP_AWAITING_REALM:
+        return "realm"
+    return f"question_{step + 1}"
+
+metrics.gauge("fairy_active_sessions", "In-flight quiz sessions by step.",
+              lambda: {(step_label(step),): count for step, count in user_sessions.count_by_step().items()}, ("step",))
+metrics.gauge("fairy_quiz_pack_versions", "Quiz pack versions still in use, the current one included.",
+              lambda: {(): len(packs.live_versions())})
+metrics.gauge("fairy_pending_timeout_edits", "Timed-out views whose message edit is still waiting for its turn.",
+              lambda: {(): len(pending_timeout_edits)})
+metrics.gauge("fairy_outbound_queue_depth", "Sends/edits waiting in the outbound queue.", lambda: {(): outbound.queue_depth()})
+metrics.gauge("fairy_outbound_wait_seconds", "Recent outbound queue wait percentiles.",
+              lambda: {(quantile,): outbound.wait_percentiles()[name] for name, quantile in (("p50", "0.5"), ("p99", "0.99"), ("max", "1"))},
+              ("quantile",))
+metrics.gauge("fairy_completed_quizzes", "Completed quizzes by flow mode.",
+              lambda: {(mode,): count for mode, count in completed_quizzes.items()}, ("mode",))
+metrics.gauge("fairy_draining", "1 while the process is draining for shutdown.", lambda: {(): int(draining)})
 
 # --- UI Views ---
 
@@ -75,17 +410,33 @@ class StartQuizView(discord.ui.View):
         super().__init__(timeout=None)  # Persistent view
     
     @discord.ui.button(label="Start Quiz", style=discord.ButtonStyle.green, custom_id="start_quiz_button")
+    @serialized_per_user("start_button", interaction_arg=1)
+    @instrumented("start_button", interaction_arg=1)
     async def start_button(self, interaction: discord.Interaction, button: discord.ui.Button):
         author_id = interaction.user.id
-        logging.info(f"Quiz start button clicked by {interaction.user} ({author_id})")
-        
-        if author_id in user_sessions:
-            session = user_sessions[author_id]
-            current_step = session.get("step")
+        click_log.info("Quiz start button clicked by %s (%s)", interaction.user, author_id, extra=click_fields(interaction))
+
+        if STATELESS_QUIZ:
+            user_guard.forget(author_id)  # A new quiz may click its way through the same states again
+            await interaction.response.send_message(
+                f"Welcome, {interaction.user.mention}! To discover your inner fairy, first, let's set the stage...",
+                view=build_stateless_view(author_id, packs.current, "", [(label, style) for label, _, style in gender_options]),
+                ephemeral=True
+            )
+            return
+
+        session = user_sessions.get(author_id)
+        if session:
+            current_step = session.step
+            if session.restored:
+                # Picked up from a snapshot after a restart; the old buttons are gone, so re-present the step
+                session.restored = False
+                await resume_session(interaction, session)
+                return
             if isinstance(current_step, int) and \
                (current_step == STEP_AWAITING_GENDER or \
                 current_step == STEP_AWAITING_REALM or \
-                (STEP_QUIZ_START <= current_step < len(questions))):
+                (STEP_QUIZ_START <= current_step < len(session.pack.quiz.questions))):
                 step_desc = "selection phase"
                 if current_step == STEP_AWAITING_GENDER: step_desc = "gender selection"
                 elif current_step == STEP_AWAITING_REALM: step_desc = "realm selection"
@@ -98,10 +449,10 @@ class StartQuizView(discord.ui.View):
                 )
                 return
             else: 
-                user_sessions.pop(author_id, None)
+                user_sessions.pop(author_id)
 
         # Initialize session
-        user_sessions[author_id] = {"step": STEP_AWAITING_GENDER, "scores": []}
+        rest_call_session.set(user_sessions.start(author_id, STEP_AWAITING_GENDER, interaction.guild_id, packs.current))
         
         # Send gender selection
         gender_view = GenderSelectionView(author_id)
@@ -110,13 +461,63 @@ class StartQuizView(discord.ui.View):
             view=gender_view,
             ephemeral=True
         )
-        gender_view.message = await interaction.original_response()
+        gender_view.clear_ephemeral_timeout()
+        if EPHEMERAL_QUIZ:
+            gender_view.interaction = interaction
+        else:
+            gender_view.message = await interaction.original_response()
 
-class GenderSelectionView(discord.ui.View):
-    def __init__(self, original_interaction_user_id: int):
-        super().__init__(timeout=180)
+class QuizStepView(discord.ui.View):
+    # Base for the views that wait on one quiz step. They don't run discord.py's per-view
+    # timeout timer; view_expiry holds every live step's deadline and expire_views() sweeps them.
+    def __init__(self, original_interaction_user_id: int, step: int):
+        super().__init__(timeout=None)
         self.original_interaction_user_id = original_interaction_user_id
+        self.step = step
         self.message: discord.Message | None = None
+        self.interaction: discord.Interaction | None = None  # Set instead of message in the ephemeral flow
+        expire_later(original_interaction_user_id, self)
+
+    timeout_text = "This quiz step timed out. Please start the quiz again."  # Set by each step's view
+
+    def clear_ephemeral_timeout(self):
+        # discord.py gives an ephemeral view without a timeout a 15-minute one, and a timer task, when it's
+        # sent. Putting None back makes that task return at its first check instead of firing; the step's
+        # real deadline is the one in view_expiry
+        self.timeout = None
+
+    def expire(self) -> bool:
+        # Ends the step if it's still the session's live one; True if a "timed out" edit is due
+        self.stop()
+        session = user_sessions.get(self.original_interaction_user_id, touch=False)
+        if not session or session.step != self.step:
+            return False  # The quiz moved past this view (or ended), so its message is no longer the live one
+        label = step_label(self.step)
+        logging.info(f"Quiz step {label} timed out for user {self.original_interaction_user_id}")
+        view_timeouts.inc(label)
+        for item in self.children:
+            if isinstance(item, (discord.ui.Button, discord.ui.Select)):
+                item.disabled = True
+        abandon_session(self.original_interaction_user_id)
+        return self.message is not None or self.interaction is not None
+
+    async def send_timeout_edit(self):
+        try:
+            if self.message:
+                await outbound.edit(self.message, content=self.timeout_text, view=self, priority=PRIORITY_COSMETIC)
+            elif self.interaction:
+                await outbound.edit_original_response(self.interaction, content=self.timeout_text, view=self, priority=PRIORITY_COSMETIC)
+        except discord.NotFound:
+            logging.warning(f"Failed to edit message on timeout (message not found for user {self.original_interaction_user_id}, "
+                            f"step {step_label(self.step)}).")
+        except Exception as e:
+            logging.error(f"Failed to edit message on timeout for user {self.original_interaction_user_id}: {e}")
+
+class GenderSelectionView(QuizStepView):
+    def __init__(self, original_interaction_user_id: int):
+        super().__init__(original_interaction_user_id, STEP_AWAITING_GENDER)
+
+    timeout_text = "Gender selection timed out. Please start the quiz again."
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.original_interaction_user_id:
@@ -126,39 +527,24 @@ class GenderSelectionView(discord.ui.View):
 
     @discord.ui.button(label="Man", style=discord.ButtonStyle.primary, custom_id="gender_man")
     async def man_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Gender button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Gender button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_gender_selection(interaction, "Man")
 
     @discord.ui.button(label="Woman", style=discord.ButtonStyle.primary, custom_id="gender_woman")
     async def woman_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Gender button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Gender button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_gender_selection(interaction, "Woman")
 
     @discord.ui.button(label="Other/Prefer Not to Say", style=discord.ButtonStyle.secondary, custom_id="gender_other")
     async def other_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Gender button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Gender button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_gender_selection(interaction, "Other")
 
-    async def on_timeout(self):
-        logging.info(f"Gender selection timed out for user {self.original_interaction_user_id}")
-        if self.message:
-            for item in self.children:
-                if isinstance(item, (discord.ui.Button, discord.ui.Select)):
-                    item.disabled = True
-            try:
-                await self.message.edit(content="Gender selection timed out. Please start the quiz again.", view=self)
-            except discord.NotFound:
-                logging.warning(f"Failed to edit message on timeout (message not found for user {self.original_interaction_user_id}).")
-        
-        session = user_sessions.get(self.original_interaction_user_id)
-        if session and session.get("step") == STEP_AWAITING_GENDER:
-            user_sessions.pop(self.original_interaction_user_id, None)
-
-class RealmSelectionView(discord.ui.View):
+class RealmSelectionView(QuizStepView):
     def __init__(self, original_interaction_user_id: int):
-        super().__init__(timeout=180)
-        self.original_interaction_user_id = original_interaction_user_id
-        self.message: discord.Message | None = None
+        super().__init__(original_interaction_user_id, STEP_AWAITING_REALM)
+
+    timeout_text = "Realm selection timed out. Please start the quiz again."
 
     async def interaction_check(self, interaction: discord.Interaction) -> bool:
         if interaction.user.id != self.original_interaction_user_id:
@@ -168,56 +554,39 @@ class RealmSelectionView(discord.ui.View):
 
     @discord.ui.button(label="Fairy Folk", style=discord.ButtonStyle.green, custom_id="realm_Fairy_Folk")
     async def fairy_folk_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Realm button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Realm button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_realm_selection(interaction, "Fairy Folk")
 
     @discord.ui.button(label="Celtic Gods", style=discord.ButtonStyle.blurple, custom_id="realm_Celtic_Gods")
     async def celtic_gods_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Realm button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Realm button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_realm_selection(interaction, "Celtic Gods")
 
     @discord.ui.button(label="Druids", style=discord.ButtonStyle.grey, custom_id="realm_Druids")
     async def druids_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Realm button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Realm button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_realm_selection(interaction, "Druids")
 
     @discord.ui.button(label="Warriors", style=discord.ButtonStyle.red, custom_id="realm_Warriors")
     async def warriors_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Realm button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Realm button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_realm_selection(interaction, "Warriors")
 
     @discord.ui.button(label="Mythical Creatures", style=discord.ButtonStyle.blurple, custom_id="realm_Mythical_Creatures")
     async def mythical_creatures_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        logging.info(f"Realm button '{button.label}' clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Realm button '%s' clicked by %s (%s)", button.label, interaction.user, interaction.user.id, extra=click_fields(interaction))
         await handle_realm_selection(interaction, "Mythical Creatures")
 
-    async def on_timeout(self):
-        logging.info(f"Realm selection timed out for user {self.original_interaction_user_id}")
-        if self.message:
-            for item in self.children:
-                if isinstance(item, (discord.ui.Button, discord.ui.Select)):
-                    item.disabled = True
-            try:
-                await self.message.edit(content="Realm selection timed out. Please start the quiz again.", view=self)
-            except discord.NotFound:
-                logging.warning(f"Failed to edit message on timeout (message not found for user {self.original_interaction_user_id}).")
-        
-        session = user_sessions.get(self.original_interaction_user_id)
-        if session and session.get("step") == STEP_AWAITING_REALM:
-            user_sessions.pop(self.original_interaction_user_id, None)
-
-class QuizOptionsView(discord.ui.View):
-    def __init__(self, original_interaction_user_id: int, question_index: int):
-        super().__init__(timeout=180)
-        self.original_interaction_user_id = original_interaction_user_id
+class QuizOptionsView(QuizStepView):
+    def __init__(self, original_interaction_user_id: int, question_index: int, quiz: CompiledQuiz):
+        super().__init__(original_interaction_user_id, question_index)
         self.question_index = question_index
-        self.message: discord.Message | None = None
-        
-        q_data = questions[question_index]
-        for i, option_text in enumerate(q_data["options"]):
+        self.timeout_text = f"Question {question_index + 1} timed out. Please start the quiz again."
+
+        for option_text, custom_id in quiz.questions[question_index].buttons:
             button = discord.ui.Button(label=option_text, 
                                        style=discord.ButtonStyle.secondary, 
-                                       custom_id=f"quiz_option_{i}")
+                                       custom_id=custom_id)
             button.callback = self.dynamic_button_callback 
             self.add_item(button)
 
@@ -226,7 +595,7 @@ class QuizOptionsView(discord.ui.View):
             await interaction.response.send_message("This is not your quiz.", ephemeral=True)
             return False
         session = user_sessions.get(interaction.user.id)
-        if not session or session.get("step") != self.question_index:
+        if not session or session.step != self.question_index:
             await interaction.response.send_message("This question is no longer active or your session has changed.", ephemeral=True)
             return False
         return True
@@ -239,7 +608,8 @@ class QuizOptionsView(discord.ui.View):
                 clicked_button_label = child.label
                 break
         
-        logging.info(f"Quiz option button '{clicked_button_label}' (ID: {button_custom_id}) clicked by {interaction.user} ({interaction.user.id})")
+        click_log.info("Quiz option button '%s' (ID: %s) clicked by %s (%s)", clicked_button_label, button_custom_id,
+                       interaction.user, interaction.user.id, extra=click_fields(interaction))
         
         try:
             option_index = int(button_custom_id.split('_')[-1])
@@ -254,29 +624,169 @@ class QuizOptionsView(discord.ui.View):
 
         await handle_quiz_answer(interaction, option_index, self.question_index)
 
-    async def on_timeout(self):
-        logging.info(f"Quiz for user {self.original_interaction_user_id} (Q{self.question_index + 1}) timed out.")
-        if self.message:
-            for item in self.children:
-                if isinstance(item, (discord.ui.Button, discord.ui.Select)):
-                    item.disabled = True
-            try:
-                await self.message.edit(content=f"Question {self.question_index + 1} timed out. Please start the quiz again.", view=self)
-            except discord.NotFound:
-                logging.warning(f"Failed to edit message on timeout (message not found for user {self.original_interaction_user_id}, Q{self.question_index+1}).")
-        
-        session = user_sessions.get(self.original_interaction_user_id)
-        if session and session.get("step") == self.question_index:
-            user_sessions.pop(self.original_interaction_user_id, None)
+class HandedOffDeadline:
+    # Stands in for the step view of a session restored from a snapshot, whose View died with the
+    # process that drew it, so the step still times out and leaves view_expiry when the user clicks on
+    def __init__(self, session):
+        self.user_id = session.user_id
+        self.guild_id = session.guild_id
+        self.step = session.step
+        self.message_id = session.message_id  # Only a channel question can still be edited; ephemeral tokens died too
+        self.channel_id = session.channel_id  # None in snapshots from before it was stored
+
+    def stop(self):
+        pass  # Nothing was registered with discord.py
+
+    def expire(self) -> bool:
+        session = user_sessions.get(self.user_id, touch=False)
+        if not session or session.step != self.step:
+            return False
+        label = step_label(self.step)
+        logging.info(f"Handed-off quiz step {label} timed out for user {self.user_id}")
+        view_timeouts.inc(label)
+        abandon_session(self.user_id)
+        return self.message_id is not None and self.guild_id is not None
+
+    async def send_timeout_edit(self):
+        try:
+            channel_id = self.channel_id
+            if channel_id is None:
+                # Older snapshot: the question most likely went to the guild's quiz channel
+                config = await asyncio.to_thread(guild_configs.get, self.guild_id)
+                if config is None:
+                    return
+                channel_id = config.channel_id
+            message = bot.get_partial_messageable(channel_id).get_partial_message(self.message_id)
+            await outbound.edit(message, content=f"Question {self.step + 1} timed out. Please start the quiz again.", view=None,
+                                priority=PRIORITY_COSMETIC)
+        except discord.NotFound:
+            logging.warning(f"Failed to edit message on timeout (message not found for user {self.user_id}, "
+                            f"step {step_label(self.step)}).")
+        except Exception as e:
+            logging.error(f"Failed to edit message on timeout for user {self.user_id}: {e}")
+
+def schedule_restored_sessions() -> int:
+    # Gives each restored session the time its step had left, counted from its last click
+    now = time.time()
+    sessions = user_sessions.restored_sessions()
+    for session in sessions:
+        view_expiry.schedule(session.user_id, HandedOffDeadline(session), max(0.0, VIEW_TIMEOUT - (now - session.touched_at)))
+    return len(sessions)
+
+class HandedOffStepView(discord.ui.View):
+    # Persistent fallback for the step buttons of sessions restored from a snapshot, e.g. ones
+    # handed off by a draining process. The View that drew those buttons died with that process,
+    # and discord.py only routes a click here when no live, message-bound view claims it.
+    def __init__(self):
+        super().__init__(timeout=None)
+        self.genders = {f"gender_{value.lower()}": value for _, value, _ in gender_options}
+        self.realms = {f"realm_{realm.replace(' ', '_')}": realm for realm, _ in realm_options}
+        # Same custom_ids as GenderSelectionView, RealmSelectionView and CompiledQuestion.buttons
+        for custom_id in [*self.genders, *self.realms, *(f"quiz_option_{i}" for i in range(MAX_OPTIONS))]:
+            button = discord.ui.Button(label=custom_id, custom_id=custom_id)
+            button.callback = self.handed_off_click
+            self.add_item(button)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        session = user_sessions.get(interaction.user.id, touch=False)
+        if session is None:
+            await interaction.response.send_message("This quiz is no longer active. Please start the quiz again.", ephemeral=True)
+            return False
+        # An ephemeral step can only be clicked by its owner; a channel question has to be the one the session waits on
+        if not interaction.message.flags.ephemeral and interaction.message.id != session.message_id:
+            await interaction.response.send_message("This is not your quiz.", ephemeral=True)
+            return False
+        return True
+
+    async def handed_off_click(self, interaction: discord.Interaction):
+        custom_id = interaction.data['custom_id']
+        user_id = interaction.user.id
+        click_log.info("Handed-off button '%s' clicked by %s (%s)", custom_id, interaction.user, user_id, extra=click_fields(interaction))
+        session = user_sessions.get(user_id, touch=False)
+        if session is None:
+            # Timed out between interaction_check and here
+            await interaction.response.send_message("This quiz step timed out. Please start the quiz again.", ephemeral=True)
+            return
+        session.restored = False  # The user is carrying on with the old buttons, so Start doesn't need to re-present the step
+        if custom_id in self.genders:
+            await handle_gender_selection(interaction, self.genders[custom_id])
+        elif custom_id in self.realms:
+            await handle_realm_selection(interaction, self.realms[custom_id])
+        else:
+            # The clicked message has to show the question the session is on, or the answer would land on another one
+            questions = session.pack.quiz.questions
+            embeds = interaction.message.embeds
+            if not (STEP_QUIZ_START <= session.step < len(questions)) or not embeds or \
+               embeds[0].title != questions[session.step].embed.title:
+                await interaction.response.send_message("This question is no longer active. Please start the quiz again.", ephemeral=True)
+                return
+            await handle_quiz_answer(interaction, int(custom_id.rsplit('_', 1)[1]), session.step)
+
+class QuizStateButton(discord.ui.DynamicItem[discord.ui.Button],
+                      template=STATELESS_CUSTOM_ID_PREFIX +
+                      rf":(?P<user_id>[0-9]+):(?:(?P<pack>[0-9a-f]+):)?(?P<state>[0-9]{{1,{STATELESS_STATE_MAX_DIGITS}}})"):
+    # Each button carries the whole quiz state *after* it is clicked, so any process
+    # can handle the click without a session or a live View object. Buttons from before
+    # the pack tag was added still match, without one.
+    def __init__(self, user_id: int, pack_tag: str | None, state: str, label: str,
+                 style: discord.ButtonStyle = discord.ButtonStyle.secondary):
+        super().__init__(
+            discord.ui.Button(label=label, style=style,
+                              custom_id=f"{STATELESS_CUSTOM_ID_PREFIX}:{user_id}:{pack_tag}:{state}")
+        )
+        self.user_id = user_id
+        self.pack_tag = pack_tag
+        self.state = state
+
+    @classmethod
+    async def from_custom_id(cls, interaction: discord.Interaction, item: discord.ui.Button, match: re.Match[str]):
+        return cls(int(match["user_id"]), match["pack"], match["state"], item.label or "", item.style)
+
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        if interaction.user.id != self.user_id:
+            await interaction.response.send_message("This is not your quiz.", ephemeral=True)
+            return False
+        return True
+
+    async def callback(self, interaction: discord.Interaction):
+        click_log.info("Stateless button '%s' (state: %s) clicked by %s (%s)", self.item.label, self.state,
+                       interaction.user, interaction.user.id, extra=click_fields(interaction))
+        await handle_stateless_click(interaction, self.pack_tag, self.state)
+
+def pack_tag(pack) -> str:
+    return pack.version[:STATELESS_PACK_TAG_LENGTH]
+
+def build_stateless_view(user_id: int, pack, state: str, options: list) -> discord.ui.View:
+    view = discord.ui.View(timeout=None)
+    for i, (label, style) in enumerate(options):
+        view.add_item(QuizStateButton(user_id, pack_tag(pack), f"{state}{i}", label, style))
+    # A finished view is still rendered, but discord.py won't keep it in the view store;
+    # clicks are routed to QuizStateButton through the dynamic item registry instead.
+    view.stop()
+    return view
 
 # --- Helper Functions / Interaction Handlers ---
 
+async def turn_away_while_draining(interaction: discord.Interaction, handler_name: str):
+    drain_turned_away.inc(handler_name)
+    if handler_name == "start_button":
+        content = "The quiz is restarting for an update. Please click Start again in a few seconds."
+    else:
+        content = "The quiz is restarting for an update. Your progress is saved; click the same button again in a few seconds."
+    try:
+        await interaction.response.send_message(content, ephemeral=True)
+    except discord.HTTPException as e:
+        logging.warning(f"Couldn't tell user {interaction.user.id} that the quiz is restarting: {e}")
+
+@serialized_per_user("gender_selection")
+@instrumented("gender_selection")
 async def handle_gender_selection(interaction: discord.Interaction, gender: str):
     user_id = interaction.user.id
-    logging.info(f"Processing gender selection for User {user_id}, Gender: {gender}, Interaction ID: {interaction.id}")
+    click_log.info("Processing gender selection for User %s, Gender: %s, Interaction ID: %s", user_id, gender, interaction.id,
+                   extra=click_fields(interaction))
     
     session = user_sessions.get(user_id)
-    if not session or session.get("step") != STEP_AWAITING_GENDER:
+    if not session or session.step != STEP_AWAITING_GENDER:
         try:
             if not interaction.response.is_done():
                  await interaction.response.send_message("Your session is out of sync. Please start the quiz again.", ephemeral=True)
@@ -284,39 +794,48 @@ async def handle_gender_selection(interaction: discord.Interaction, gender: str)
              logging.error(f"Error sending 'session out of sync' message: {e_resp}")
         return
 
-    deferred = False
+    rest_call_session.set(session)
+    responded = False
     try:
-        await interaction.response.defer(thinking=False, ephemeral=False)
-        deferred = True
-
-        session["gender"] = gender
-        session["step"] = STEP_AWAITING_REALM
-        
+        content = f"You've chosen **{gender}**! Now, which mythic realm calls to you?"
         realm_view = RealmSelectionView(user_id)
-        await interaction.edit_original_response(
-            content=f"You've chosen **{gender}**! Now, which mythic realm calls to you?",
-            view=realm_view
-        )
-        realm_view.message = await interaction.original_response()
+        if EPHEMERAL_QUIZ:
+            session.gender = gender
+            session.step = STEP_AWAITING_REALM
+            await interaction.response.edit_message(content=content, view=realm_view)
+            responded = True
+            realm_view.interaction = interaction
+        else:
+            await interaction.response.defer(thinking=False, ephemeral=False)
+            responded = True
+
+            session.gender = gender
+            session.step = STEP_AWAITING_REALM
+
+            await interaction.edit_original_response(content=content, view=realm_view)
+            realm_view.message = await interaction.original_response()
             
-        logging.info(f"Gender selection processed for {user_id}, presenting realm selection.")
+        click_log.info("Gender selection processed for %s, presenting realm selection.", user_id, extra=click_fields(interaction))
 
     except discord.NotFound as e:
         logging.error(f"NotFound (Unknown Interaction?) for {interaction.id} during gender selection: {e}")
     except Exception as e:
         logging.error(f"Generic error for {interaction.id} during gender selection: {e}")
         try:
-            if deferred:
+            if responded:
                 await interaction.followup.send("An error occurred processing your gender selection. Please start the quiz again.", ephemeral=True)
         except Exception as ie:
             logging.error(f"Error sending followup/response in gender selection error handler: {ie}")
 
+@serialized_per_user("realm_selection")
+@instrumented("realm_selection")
 async def handle_realm_selection(interaction: discord.Interaction, realm: str):
     user_id = interaction.user.id
-    logging.info(f"Processing realm selection for User {user_id}, Realm: {realm}, Interaction ID: {interaction.id}")
+    click_log.info("Processing realm selection for User %s, Realm: %s, Interaction ID: %s", user_id, realm, interaction.id,
+                   extra=click_fields(interaction))
 
     session = user_sessions.get(user_id)
-    if not session or session.get("step") != STEP_AWAITING_REALM:
+    if not session or session.step != STEP_AWAITING_REALM:
         try:
             if not interaction.response.is_done():
                  await interaction.response.send_message("Your session is out of sync. Please start the quiz again.", ephemeral=True)
@@ -324,38 +843,51 @@ async def handle_realm_selection(interaction: discord.Interaction, realm: str):
              logging.error(f"Error sending 'session out of sync' message: {e_resp}")
         return
 
-    deferred = False
+    rest_call_session.set(session)
+    responded = False
     try:
+        content = f"You've chosen the realm of **{realm}**! Your adventure begins now..."
+        if EPHEMERAL_QUIZ:
+            quiz = session.pack.quiz
+            session.realm = realm
+            session.step = STEP_QUIZ_START
+            quiz_view = QuizOptionsView(user_id, STEP_QUIZ_START, quiz)
+            await interaction.response.edit_message(content=content, embed=quiz.questions[STEP_QUIZ_START].embed, view=quiz_view)
+            responded = True
+            quiz_view.interaction = interaction
+            click_log.info("Realm selection processed for %s. Realm: %s. Starting questions.", user_id, realm, extra=click_fields(interaction))
+            return
+
         await interaction.response.defer(thinking=False, ephemeral=False)
-        deferred = True
+        responded = True
 
-        session["realm"] = realm
-        session["step"] = STEP_QUIZ_START
+        session.realm = realm
+        session.step = STEP_QUIZ_START
         
-        await interaction.edit_original_response(
-            content=f"You've chosen the realm of **{realm}**! Your adventure begins now...",
-            view=None
-        )
+        await interaction.edit_original_response(content=content, view=None)
             
-        logging.info(f"Realm selection processed for {user_id}. Realm: {realm}. Starting questions.")
-        await send_question(interaction.channel, user_id)
+        click_log.info("Realm selection processed for %s. Realm: %s. Starting questions.", user_id, realm, extra=click_fields(interaction))
+        await send_question(interaction.channel, user_id, interaction.user)
 
     except discord.NotFound as e:
         logging.error(f"NotFound (Unknown Interaction?) for {interaction.id} during realm selection: {e}")
     except Exception as e:
         logging.error(f"Generic error for {interaction.id} during realm selection: {e}")
         try:
-            if deferred:
+            if responded:
                 await interaction.followup.send("An error occurred. Please start the quiz again.", ephemeral=True)
         except Exception as ie:
             logging.error(f"Error sending followup/response in realm selection error handler: {ie}")
 
+@serialized_per_user("quiz_answer")
+@instrumented("quiz_answer")
 async def handle_quiz_answer(interaction: discord.Interaction, choice_index: int, question_index_answered: int):
     user_id = interaction.user.id
-    logging.info(f"Processing quiz answer for User {user_id}, Q{question_index_answered + 1} with option index {choice_index}, Interaction ID: {interaction.id}")
+    click_log.info("Processing quiz answer for User %s, Q%s with option index %s, Interaction ID: %s",
+                   user_id, question_index_answered + 1, choice_index, interaction.id, extra=click_fields(interaction))
 
     session = user_sessions.get(user_id)
-    if not session or session.get("step") != question_index_answered:
+    if not session or session.step != question_index_answered:
         try:
             if not interaction.response.is_done():
                 await interaction.response.send_message("This question is no longer active or your session has an issue. Please start the quiz again.", ephemeral=True)
@@ -363,67 +895,234 @@ async def handle_quiz_answer(interaction: discord.Interaction, choice_index: int
             logging.warning(f"Interaction {interaction.id} (user {user_id}, Q{question_index_answered+1}) already gone when quiz answer state invalid.")
         return
 
-    deferred = False
+    rest_call_session.set(session)
+    responded = False
     try:
+        quiz = session.pack.quiz
+        answer_text = quiz.questions[question_index_answered].answer_texts[choice_index]
+        if EPHEMERAL_QUIZ:
+            session.answers.append(choice_index)
+            session.step += 1
+            if session.step < len(quiz.questions):
+                next_view = QuizOptionsView(user_id, session.step, quiz)
+                await interaction.response.edit_message(content=answer_text, embed=quiz.questions[session.step].embed, view=next_view)
+                responded = True
+                next_view.interaction = interaction
+            else:
+                await interaction.response.edit_message(content=answer_text, embed=None, view=None)
+                responded = True
+                await show_result(interaction.channel, user_id, interaction.user)
+            return
+
         await interaction.response.defer(thinking=False, ephemeral=False)
-        deferred = True
+        responded = True
 
-        current_question_data = questions[question_index_answered]
-        
-        session["scores"].append(current_question_data["scores"][choice_index])
-        session["step"] += 1
+        session.answers.append(choice_index)
+        session.step += 1
 
-        await interaction.edit_original_response(
-            content=f"✅ You chose: **{current_question_data['options'][choice_index]}** for \"{current_question_data['question']}\"",
-            view=None 
-        )
+        await interaction.edit_original_response(content=answer_text, view=None)
         
-        await send_question(interaction.channel, user_id)
+        await send_question(interaction.channel, user_id, interaction.user)
 
     except discord.NotFound as e:
         logging.error(f"NotFound for {interaction.id} during quiz answer: {e}")
     except Exception as e:
         logging.error(f"Error processing quiz answer for {interaction.id}: {e}")
         try:
-            if deferred:
+            if responded:
                 await interaction.followup.send("An error occurred while processing your answer. Please start the quiz again.", ephemeral=True)
         except Exception as ie:
             logging.error(f"Error sending followup/response in quiz answer error handler: {ie}")
 
-async def send_question(channel: discord.abc.Messageable, author_id: int):
+async def resume_session(interaction: discord.Interaction, session):
+    user_id = interaction.user.id
+    logging.info(f"Resuming restored session for user {user_id} at step {session.step}")
+    rest_call_session.set(session)
+    quiz = session.pack.quiz
+
+    if session.step == STEP_AWAITING_GENDER:
+        view = GenderSelectionView(user_id)
+        content = f"Welcome back, {interaction.user.mention}! Let's pick up where you left off..."
+    elif session.step == STEP_AWAITING_REALM:
+        view = RealmSelectionView(user_id)
+        content = f"Welcome back, {interaction.user.mention}! You've chosen **{session.gender}**. Which mythic realm calls to you?"
+    elif EPHEMERAL_QUIZ and session.step < len(quiz.questions):
+        view = QuizOptionsView(user_id, session.step, quiz)
+        await interaction.response.send_message(
+            f"Welcome back, {interaction.user.mention}! Picking up your quiz where you left off...",
+            embed=quiz.questions[session.step].embed, view=view, ephemeral=True
+        )
+        view.clear_ephemeral_timeout()
+        view.interaction = interaction
+        return
+    else:
+        await interaction.response.send_message(
+            f"Welcome back, {interaction.user.mention}! Picking up your quiz where you left off...",
+            ephemeral=True
+        )
+        await send_question(interaction.channel, user_id, interaction.user)
+        return
+
+    await interaction.response.send_message(content, view=view, ephemeral=True)
+    view.clear_ephemeral_timeout()
+    if EPHEMERAL_QUIZ:
+        view.interaction = interaction
+    else:
+        view.message = await interaction.original_response()
+
+def decode_stateless_state(state: str, quiz):
+    # Returns (gender, realm, answers) for a stateless custom_id state, or None if it
+    # doesn't fit `quiz`, the one the custom_id's pack tag points at
+    digits = [int(c) for c in state]
+    if not digits or digits[0] >= len(gender_options):
+        return None
+    gender = gender_options[digits[0]][1]
+
+    realm = None
+    if len(digits) > STATELESS_STATE_GENDER_ONLY:
+        if digits[1] >= len(realm_options):
+            return None
+        realm = realm_options[digits[1]][0]
+
+    answers = digits[STATELESS_STATE_ANSWERS_START:]
+    if len(answers) > len(quiz.questions):
+        return None
+    for question, answer in zip(quiz.questions, answers):
+        if answer >= len(question.options):
+            return None
+    return gender, realm, answers
+
+@serialized_per_user("stateless_click")
+@instrumented("stateless_click")
+async def handle_stateless_click(interaction: discord.Interaction, tag: str | None, state: str):
+    user_id = interaction.user.id
+    click_log.info("Processing stateless quiz click for User %s, Pack: %s, State: %s, Interaction ID: %s", user_id, tag, state,
+                   interaction.id, extra=click_fields(interaction))
+
+    # Answers only mean something against the questions they were given for
+    pack = packs.find(tag) if tag else None
+    if pack is None:
+        logging.info(f"Stateless quiz click from user {user_id} for pack {tag}, which isn't loaded; asking them to start again")
+        try:
+            if not interaction.response.is_done():
+                await interaction.response.send_message("The quiz was updated since you started it. Please start the quiz again.",
+                                                        ephemeral=True)
+        except Exception as e_resp:
+            logging.error(f"Error sending message for a stateless click on an unloaded pack: {e_resp}")
+        return
+
+    # The state is the whole quiz so far, so a second click on the same button has nothing left to do.
+    # It's only marked once the response below has gone out, so a click whose response failed can be retried
+    if user_guard.handled(user_id, (tag, state)):
+        duplicate_interactions.inc("stateless_click")
+        logging.warning(f"Dropping repeated stateless click on state {state} from user {user_id}")
+        try:
+            if not interaction.response.is_done():
+                await interaction.response.defer()
+        except Exception as e_resp:
+            logging.error(f"Error acknowledging a repeated stateless click: {e_resp}")
+        return
+
+    decoded = decode_stateless_state(state, pack.quiz)
+    if decoded is None:
+        logging.error(f"Invalid stateless quiz state '{state}' for user {user_id}")
+        try:
+            if not interaction.response.is_done():
+                await interaction.response.send_message("This quiz button is no longer valid. Please start the quiz again.", ephemeral=True)
+        except Exception as e_resp:
+            logging.error(f"Error sending message for invalid stateless quiz state: {e_resp}")
+        return
+
+    gender, realm, answers = decoded
+    quiz = pack.quiz
+    try:
+        if realm is None:
+            await interaction.response.edit_message(
+                content=f"You've chosen **{gender}**! Now, which mythic realm calls to you?",
+                view=build_stateless_view(user_id, pack, state, realm_options)
+            )
+            user_guard.mark_handled(user_id, (tag, state))
+            return
+
+        if not answers:
+            content = f"You've chosen the realm of **{realm}**! Your adventure begins now..."
+        else:
+            content = quiz.questions[len(answers) - 1].answer_texts[answers[-1]]
+        if EPHEMERAL_QUIZ:
+            if len(answers) < len(quiz.questions):
+                # The next question replaces this one in the same message, so a click is a single response
+                question = quiz.questions[len(answers)]
+                await interaction.response.edit_message(content=content, embed=question.embed,
+                                                        view=build_stateless_view(user_id, pack, state, question.stateless_options))
+                user_guard.mark_handled(user_id, (tag, state))
+                return
+            await interaction.response.edit_message(content=content, embed=None, view=None)
+        else:
+            await interaction.response.edit_message(content=content, view=None)
+        user_guard.mark_handled(user_id, (tag, state))
+
+        if len(answers) >= len(quiz.questions):
+            fairy_type = await send_result(interaction.channel, user_id, answers, gender=gender, realm=realm, user=interaction.user,
+                                           quiz=quiz)
+            if fairy_type is not None:
+                results.record(QuizResult(user_id, interaction.guild_id, gender, realm, bytes(answers), fairy_type, None, time.time()))
+        else:
+            await send_stateless_question(interaction.channel, user_id, pack, state)
+
+    except discord.NotFound as e:
+        logging.error(f"NotFound for {interaction.id} during stateless quiz click: {e}")
+    except Exception as e:
+        logging.error(f"Error processing stateless quiz click for {interaction.id}: {e}")
+        try:
+            if interaction.response.is_done():
+                await interaction.followup.send("An error occurred while processing your answer. Please start the quiz again.", ephemeral=True)
+        except Exception as ie:
+            logging.error(f"Error sending followup in stateless quiz click error handler: {ie}")
+
+async def send_stateless_question(channel: discord.abc.Messageable, author_id: int, pack, state: str):
+    question_index = len(state) - STATELESS_STATE_ANSWERS_START
+    question = pack.quiz.questions[question_index]
+    try:
+        await outbound.send(channel, embed=question.embed,
+                            view=build_stateless_view(author_id, pack, state, question.stateless_options))
+        click_log.info("Stateless question %s sent to %s.", question_index + 1, author_id, extra={"user_id": author_id})
+    except discord.Forbidden:
+        logging.error(f"Lacking permissions to send question to user {author_id} in channel {channel.id}")
+    except Exception as e:
+        logging.error(f"Failed to send question {question_index + 1} to user {author_id}: {e}")
+
+async def send_question(channel: discord.abc.Messageable, author_id: int, user: discord.abc.User | None = None):
     session = user_sessions.get(author_id)
     if session is None:
         logging.warning(f"No session for user {author_id} in send_question")
         await channel.send("Oops! Couldn't find your quiz session. Please start the quiz again.", ephemeral=True)
         return
 
-    current_step = session.get("step")
+    current_step = session.step
     if not isinstance(current_step, int) or current_step < STEP_QUIZ_START:
         logging.warning(f"Invalid step {current_step} for user {author_id} in send_question")
-        user_sessions.pop(author_id, None)
+        user_sessions.pop(author_id)
         await channel.send("There was an issue with your quiz progression. Please start the quiz again.", ephemeral=True)
         return
 
-    if current_step >= len(questions):
-        await show_result(channel, author_id)
+    quiz = session.pack.quiz
+    if current_step >= len(quiz.questions):
+        await show_result(channel, author_id, user)
         return
 
-    q_data = questions[current_step]
-    
-    embed = discord.Embed(
-        title=f"❓ Question {current_step + 1}/{len(questions)}",
-        description=f"**{q_data['question']}**",
-        color=discord.Color.dark_purple()
-    )
-    quiz_view = QuizOptionsView(author_id, current_step)
+    embed = quiz.questions[current_step].embed
+    quiz_view = QuizOptionsView(author_id, current_step, quiz)
     
     try:
-        message = await channel.send(embed=embed, view=quiz_view)
+        message = await outbound.send(channel, embed=embed, view=quiz_view)
         quiz_view.message = message 
-        logging.info(f"Question {current_step + 1} sent to {author_id} with interactive buttons.")
+        session.message_id = message.id
+        session.channel_id = channel.id
+        click_log.info("Question %s sent to %s with interactive buttons.", current_step + 1, author_id, extra={"user_id": author_id})
     except discord.Forbidden:
         logging.error(f"Lacking permissions to send question to user {author_id} in channel {channel.id}")
-        user = bot.get_user(author_id)
+        if user is None:
+            user = bot.get_user(author_id)
         if user:
             try:
                 await user.send("I tried to send you a quiz question, but I don't have permission in that channel. Please check and try again.")
@@ -432,111 +1131,524 @@ async def send_question(channel: discord.abc.Messageable, author_id: int):
     except Exception as e:
         logging.error(f"Failed to send question {current_step + 1} to user {author_id}: {e}")
 
-async def show_result(channel: discord.abc.Messageable, author_id: int):
-    session = user_sessions.pop(author_id, None)
-    if not session or "scores" not in session or not session["scores"]:
+async def show_result(channel: discord.abc.Messageable, author_id: int, user: discord.abc.User | None = None):
+    session = user_sessions.pop(author_id)
+    last_view = view_expiry.cancel(author_id)
+    if last_view is not None:
+        last_view.stop()
+    if not session or not session.answers:
         logging.warning(f"No session or empty scores for user {author_id} when trying to show result.")
         await channel.send("Hmm, it seems your fairy essence couldn't be determined (no answers recorded). Try the quiz again!", ephemeral=True)
         return
 
-    score_counts = Counter(session["scores"])
-    if not score_counts:
-        logging.warning(f"Empty score_counts for user {author_id} despite having scores list.")
+    fairy_type = await send_result(channel, author_id, session.answers, gender=session.gender, realm=session.realm, user=user,
+                                   quiz=session.pack.quiz)
+    if fairy_type is not None:
+        results.record(QuizResult(author_id, session.guild_id, session.gender, session.realm, bytes(session.answers),
+                                  fairy_type, session.started_at, time.time()))
+
+    completed_quizzes[QUIZ_MODE] += 1
+    completed_quiz_rest_calls[QUIZ_MODE] += session.rest_calls
+    click_log.info("Quiz for user %s took %s REST calls (%.1f per completed quiz in %s mode)", author_id, session.rest_calls,
+                   completed_quiz_rest_calls[QUIZ_MODE] / completed_quizzes[QUIZ_MODE], QUIZ_MODE, extra={"user_id": author_id})
+
+async def send_result(channel: discord.abc.Messageable, author_id: int, answers, gender: str | None = None,
+                      realm: str | None = None, user: discord.abc.User | None = None,
+                      quiz: CompiledQuiz | None = None) -> str | None:
+    # Returns the fairy type that was scored, or None if there was nothing to score. `user` is the
+    # interaction's user (a Member in guilds); the caches are only consulted without it. `quiz` is
+    # the pack version the answers belong to, the current one if not given.
+    quiz = quiz or packs.current.quiz
+    result_fairy_type = quiz.scoring.result(answers)
+    if result_fairy_type is None:
+        logging.warning(f"No fairy type scored for user {author_id} despite having answers.")
         await channel.send("Your answers didn't result in a fairy type. Please try the quiz again!", ephemeral=True)
-        return
+        return None
 
-    result_fairy_type = score_counts.most_common(1)[0][0]
-    chosen_prefix = result_fairy_type if result_fairy_type in prefixes else random.choice(prefixes)
-    chosen_suffix = random.choice(suffixes)
-    fairy_name = f"{chosen_prefix} {chosen_suffix}"
-    lore_snippet = fairy_lore.get(result_fairy_type, "A mysterious and enchanting fairy, with tales yet to be widely told.")
-    
-    user = bot.get_user(author_id)
+    fairy_name = quiz.fairy_name(result_fairy_type)
+
+    if user is None:
+        user = bot.get_user(author_id)
+        if isinstance(channel, discord.TextChannel) and channel.guild:
+            user = channel.guild.get_member(author_id) or user
     display_name = user.display_name if user else "Mysterious Soul"
-    avatar_url = user.avatar.url if user and user.avatar else None
+    avatar = user.display_avatar if user else None
+    avatar_url = avatar.url if avatar else None
 
-    if isinstance(channel, discord.TextChannel) and channel.guild:
-        member = channel.guild.get_member(author_id)
-        if member:
-            display_name = member.display_name
-            avatar_url = member.display_avatar.url
+    card = None
+    if card_renderer is not None:
+        card = await card_renderer.render(result_fairy_type, fairy_name, display_name,
+                                          avatar.with_size(256).url if avatar else None, avatar.key if avatar else None)
+    embed = quiz.result_embed(result_fairy_type, fairy_name, display_name, avatar_url, gender=gender, realm=realm,
+                              image_url=f"attachment://{CARD_FILENAME}" if card else None)
+
+    def card_file() -> dict:
+        # A fresh File per send; discord.File is consumed by the upload
+        return {"file": discord.File(io.BytesIO(card), filename=CARD_FILENAME)} if card else {}
 
-    embed = discord.Embed(title="✨ Your Inner Fairy Revealed! ✨", color=discord.Color.random())
-    if avatar_url:
-        embed.set_author(name=f"{display_name}'s Fairy Form", icon_url=avatar_url)
-    else:
-        embed.set_author(name=f"{display_name}'s Fairy Form")
-    embed.add_field(name="Fairy Type", value=f"**{result_fairy_type}**", inline=False)
-    embed.add_field(name="Your Fairy Name", value=f"**{fairy_name}**", inline=False)
-    if 'gender' in session:
-        embed.add_field(name="Gender Chosen", value=f"*{session['gender']}*", inline=True)
-    if 'realm' in session:
-        embed.add_field(name="Realm Chosen", value=f"*{session['realm']}*", inline=True)
-    embed.add_field(name="About Your Kind", value=f"*{lore_snippet}*", inline=False)
-    embed.set_footer(text="(An image of your fairy form remains shrouded in mist... for now!)")
-    
     try:
-        await channel.send(embed=embed)
-        logging.info(f"Result sent to user {author_id}. Fairy type: {result_fairy_type}")
+        await outbound.send(channel, embed=embed, **card_file())
+        click_log.info("Result sent to user %s. Fairy type: %s", author_id, result_fairy_type, extra={"user_id": author_id})
     except discord.Forbidden:
         logging.error(f"Lacking permissions to send result to user {author_id} in channel {channel.id}")
         if user:
             try:
-                await user.send("I couldn't send your quiz results in the channel. Here they are:", embed=embed)
+                await user.send("I couldn't send your quiz results in the channel. Here they are:", embed=embed, **card_file())
             except discord.Forbidden:
                 logging.error(f"Also unable to DM user {author_id} with quiz results.")
+    return result_fairy_type
+
+# --- Start Message ---
+
+def load_bot_state() -> dict:
+    try:
+        with open(BOT_STATE_PATH, encoding="utf-8") as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+    except (OSError, ValueError) as e:
+        logging.warning(f"Couldn't read bot state from {BOT_STATE_PATH}: {e}")
+        return {}
+
+def build_start_embed() -> discord.Embed:
+    return discord.Embed(
+        title="Discover Your Inner Fairy!",
+        description="Click the button below to begin your magical journey and discover which fairy creature you truly are!",
+        color=discord.Color.green()
+    )
+
+async def ensure_start_message(channel: discord.TextChannel, config: GuildConfig) -> int:
+    # Returns the ID of the start message in `channel`, posting a new one if needed
+    if config.channel_id == channel.id and config.start_message_id:
+        try:
+            # StartQuizView is registered as a persistent view in setup_hook, so an existing
+            # message only needs to be confirmed, not re-sent
+            await channel.fetch_message(config.start_message_id)
+            logging.info(f"Reusing start quiz message {config.start_message_id} in channel {channel.id}")
+            return config.start_message_id
+        except discord.NotFound:
+            logging.info(f"Stored start message {config.start_message_id} is gone; posting a new one.")
+
+    if config.purge_on_start:
+        # Clear any existing messages from the bot in this channel; purge uses the bulk-delete
+        # endpoint for anything younger than 14 days
+        try:
+            deleted = await channel.purge(limit=100, check=lambda m: m.author == bot.user, bulk=True)
+        except discord.Forbidden:
+            logging.warning(f"Couldn't clear old messages in channel {channel.id} (bulk delete needs Manage Messages)")
+            deleted = []
+        if deleted:
+            logging.info(f"Removed {len(deleted)} old bot messages from channel {channel.id}")
+
+    message = await channel.send(embed=build_start_embed(), view=StartQuizView())
+    logging.info(f"Successfully sent start quiz message to channel {channel.id}")
+    return message.id
+
+async def legacy_guild_config(guild_ids: set[int]) -> GuildConfig | None:
+    # Turns the old CHANNEL_ID/bot_state.json setup into a guild config row the first time it's seen
+    channel = bot.get_channel(CHANNEL_ID) if CHANNEL_ID else None
+    if channel is None or channel.guild.id not in guild_ids:
+        return None
+    if await asyncio.to_thread(guild_configs.get, channel.guild.id) is not None:
+        return None
+    state = await asyncio.to_thread(load_bot_state)
+    start_message_id = state.get("start_message_id") if state.get("channel_id") == channel.id else None
+    logging.info(f"Migrating CHANNEL_ID {channel.id} to the guild config of guild {channel.guild.id}")
+    return GuildConfig(channel.guild.id, channel.id, start_message_id)
+
+async def start_guilds(configs: list[GuildConfig]) -> tuple[int, set[int]]:
+    # Posts or verifies the start message in every configured guild, STARTUP_CONCURRENCY at a time.
+    # Changed message IDs are written back in one transaction at the end. Returns the number of
+    # guilds that are ready and the IDs of the ones that failed.
+    semaphore = asyncio.Semaphore(STARTUP_CONCURRENCY)
+    changed: list[GuildConfig] = []
+    failed: set[int] = set()
+
+    async def start_one(config: GuildConfig):
+        channel = bot.get_channel(config.channel_id)
+        if channel is None:
+            logging.error(f"Quiz channel {config.channel_id} of guild {config.guild_id} not found")
+            failed.add(config.guild_id)
+            return
+        async with semaphore:
+            try:
+                message_id = await ensure_start_message(channel, config)
+            except discord.Forbidden:
+                logging.error(f"Bot lacks permissions to send messages in channel {channel.id}")
+                failed.add(config.guild_id)
+                return
+            except Exception as e:
+                logging.error(f"Failed to send start quiz message to channel {channel.id}: {e}")
+                failed.add(config.guild_id)
+                return
+        if message_id != config.start_message_id:
+            changed.append(GuildConfig(config.guild_id, config.channel_id, message_id, config.purge_on_start))
+
+    await asyncio.gather(*(start_one(config) for config in configs))
+    if changed:
+        try:
+            await asyncio.to_thread(guild_configs.save_many, changed)
+        except Exception as e:
+            logging.error(f"Failed to save start message IDs for {len(changed)} guilds: {e}")
+    return len(configs) - len(failed), failed
 
 # --- Bot Events ---
 
+@tasks.loop(seconds=SESSION_SNAPSHOT_INTERVAL)
+async def maintain_sessions():
+    evicted = user_sessions.evict_expired()
+    total_bytes, per_session = user_sessions.memory_usage()
+    logging.info(f"Session store: {len(user_sessions)} active, {evicted} expired, {total_bytes} bytes (~{per_session:.0f} bytes/session)")
+    rows = user_sessions.snapshot_rows()
+    try:
+        await asyncio.to_thread(user_sessions.write_snapshot, rows)
+    except Exception as e:
+        logging.error(f"Failed to write session snapshot: {e}")
+
+    waits = outbound.wait_percentiles()
+    logging.info(f"Outbound queue: depth {outbound.queue_depth()}, wait p50 {waits['p50'] * 1000:.0f}ms / "
+                 f"p99 {waits['p99'] * 1000:.0f}ms / max {waits['max'] * 1000:.0f}ms, "
+                 f"{outbound.completed} sent, {outbound.coalesced} edits merged")
+
+@tasks.loop(seconds=view_expiry.tick)
+async def expire_views():
+    for _, view in view_expiry.expire():
+        if view.expire():
+            pending_timeout_edits.append(view)
+    # Sessions end on time; the cosmetic edits trail behind at a bounded rate so that
+    # deadlines that line up don't turn into a burst of REST calls
+    budget = max(1, int(TIMEOUT_EDIT_RATE * view_expiry.tick))
+    while pending_timeout_edits and budget:
+        task = asyncio.create_task(pending_timeout_edits.popleft().send_timeout_edit())
+        timeout_edit_tasks.add(task)
+        task.add_done_callback(timeout_edit_tasks.discard)
+        budget -= 1
+
+@bot.event
+async def setup_hook():
+    try:
+        restored = user_sessions.load_snapshot(resolve_pack=packs.get)
+        if restored:
+            logging.info(f"Restored {restored} quiz sessions from {SESSION_SNAPSHOT_PATH}")
+            schedule_restored_sessions()
+    except Exception as e:
+        logging.error(f"Failed to load session snapshot: {e}")
+    try:
+        recorded = await asyncio.to_thread(results.load)
+        if recorded:
+            logging.info(f"Loaded stats for {recorded} completed quizzes from {RESULTS_DB_PATH}")
+    except Exception as e:
+        logging.error(f"Failed to load quiz stats: {e}")
+    results.start()
+    if QUIZ_PACK_PATH and QUIZ_PACK_WATCH_INTERVAL:
+        watch_quiz_pack.start()
+    if card_renderer is not None:
+        asyncio.create_task(card_renderer.warm())
+    maintain_sessions.start()
+    expire_views.start()
+    if METRICS_PORT:
+        try:
+            await start_metrics_server(metrics, METRICS_HOST, METRICS_PORT)
+        except OSError as e:
+            logging.error(f"Couldn't start metrics server on {METRICS_HOST}:{METRICS_PORT}: {e}")
+    bot.add_view(StartQuizView())
+    if not STATELESS_QUIZ:
+        bot.add_view(HandedOffStepView())
+    if __name__ == "__main__":  # Not when a benchmark imports the bot
+        install_drain_handlers()
+        if INTERACTIONS_ONLY and SYNC_COMMANDS:
+            await sync_slash_commands()
+
+    if STATELESS_QUIZ:
+        bot.add_dynamic_items(QuizStateButton)
+        logging.info("Stateless quiz mode enabled; quiz buttons are handled through dynamic custom_ids.")
+
 @bot.event
 async def on_ready():
+    global start_message_ready, start_retry_guilds
     logging.info(f'Logged in as {bot.user.name} ({bot.user.id})')
     logging.info(f'discord.py version: {discord.__version__}')
-    
-    # Send the start button to the configured channel
-    channel = bot.get_channel(CHANNEL_ID)
-    if channel:
+
+    if start_message_ready and not start_retry_guilds:
+        # on_ready fires again after a gateway reconnect; the start message is already in place
+        logging.info("Reconnected; start message already in place, skipping startup routine.")
+        return
+
+    rest_calls_before = sum(rest_calls.values())
+    started = time.perf_counter()
+    # Only guilds this process can see; in cluster mode the rest are on other workers' shards
+    guild_ids = {guild.id for guild in bot.guilds}
+    if start_message_ready:
+        guild_ids &= start_retry_guilds
+        logging.info(f"Reconnected; retrying the start message in {len(guild_ids)} guilds where it failed.")
+    try:
+        configs = await asyncio.to_thread(guild_configs.load, guild_ids)
+    except Exception as e:
+        logging.error(f"Failed to load guild configs from {GUILD_CONFIG_PATH}: {e}")
+        return
+    try:
+        legacy = await legacy_guild_config(guild_ids)
+    except Exception as e:
+        logging.error(f"Failed to check for a CHANNEL_ID setup to migrate: {e}")
+        legacy = None
+    if legacy is not None:
+        # Saved straight away, so the migration runs once even if the old start message is kept
         try:
-            # Clear any existing messages from the bot in this channel
-            async for message in channel.history(limit=100):
-                if message.author == bot.user:
-                    try:
-                        await message.delete()
-                    except discord.Forbidden:
-                        logging.warning(f"Couldn't delete old message {message.id} in channel {channel.id}")
-                    except discord.NotFound:
-                        pass
-            
-            # Send new start message with button
-            embed = discord.Embed(
-                title="Discover Your Inner Fairy!",
-                description="Click the button below to begin your magical journey and discover which fairy creature you truly are!",
-                color=discord.Color.green()
-            )
-            view = StartQuizView()
-            await channel.send(embed=embed, view=view)
-            logging.info(f"Successfully sent start quiz message to channel {channel.id}")
-        except discord.Forbidden:
-            logging.error(f"Bot lacks permissions to send messages in channel {channel.id}")
+            await asyncio.to_thread(guild_configs.save, legacy)
         except Exception as e:
-            logging.error(f"Failed to send start quiz message to channel {channel.id}: {e}")
+            logging.error(f"Failed to save the migrated config of guild {legacy.guild_id}: {e}")
+        configs.append(legacy)
+    if not configs and not start_message_ready:
+        command = "/setquizchannel" if INTERACTIONS_ONLY else "!setquizchannel"
+        logging.warning(f"None of the {len(guild_ids)} guilds has a quiz channel yet; use {command} in one.")
+
+    ready, failed = await start_guilds(configs)
+    start_message_ready = True
+    start_retry_guilds = failed
+    retry_note = ", retried on the next reconnect" if failed else ""
+    logging.info(f"Start messages ready in {ready} guilds ({len(failed)} failed{retry_note}) "
+                 f"in {time.perf_counter() - started:.2f}s")
+    logging.info(f"Startup routine made {sum(rest_calls.values()) - rest_calls_before} REST calls "
+                 f"({sum(rest_calls.values())} since process start).")
+
+async def reload_quiz_pack() -> str:
+    # Loads QUIZ_PACK_PATH off the event loop and swaps it in for new sessions; returns a status line
+    if not QUIZ_PACK_PATH:
+        return "No QUIZ_PACK_PATH is set, so there's no quiz pack to reload."
+    try:
+        pack = await asyncio.to_thread(load_pack, QUIZ_PACK_PATH, PACK_MAX_QUESTIONS)
+    except (OSError, PackError) as e:
+        logging.error(f"Quiz pack {QUIZ_PACK_PATH} not reloaded: {e}")
+        return f"Quiz pack not reloaded: {e}"
+    previous = packs.current.version
+    if not packs.install(pack):
+        return f"Quiz pack '{pack.name}' is unchanged (version {pack.version})."
+    logging.info(f"Quiz pack '{pack.name}' reloaded: version {previous} -> {pack.version}, "
+                 f"{len(packs.live_versions())} versions in use")
+    return (f"Quiz pack '{pack.name}' updated from version {previous} to {pack.version}. "
+            "Quizzes already in progress finish on the version they started with.")
+
+@tasks.loop(seconds=max(QUIZ_PACK_WATCH_INTERVAL, 1))
+async def watch_quiz_pack():
+    global quiz_pack_signature
+    signature = await asyncio.to_thread(pack_file_signature)
+    if signature is None:
+        return  # Keep serving the current pack
+    if signature != quiz_pack_signature:
+        await reload_quiz_pack()
+    quiz_pack_signature = signature
+
+# The admin commands are hybrid: `!name` in a channel, or `/name` once the command tree is synced
+# (which the SYNC_COMMANDS process does at startup with INTERACTIONS_ONLY, as `!` messages never arrive in that mode)
+async def command_reply(ctx: commands.Context, **kwargs):
+    # A slash invocation has to answer its own interaction; a `!` one posts through the channel queue.
+    # ctx.send would also fetch the response back as a Message, which is one more REST call
+    if ctx.interaction is None:
+        await outbound.send(ctx.channel, **kwargs)
+    elif not ctx.interaction.response.is_done():
+        await ctx.interaction.response.send_message(**kwargs)
     else:
-        logging.error(f"Configured channel {CHANNEL_ID} not found")
+        await ctx.interaction.followup.send(**kwargs)
+
+async def sync_slash_commands():
+    try:
+        synced = await bot.tree.sync()
+        logging.info(f"Synced {len(synced)} slash commands: {', '.join('/' + command.name for command in synced)}")
+    except discord.HTTPException as e:
+        logging.error(f"Failed to sync slash commands: {e}")
+
+@bot.hybrid_command(name="reloadquiz", description="Reload the quiz pack from QUIZ_PACK_PATH.")
+@commands.is_owner()
+async def reload_quiz(ctx: commands.Context):
+    if ctx.interaction is not None:
+        await ctx.defer()  # Loading the pack runs in a thread and may outlast the interaction's 3s
+    await command_reply(ctx, content=await reload_quiz_pack())
+
+@reload_quiz.error
+async def reload_quiz_error(ctx: commands.Context, error: commands.CommandError):
+    if isinstance(error, commands.NotOwner):
+        await ctx.send("Only the bot owner can reload the quiz.", ephemeral=True)
+    else:
+        logging.error(f"!reloadquiz failed: {error}")
+
+async def command_guild_stats(guild_id: int) -> GuildStats:
+    # HTTP replicas behind a load balancer each hold only their own totals, so there the commands read
+    # the aggregate rows every replica writes to the shared RESULTS_DB_PATH, after flushing this one's
+    if INTERACTIONS_PORT and RESULTS_DB_PATH:
+        await results.flush()
+        try:
+            return await asyncio.to_thread(results.read_guild, guild_id)
+        except Exception as e:
+            logging.error(f"Failed to read the stats of guild {guild_id} from {RESULTS_DB_PATH}, using this process's: {e}")
+    return results.guild(guild_id)
+
+def step_name(step: int) -> str:
+    if step == STEP_AWAITING_GENDER:
+        return "Gender"
+    if step == STEP_AWAITING_REALM:
+        return "Realm"
+    return f"Question {step + 1}"
+
+@bot.hybrid_command(name="fairystats", description="Show this server's quiz results and where people drop off.")
+@commands.guild_only()
+async def fairy_stats(ctx: commands.Context):
+    # Reads the incrementally maintained aggregates; no history scan
+    stats = await command_guild_stats(ctx.guild.id)
+    embed = discord.Embed(title="🧚 Fairy Stats", color=discord.Color.purple())
+    if not stats.completed:
+        embed.description = "No one in this server has finished the quiz yet."
+    else:
+        abandoned = sum(stats.abandoned.values())
+        embed.description = (f"**{stats.completed}** quizzes completed, "
+                             f"{stats.completed / (stats.completed + abandoned):.0%} of those started.")
+        embed.add_field(name="Fairy types", inline=False, value="\n".join(
+            f"**{fairy_type}** – {count} ({count / stats.completed:.0%})" for fairy_type, count in stats.type_counts.most_common()))
+        embed.add_field(name="Drop-off by step", inline=False, value="\n".join(
+            f"{step_name(step)}: {reached} reached, {dropped / reached if reached else 0:.0%} left here"
+            for step, reached, dropped in stats.funnel(quiz_steps(packs.current.quiz))))
+    await command_reply(ctx, embed=embed)
+
+@bot.hybrid_command(name="fairyleaderboard", description="Show who in this server has finished the quiz the most.")
+@commands.guild_only()
+async def fairy_leaderboard(ctx: commands.Context):
+    stats = await command_guild_stats(ctx.guild.id)
+    top = sorted(stats.top.items(), key=lambda item: item[1], reverse=True)
+    embed = discord.Embed(title="🏆 Most Enchanted Quiz Takers", color=discord.Color.gold())
+    embed.description = "\n".join(f"{rank}. <@{user_id}> – {count} quizzes" for rank, (user_id, count) in enumerate(top, 1)) \
+        or "No one in this server has finished the quiz yet."
+    await command_reply(ctx, embed=embed)
 
 @bot.event
-async def on_message(message: discord.Message):
-    if message.author == bot.user or message.author.bot:
+async def on_guild_remove(guild: discord.Guild):
+    try:
+        await asyncio.to_thread(guild_configs.delete, guild.id)
+    except Exception as e:
+        logging.error(f"Failed to delete the config of guild {guild.id}: {e}")
+
+@bot.hybrid_command(name="setquizchannel", description="Make this channel the server's quiz channel and post the start button.")
+@app_commands.describe(purge="Delete the bot's earlier messages in this channel first.")
+@app_commands.default_permissions(manage_guild=True)
+@commands.guild_only()
+@commands.has_guild_permissions(manage_guild=True)
+async def set_quiz_channel(ctx: commands.Context, purge: bool = True):
+    # Makes the current channel this guild's quiz channel and posts the start button there
+    if ctx.interaction is not None:
+        await ctx.defer(ephemeral=True)  # Purging and posting can take longer than the 3s an interaction gets
+    config = GuildConfig(ctx.guild.id, ctx.channel.id, purge_on_start=purge)
+    try:
+        config.start_message_id = await ensure_start_message(ctx.channel, config)
+        await asyncio.to_thread(guild_configs.save, config)
+    except discord.Forbidden:
+        logging.error(f"Bot lacks permissions to send messages in channel {ctx.channel.id}")
+        if ctx.interaction is not None:
+            await command_reply(ctx, content="I can't send messages in this channel.", ephemeral=True)
         return
-    await bot.process_commands(message)
+    logging.info(f"Guild {ctx.guild.id} quiz channel set to {ctx.channel.id} by {ctx.author} ({ctx.author.id})")
+    if ctx.interaction is not None:
+        await command_reply(ctx, content="This is now the quiz channel.", ephemeral=True)
+
+@set_quiz_channel.error
+async def set_quiz_channel_error(ctx: commands.Context, error: commands.CommandError):
+    if isinstance(error, commands.MissingPermissions):
+        await ctx.send("You need the Manage Server permission to set the quiz channel.", ephemeral=True)
+    elif isinstance(error, commands.NoPrivateMessage):
+        await ctx.send("The quiz channel can only be set inside a server.", ephemeral=True)
+    else:
+        logging.error(f"!setquizchannel failed in guild {ctx.guild and ctx.guild.id}: {error}")
 
 # --- Main Execution ---
+async def drain():
+    # Rolling-deploy shutdown: turn away new clicks, let the ones in flight finish, flush queued
+    # sends, then hand the remaining sessions to the snapshot file for the next process to load
+    global draining, handed_off_sessions
+    draining = True
+    started = time.perf_counter()
+    loop = asyncio.get_running_loop()
+    deadline = loop.time() + DRAIN_TIMEOUT
+    # Sessions that run out while draining are handed off too; the next process times them out
+    expire_views.cancel()
+    maintain_sessions.cancel()
+
+    idle = await user_guard.wait_idle(max(0.0, deadline - loop.time()))
+    if not idle:
+        logging.warning(f"{len(user_guard)} users still had clicks in flight after {DRAIN_TIMEOUT:.0f}s; handing off anyway")
+    flushed = await outbound.flush(max(0.0, deadline - loop.time()))
+    if not flushed:
+        logging.warning(f"{outbound.queue_depth()} queued sends/edits didn't go out before the drain deadline")
+    try:
+        handed_off_sessions = await asyncio.to_thread(user_sessions.write_snapshot, user_sessions.snapshot_rows())
+    except Exception as e:
+        logging.error(f"Failed to hand off quiz sessions to {SESSION_SNAPSHOT_PATH}: {e}")
+    await results.flush()
+
+    logging.info(f"Drained in {time.perf_counter() - started:.2f}s: {handed_off_sessions or 0} quiz sessions handed off to "
+                 f"{SESSION_SNAPSHOT_PATH or '(snapshots disabled)'}, {drain_turned_away.total():.0f} clicks turned away.")
+    drained.set()
+    await bot.close()
+
+def request_drain(signum: int):
+    global drain_task, drain_signal
+    now = asyncio.get_running_loop().time()
+    if drain_task is None:
+        logging.info(f"Received {signal.Signals(signum).name}; draining for up to {DRAIN_TIMEOUT:.0f}s before shutting down.")
+        drain_signal = (signum, now)
+        drain_task = asyncio.create_task(drain())
+    elif drain_signal[0] == signum and now - drain_signal[1] < DRAIN_REPEAT_WINDOW:
+        logging.info(f"Received {signal.Signals(signum).name} again right away; still draining.")
+    else:
+        logging.warning(f"Received {signal.Signals(signum).name} during the drain; shutting down without waiting for it.")
+        drained.set()
+        asyncio.create_task(bot.close())
+
+def install_drain_handlers():
+    loop = asyncio.get_running_loop()
+    for signum in (signal.SIGTERM, signal.SIGINT):
+        try:
+            loop.add_signal_handler(signum, request_drain, signum)
+        except (NotImplementedError, RuntimeError):
+            return  # No loop signal handlers (Windows); Ctrl+C still stops the bot, without a drain
+
+async def serve_interactions():
+    # HTTP interactions mode: log in over REST only and take clicks from the webhook; no gateway connection
+    global interactions_endpoint
+    interactions_endpoint = InteractionsEndpoint(DISCORD_PUBLIC_KEY, bot._connection.parse_interaction_create)
+    async with bot:
+        await bot.login(TOKEN)
+        runner = await interactions_endpoint.start(INTERACTIONS_HOST, INTERACTIONS_PORT)
+        logging.info(f"Serving HTTP interactions on {INTERACTIONS_HOST}:{INTERACTIONS_PORT}/interactions")
+        try:
+            await drained.wait()
+        finally:
+            await runner.cleanup()
+
 if __name__ == "__main__":
     if not TOKEN or TOKEN == "YOUR_BOT_TOKEN_HERE":
         logging.critical("FATAL ERROR: No valid bot token provided. Exiting.")
+    elif INTERACTIONS_PORT and not DISCORD_PUBLIC_KEY:
+        logging.critical("FATAL ERROR: INTERACTIONS_PORT is set but DISCORD_PUBLIC_KEY isn't. Exiting.")
     else:
         try:
-            bot.run(TOKEN, log_handler=None)
+            if INTERACTIONS_PORT:
+                asyncio.run(serve_interactions())
+            else:
+                bot.run(TOKEN, log_handler=None)
+        except KeyboardInterrupt:
+            logging.info("Interrupted; shutting down.")
         except discord.LoginFailure:
             logging.critical("FATAL ERROR: Improper token has been passed. Login failed.")
         except Exception as e:
-            logging.critical(f"FATAL ERROR: An unexpected error occurred while trying to run the bot: {e}")
\ No newline at end of file
+            logging.critical(f"FATAL ERROR: An unexpected error occurred while trying to run the bot: {e}")
+        finally:
+            try:
+                if handed_off_sessions is None:
+                    saved = user_sessions.write_snapshot()
+                    logging.info(f"Saved {saved} quiz sessions on shutdown.")
+            except Exception as e:
+                logging.error(f"Failed to save session snapshot on shutdown: {e}")
+            try:
+                written = results.flush_sync()
+                logging.info(f"Wrote {written} buffered quiz results on shutdown.")
+            except Exception as e:
+                logging.error(f"Failed to write buffered quiz results on shutdown: {e}")
+            if card_renderer is not None:
+                card_renderer.close()
\ No newline at end of file
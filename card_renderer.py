@@ -0,0 +1,314 @@
+import asyncio
+import functools
+import hashlib
+import importlib.util
+import io
+import logging
+import os
+import pickle
+import random
+import subprocess
+import sys
+from collections import OrderedDict
+from typing import Awaitable, Callable
+
+# Result cards: a PNG with the fairy type's art, the generated fairy name, the
+# user's display name and avatar.
+#
+# Drawing happens in a few worker processes (card_worker.py) so a burst of
+# results can't stall the event loop; a worker that dies is replaced on the
+# next card. Inside each worker the per-type background layer is drawn once
+# and reused. Finished cards are cached by a hash of everything drawn on them,
+# in memory and optionally on disk, so the same user getting the same result
+# again costs a dictionary lookup. Avatars come from an injectable async
+# fetcher, which tests and benchmarks replace with an offline one.
+
+CARD_SIZE = (800, 300)
+AVATAR_SIZE = 160
+CARD_FILENAME = "fairy_card.png"
+DEFAULT_CACHE_BYTES = 32 * 1024 * 1024
+WORKER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "card_worker.py")
+
+AvatarFetcher = Callable[[str], Awaitable[bytes | None]]
+
+
+def cards_available() -> bool:
+    return importlib.util.find_spec("PIL") is not None
+
+
+# --- Drawing (runs in the worker processes) ---
+
+def _type_color(fairy_type: str) -> tuple[int, int, int]:
+    digest = hashlib.sha256(fairy_type.encode()).digest()
+    # Keep the channels bright enough for white text to stay readable on the dark end of the gradient
+    return tuple(80 + b % 150 for b in digest[:3])
+
+
+def _font(size: int):
+    from PIL import ImageFont
+    try:
+        return ImageFont.load_default(size=size)
+    except TypeError:  # Pillow < 10.1 has only the fixed-size bitmap font
+        return ImageFont.load_default()
+
+
+@functools.lru_cache(maxsize=64)
+def _base_layer(fairy_type: str):
+    # The part of the card that only depends on the fairy type: gradient, wings, sparkles, title
+    from PIL import Image, ImageDraw
+
+    width, height = CARD_SIZE
+    r, g, b = _type_color(fairy_type)
+    card = Image.new("RGBA", CARD_SIZE)
+    draw = ImageDraw.Draw(card)
+    for y in range(height):
+        shade = 1 - 0.7 * y / height
+        draw.line([(0, y), (width, y)], fill=(int(r * shade), int(g * shade), int(b * shade), 255))
+
+    wings = Image.new("RGBA", CARD_SIZE)
+    wing_draw = ImageDraw.Draw(wings)
+    cx, cy = width - 150, height // 2
+    for dx, dy in ((-70, -50), (70, -50), (-50, 45), (50, 45)):
+        wing_draw.ellipse([cx + dx - 60, cy + dy - 40, cx + dx + 60, cy + dy + 40], fill=(255, 255, 255, 60))
+    card = Image.alpha_composite(card, wings)
+
+    draw = ImageDraw.Draw(card)
+    rng = random.Random(fairy_type)
+    for _ in range(60):
+        x, y, radius = rng.randrange(width), rng.randrange(height), rng.choice((1, 1, 2, 3))
+        draw.ellipse([x - radius, y - radius, x + radius, y + radius], fill=(255, 255, 240, rng.randrange(120, 255)))
+    draw.text((230, 40), fairy_type, font=_font(44), fill=(255, 255, 255, 255))
+    return card
+
+
+def _avatar_layer(avatar_bytes: bytes | None):
+    from PIL import Image, ImageDraw
+
+    size = (AVATAR_SIZE, AVATAR_SIZE)
+    avatar = None
+    if avatar_bytes:
+        try:
+            avatar = Image.open(io.BytesIO(avatar_bytes)).convert("RGBA").resize(size)
+        except Exception:
+            avatar = None  # Unreadable image: fall back to the placeholder
+    if avatar is None:
+        avatar = Image.new("RGBA", size, (235, 225, 250, 255))
+    mask = Image.new("L", size, 0)
+    ImageDraw.Draw(mask).ellipse([0, 0, AVATAR_SIZE - 1, AVATAR_SIZE - 1], fill=255)
+    avatar.putalpha(mask)
+    return avatar
+
+
+def render_card(fairy_type: str, fairy_name: str, display_name: str, avatar_bytes: bytes | None) -> bytes:
+    from PIL import ImageDraw
+
+    card = _base_layer(fairy_type).copy()
+    card.alpha_composite(_avatar_layer(avatar_bytes), (40, (CARD_SIZE[1] - AVATAR_SIZE) // 2))
+    draw = ImageDraw.Draw(card)
+    draw.text((230, 120), fairy_name, font=_font(32), fill=(255, 250, 220, 255))
+    draw.text((230, 180), display_name[:40], font=_font(24), fill=(230, 230, 240, 255))
+    out = io.BytesIO()
+    card.convert("RGB").save(out, format="PNG", optimize=False)
+    return out.getvalue()
+
+
+def _warm_worker() -> bool:
+    import PIL.Image  # noqa: F401 - pay the import before the first real card
+    return True
+
+
+# --- Worker processes ---
+
+class WorkerDied(RuntimeError):
+    pass
+
+
+class _Worker:
+    # One card_worker.py process, started as a script so it never imports bot.py
+    def __init__(self):
+        self.process = subprocess.Popen([sys.executable, WORKER_SCRIPT], stdin=subprocess.PIPE, stdout=subprocess.PIPE)
+
+    def call(self, func, args) -> tuple[bool, object]:
+        # Blocking round trip; runs in a thread. Returns the worker's (ok, result or exception)
+        try:
+            pickle.dump((func, args), self.process.stdin)
+            self.process.stdin.flush()
+            return pickle.load(self.process.stdout)
+        except (EOFError, OSError) as e:
+            raise WorkerDied(f"card worker {self.process.pid} exited (code {self.process.poll()})") from e
+
+    def alive(self) -> bool:
+        return self.process.poll() is None
+
+    def kill(self):
+        if self.alive():
+            self.process.kill()
+        self.process.wait()
+        for pipe in (self.process.stdin, self.process.stdout):
+            try:
+                pipe.close()
+            except OSError:
+                pass  # Unsent request bytes with nobody left to read them
+
+
+# --- Avatars ---
+
+class HttpAvatarFetcher:
+    def __init__(self, timeout: float = 3.0):
+        self.timeout = timeout
+        self._session = None
+
+    async def __call__(self, url: str) -> bytes | None:
+        import aiohttp
+        if self._session is None:
+            self._session = aiohttp.ClientSession(timeout=aiohttp.ClientTimeout(total=self.timeout))
+        try:
+            async with self._session.get(url) as response:
+                if response.status != 200:
+                    return None
+                return await response.read()
+        except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+            logging.warning(f"Couldn't fetch avatar {url}: {e}")
+            return None
+
+    async def close(self):
+        if self._session is not None:
+            await self._session.close()
+            self._session = None
+
+
+# --- Renderer ---
+
+class CardRenderer:
+    def __init__(self, avatar_fetcher: AvatarFetcher, max_workers: int = 2, cache_bytes: int = DEFAULT_CACHE_BYTES,
+                 cache_dir: str | None = None, timeout: float = 3.0):
+        self.avatar_fetcher = avatar_fetcher
+        self.max_workers = max_workers
+        self.cache_bytes = cache_bytes
+        self.cache_dir = cache_dir  # Shared by every process pointed at it, cluster workers included
+        self.timeout = timeout
+        self._idle: list[_Worker] = []
+        self._workers: set[_Worker] = set()  # Idle and busy, so close() can stop them all
+        self._slots = asyncio.Semaphore(max_workers)
+        self._cache: OrderedDict[str, bytes] = OrderedDict()
+        self._cached_bytes = 0
+        self._inflight: dict[str, asyncio.Task] = {}
+        self.hits = 0
+        self.misses = 0
+        self.failures = 0
+        if cache_dir:
+            os.makedirs(cache_dir, exist_ok=True)
+
+    @staticmethod
+    def card_key(fairy_type: str, fairy_name: str, display_name: str, avatar_key: str | None) -> str:
+        # Everything that ends up on the card; the avatar is identified by Discord's asset hash
+        parts = (fairy_type, fairy_name, display_name, avatar_key or "")
+        return hashlib.sha256("\x1f".join(parts).encode()).hexdigest()
+
+    async def _submit(self, func, *args):
+        # Runs func(*args) in an idle worker, starting one if there's a free slot and none is idle
+        async with self._slots:
+            while self._idle and not self._idle[-1].alive():
+                # Died while idle (OOM killer, a crash in Pillow): drop it and take or start another
+                dead = self._idle.pop()
+                self._workers.discard(dead)
+                dead.kill()
+                logging.warning(f"Card worker {dead.process.pid} exited with code {dead.process.returncode}; replacing it.")
+            if self._idle:
+                worker = self._idle.pop()
+            else:
+                worker = _Worker()
+                self._workers.add(worker)
+            try:
+                ok, result = await asyncio.to_thread(worker.call, func, args)
+            except BaseException:
+                # Dead, or cancelled mid-request with a reply still on its way: either way it isn't reused
+                self._workers.discard(worker)
+                worker.kill()
+                raise
+            self._idle.append(worker)
+        if not ok:
+            raise result
+        return result
+
+    async def warm(self):
+        # Starts the worker processes so the first result doesn't pay for it
+        try:
+            await asyncio.gather(*[self._submit(_warm_worker) for _ in range(self.max_workers)])
+        except Exception as e:
+            logging.warning(f"Couldn't start the card rendering workers: {e!r}")
+
+    def _remember(self, key: str, card: bytes):
+        if key in self._cache:
+            return
+        self._cache[key] = card
+        self._cached_bytes += len(card)
+        while self._cached_bytes > self.cache_bytes and self._cache:
+            _, evicted = self._cache.popitem(last=False)
+            self._cached_bytes -= len(evicted)
+
+    def _disk_path(self, key: str) -> str:
+        return os.path.join(self.cache_dir, f"{key}.png")
+
+    def _read_disk(self, key: str) -> bytes | None:
+        try:
+            with open(self._disk_path(key), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+    def _write_disk(self, key: str, card: bytes):
+        tmp_path = f"{self._disk_path(key)}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(card)
+        os.replace(tmp_path, self._disk_path(key))
+
+    async def _produce(self, key: str, fairy_type: str, fairy_name: str, display_name: str, avatar_url: str | None) -> bytes:
+        if self.cache_dir:
+            card = await asyncio.to_thread(self._read_disk, key)
+            if card is not None:
+                self._remember(key, card)
+                return card
+        avatar_bytes = await self.avatar_fetcher(avatar_url) if avatar_url else None
+        card = await self._submit(render_card, fairy_type, fairy_name, display_name, avatar_bytes)
+        self._remember(key, card)
+        if self.cache_dir:
+            try:
+                await asyncio.to_thread(self._write_disk, key, card)
+            except OSError as e:
+                logging.warning(f"Couldn't write card {key} to {self.cache_dir}: {e}")
+        return card
+
+    def _finished(self, key: str, task: asyncio.Task):
+        self._inflight.pop(key, None)
+        if not task.cancelled():
+            task.exception()  # Marks a failure as seen when every waiter has already timed out
+
+    async def render(self, fairy_type: str, fairy_name: str, display_name: str, avatar_url: str | None = None,
+                     avatar_key: str | None = None) -> bytes | None:
+        # Returns PNG bytes, or None if the card couldn't be made within the timeout
+        key = self.card_key(fairy_type, fairy_name, display_name, avatar_key)
+        card = self._cache.get(key)
+        if card is not None:
+            self.hits += 1
+            self._cache.move_to_end(key)
+            return card
+        self.misses += 1
+        task = self._inflight.get(key)
+        if task is None:
+            task = self._inflight[key] = asyncio.create_task(
+                self._produce(key, fairy_type, fairy_name, display_name, avatar_url))
+            task.add_done_callback(functools.partial(self._finished, key))
+        try:
+            # shield: a timed-out render keeps going and lands in the cache for next time
+            return await asyncio.wait_for(asyncio.shield(task), self.timeout)
+        except Exception as e:
+            self.failures += 1
+            logging.error(f"Couldn't render the result card for {fairy_type}: {e!r}")
+            return None
+
+    def close(self):
+        for worker in self._workers:
+            worker.kill()
+        self._workers.clear()
+        self._idle.clear()
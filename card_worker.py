@@ -0,0 +1,38 @@
+import pickle
+import signal
+import sys
+
+import card_renderer  # noqa: F401 - the functions the bot sends over are looked up here when unpickled
+
+# Result card worker process.
+#
+# CardRenderer starts a few of these as plain scripts, so a worker's __main__
+# is this file rather than a re-run of bot.py. Each request on stdin is a
+# pickled (function, args) pair; each reply on stdout is a pickled
+# (ok, result or exception) pair. The worker exits when the bot closes its stdin.
+
+
+def main():
+    # Ctrl+C in the bot's terminal is for the bot; it closes us when it's done with us
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    requests, replies = sys.stdin.buffer, sys.stdout.buffer
+    sys.stdout = sys.stderr  # Stray prints would corrupt the reply stream
+    while True:
+        try:
+            func, args = pickle.load(requests)
+        except EOFError:
+            return
+        try:
+            reply = (True, func(*args))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            data = pickle.dumps(reply)
+        except Exception:
+            data = pickle.dumps((False, RuntimeError(repr(reply[1]))))
+        replies.write(data)
+        replies.flush()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,175 @@
+# Cluster supervisor: runs the bot as several worker processes, each owning a
+# contiguous range of gateway shards, and restarts workers that exit.
+#
+#   python cluster.py --workers 4                  # shard count recommended by Discord
+#   python cluster.py --workers 4 --shard-count 16
+#
+# Every worker is a normal `python bot.py` with SHARD_COUNT/SHARD_IDS set, so it
+# connects only its own shards and only sees interactions from guilds on them.
+# Per-worker files and ports are derived from the shared configuration.
+
+import argparse
+import asyncio
+import logging
+import os
+import signal
+import subprocess
+import sys
+import time
+
+import discord
+import dotenv
+
+from log_setup import configure_logging
+
+BOT_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), "bot.py")
+POLL_INTERVAL = 1.0
+STABLE_AFTER = 60.0  # A worker that stayed up this long restarts without backoff
+SHUTDOWN_GRACE = 30.0
+
+
+def shard_for_guild(guild_id: int, shard_count: int) -> int:
+    # Discord's routing rule for which shard receives a guild's events
+    return (guild_id >> 22) % shard_count
+
+
+def shard_ranges(shard_count: int, workers: int) -> list[list[int]]:
+    # Contiguous, as-even-as-possible split: 10 shards on 4 workers -> 3, 3, 2, 2
+    base, extra = divmod(shard_count, workers)
+    ranges, start = [], 0
+    for index in range(workers):
+        size = base + (1 if index < extra else 0)
+        ranges.append(list(range(start, start + size)))
+        start += size
+    return [shard_ids for shard_ids in ranges if shard_ids]
+
+
+def worker_env(base: dict, index: int, shard_ids: list[int], shard_count: int) -> dict:
+    env = dict(base)
+    env["SHARD_COUNT"] = str(shard_count)
+    env["SHARD_IDS"] = ",".join(map(str, shard_ids))
+    env["CLUSTER_WORKER"] = str(index)
+    snapshot_path = base.get("SESSION_SNAPSHOT_PATH", "sessions.sqlite3")
+    if snapshot_path:
+        root, ext = os.path.splitext(snapshot_path)
+        env["SESSION_SNAPSHOT_PATH"] = f"{root}.worker{index}{ext}"
+    metrics_port = int(base.get("METRICS_PORT", "0"))
+    if metrics_port:
+        env["METRICS_PORT"] = str(metrics_port + index)
+    return env
+
+
+async def fetch_recommended_shards(token: str) -> int:
+    http = discord.http.HTTPClient()
+    try:
+        await http.static_login(token)
+        shards, _, _ = await http.get_bot_gateway()
+        return shards
+    finally:
+        await http.close()
+
+
+class Worker:
+    def __init__(self, index: int, shard_ids: list[int], env: dict):
+        self.index = index
+        self.shard_ids = shard_ids
+        self.env = env
+        self.process: subprocess.Popen | None = None
+        self.started_at = 0.0
+        self.restarts = 0
+        self.backoff = 1.0
+        self.restart_at = 0.0
+
+    def start(self):
+        # Own session: Ctrl+C reaches only the supervisor, which then signals each worker once to drain
+        self.process = subprocess.Popen([sys.executable, BOT_SCRIPT], env=self.env, start_new_session=True)
+        self.started_at = time.monotonic()
+        logging.info(f"Worker {self.index} (pid {self.process.pid}) started for shards {self.shard_ids}")
+
+
+class Supervisor:
+    def __init__(self, workers: list[Worker], stagger: float, max_backoff: float):
+        self.workers = workers
+        self.stagger = stagger  # Pause between worker starts so identifies don't pile up
+        self.max_backoff = max_backoff
+        self.stopping = False
+
+    def request_stop(self, signum, frame):
+        logging.info(f"Received signal {signum}; stopping workers.")
+        self.stopping = True
+
+    def run(self) -> int:
+        signal.signal(signal.SIGTERM, self.request_stop)
+        signal.signal(signal.SIGINT, self.request_stop)
+
+        for i, worker in enumerate(self.workers):
+            if self.stopping:
+                break
+            if i:
+                time.sleep(self.stagger)
+            worker.start()
+
+        while not self.stopping:
+            now = time.monotonic()
+            for worker in self.workers:
+                if worker.process is None:
+                    if now >= worker.restart_at:
+                        worker.start()
+                    continue
+                code = worker.process.poll()
+                if code is None:
+                    continue
+                if now - worker.started_at >= STABLE_AFTER:
+                    worker.backoff = 1.0
+                worker.restarts += 1
+                worker.restart_at = now + worker.backoff
+                logging.warning(f"Worker {worker.index} exited with code {code}; restart #{worker.restarts} "
+                                f"in {worker.backoff:.0f}s")
+                worker.backoff = min(worker.backoff * 2, self.max_backoff)
+                worker.process = None
+            time.sleep(POLL_INTERVAL)
+
+        self.shutdown()
+        return 0
+
+    def shutdown(self):
+        running = [worker for worker in self.workers if worker.process is not None and worker.process.poll() is None]
+        for worker in running:
+            worker.process.send_signal(signal.SIGINT)  # bot.py drains and hands its sessions off in the snapshot
+        deadline = time.monotonic() + SHUTDOWN_GRACE
+        for worker in running:
+            try:
+                worker.process.wait(timeout=max(0.0, deadline - time.monotonic()))
+            except subprocess.TimeoutExpired:
+                logging.warning(f"Worker {worker.index} didn't exit in {SHUTDOWN_GRACE:.0f}s; killing it.")
+                worker.process.kill()
+                worker.process.wait()
+
+
+def main() -> int:
+    dotenv.load_dotenv()
+    configure_logging(os.getenv('LOG_MODE', 'text'))
+    parser = argparse.ArgumentParser(description="Run the bot as several sharded worker processes.")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--shard-count", type=int, default=0, help="Total shards; 0 asks Discord for its recommendation.")
+    parser.add_argument("--stagger", type=float, default=5.0, help="Seconds between worker starts.")
+    parser.add_argument("--max-backoff", type=float, default=60.0, help="Longest wait before restarting a crashed worker.")
+    args = parser.parse_args()
+
+    shard_count = args.shard_count
+    if not shard_count:
+        token = os.getenv('TOKEN')
+        if not token:
+            logging.critical("FATAL ERROR: --shard-count not given and no TOKEN to ask Discord with.")
+            return 1
+        shard_count = asyncio.run(fetch_recommended_shards(token))
+        logging.info(f"Discord recommends {shard_count} shards")
+
+    ranges = shard_ranges(shard_count, max(1, args.workers))
+    workers = [Worker(i, shard_ids, worker_env(os.environ, i, shard_ids, shard_count)) for i, shard_ids in enumerate(ranges)]
+    logging.info(f"Running {shard_count} shards on {len(workers)} workers")
+    return Supervisor(workers, args.stagger, args.max_backoff).run()
+
+
+if __name__ == "__main__":
+    sys.exit(main())
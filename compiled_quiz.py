@@ -0,0 +1,127 @@
+import random
+from types import MappingProxyType
+from typing import Mapping, NamedTuple
+
+import discord
+
+from scoring import ScoringEngine, option_weights
+
+# Compiled quiz content.
+#
+# compile_quiz() turns the raw questions / fairy_lore / prefixes / suffixes
+# literals into read-only, pre-rendered pieces once at startup, so the per-click
+# path only picks a template (or fills in the user-specific bits) instead of
+# formatting strings and building embeds from scratch.
+
+RESULT_TITLE = "✨ Your Inner Fairy Revealed! ✨"
+RESULT_FOOTER = "(An image of your fairy form remains shrouded in mist... for now!)"
+UNKNOWN_LORE = "A mysterious and enchanting fairy, with tales yet to be widely told."
+RESULT_COLOR_COUNT = 64  # discord.Color.random() is slow enough to show up per click, so draw from a palette
+
+
+class CompiledQuestion(NamedTuple):
+    index: int
+    text: str
+    options: tuple[str, ...]
+    # Fairy type weights for each option
+    weights: tuple[Mapping[str, float], ...]
+    # Shared between every user; discord.py only reads it when serialising a send
+    embed: discord.Embed
+    # (label, custom_id) pairs for QuizOptionsView
+    buttons: tuple[tuple[str, str], ...]
+    # (label, style) pairs for the stateless flow
+    stateless_options: tuple[tuple[str, discord.ButtonStyle], ...]
+    # "✅ You chose ..." confirmation for each option
+    answer_texts: tuple[str, ...]
+
+
+class CompiledResult(NamedTuple):
+    fairy_type: str
+    type_value: str
+    lore_value: str
+    prefix: str | None  # Fixed name prefix when the type is itself a prefix
+
+
+class CompiledQuiz(NamedTuple):
+    questions: tuple[CompiledQuestion, ...]
+    results: Mapping[str, CompiledResult]
+    prefixes: tuple[str, ...]
+    suffixes: tuple[str, ...]
+    result_colors: tuple[discord.Color, ...]
+    scoring: ScoringEngine
+
+    def fairy_name(self, fairy_type: str) -> str:
+        result = self.results.get(fairy_type)
+        prefix = result.prefix if result and result.prefix else random.choice(self.prefixes)
+        return f"{prefix} {random.choice(self.suffixes)}"
+
+    def result_embed(self, fairy_type: str, fairy_name: str, display_name: str, avatar_url: str | None,
+                     gender: str | None = None, realm: str | None = None, image_url: str | None = None) -> discord.Embed:
+        result = self.results.get(fairy_type) or _compile_result(fairy_type, UNKNOWN_LORE, self.prefixes)
+        embed = discord.Embed(title=RESULT_TITLE, color=random.choice(self.result_colors))
+        embed.set_author(name=f"{display_name}'s Fairy Form", icon_url=avatar_url)
+        embed.add_field(name="Fairy Type", value=result.type_value, inline=False)
+        embed.add_field(name="Your Fairy Name", value=f"**{fairy_name}**", inline=False)
+        if gender:
+            embed.add_field(name="Gender Chosen", value=f"*{gender}*", inline=True)
+        if realm:
+            embed.add_field(name="Realm Chosen", value=f"*{realm}*", inline=True)
+        embed.add_field(name="About Your Kind", value=result.lore_value, inline=False)
+        if image_url:
+            embed.set_image(url=image_url)
+        else:
+            embed.set_footer(text=RESULT_FOOTER)
+        return embed
+
+
+def _compile_question(index: int, total: int, q_data: dict) -> CompiledQuestion:
+    options = tuple(q_data["options"])
+    weights = tuple(MappingProxyType(option_weights(entry)) for entry in q_data["scores"])
+    if len(options) != len(weights):
+        raise ValueError(f"Question {index + 1} has {len(options)} options but {len(weights)} scores")
+    embed = discord.Embed(
+        title=f"❓ Question {index + 1}/{total}",
+        description=f"**{q_data['question']}**",
+        color=discord.Color.dark_purple()
+    )
+    return CompiledQuestion(
+        index=index,
+        text=q_data["question"],
+        options=options,
+        weights=weights,
+        embed=embed,
+        buttons=tuple((option_text, f"quiz_option_{i}") for i, option_text in enumerate(options)),
+        stateless_options=tuple((option_text, discord.ButtonStyle.secondary) for option_text in options),
+        answer_texts=tuple(f"✅ You chose: **{option_text}** for \"{q_data['question']}\"" for option_text in options),
+    )
+
+
+def _compile_result(fairy_type: str, lore: str, prefixes: tuple[str, ...]) -> CompiledResult:
+    return CompiledResult(
+        fairy_type=fairy_type,
+        type_value=f"**{fairy_type}**",
+        lore_value=f"*{lore}*",
+        prefix=fairy_type if fairy_type in prefixes else None,
+    )
+
+
+def compile_quiz(questions: list, fairy_lore: dict, prefixes: list, suffixes: list) -> CompiledQuiz:
+    prefixes = tuple(prefixes)
+    compiled_questions = tuple(_compile_question(i, len(questions), q_data) for i, q_data in enumerate(questions))
+
+    results = {fairy_type: _compile_result(fairy_type, lore, prefixes) for fairy_type, lore in fairy_lore.items()}
+    # Types that are scored but have no lore still get a template
+    for question in compiled_questions:
+        for weights in question.weights:
+            for fairy_type in weights:
+                if fairy_type not in results:
+                    results[fairy_type] = _compile_result(fairy_type, UNKNOWN_LORE, prefixes)
+
+    return CompiledQuiz(
+        questions=compiled_questions,
+        results=MappingProxyType(results),
+        prefixes=prefixes,
+        suffixes=tuple(suffixes),
+        result_colors=tuple(discord.Color.random() for _ in range(RESULT_COLOR_COUNT)),
+        scoring=ScoringEngine(tuple(results), [question.weights for question in compiled_questions]),
+    )
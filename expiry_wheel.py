@@ -0,0 +1,71 @@
+import math
+import time
+from typing import Callable, Hashable
+
+# Hashed timing wheel for quiz step timeouts.
+#
+# Every live quiz step view used to carry its own discord.py timeout timer.
+# Here all deadlines sit in one wheel of `slots` buckets, each `tick` seconds
+# wide. A deadline lands in the bucket for its tick number modulo `slots`, so
+# scheduling, rescheduling and cancelling are dictionary operations, and one
+# periodic sweep collects everything that is due in a single batch. Deadlines
+# further out than one turn of the wheel share a bucket with nearer ones and
+# are skipped until their own tick comes round.
+#
+# Each key (a user ID) has at most one deadline; scheduling it again replaces
+# the old entry and hands it back.
+
+DEFAULT_TICK = 1.0
+DEFAULT_SLOTS = 512
+
+
+class TimingWheel:
+    def __init__(self, tick: float = DEFAULT_TICK, slots: int = DEFAULT_SLOTS, clock: Callable[[], float] = time.monotonic):
+        self.tick = tick
+        self.clock = clock
+        self._origin = clock()
+        self._slots: list[dict] = [{} for _ in range(slots)]
+        self._entries: dict[Hashable, tuple[int, object]] = {}  # key -> (deadline tick, value)
+        self._cursor = 0  # Last tick that has been swept
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: Hashable) -> bool:
+        return key in self._entries
+
+    def _tick_at(self, when: float) -> int:
+        return math.floor((when - self._origin) / self.tick)
+
+    def schedule(self, key: Hashable, value, delay: float):
+        # Returns the value this replaces, if the key already had a deadline
+        previous = self.cancel(key)
+        # Round up, and never into a tick that has already been swept
+        deadline = max(math.ceil((self.clock() + delay - self._origin) / self.tick), self._cursor + 1)
+        self._entries[key] = (deadline, value)
+        self._slots[deadline % len(self._slots)][key] = deadline
+        return previous
+
+    def cancel(self, key: Hashable):
+        entry = self._entries.pop(key, None)
+        if entry is None:
+            return None
+        deadline, value = entry
+        del self._slots[deadline % len(self._slots)][key]
+        return value
+
+    def expire(self, now: float | None = None) -> list[tuple[Hashable, object]]:
+        # Removes and returns every (key, value) whose deadline is at or before `now`
+        target = self._tick_at(self.clock() if now is None else now)
+        if target <= self._cursor:
+            return []
+        expired = []
+        # After a long stall every bucket is due at most once
+        for tick in range(self._cursor + 1, min(target, self._cursor + len(self._slots)) + 1):
+            bucket = self._slots[tick % len(self._slots)]
+            due = [key for key, deadline in bucket.items() if deadline <= target]
+            for key in due:
+                del bucket[key]
+                expired.append((key, self._entries.pop(key)[1]))
+        self._cursor = target
+        return expired
@@ -0,0 +1,132 @@
+import sqlite3
+import threading
+from collections import OrderedDict
+
+# Per-guild configuration: which channel hosts the quiz, the start message
+# posted there, and per-guild settings.
+#
+# Rows live in a local SQLite file shared by every bot process (cluster workers
+# included). Reads go through an in-memory LRU cache, so lookups on the
+# interaction path never touch the disk once a guild has been seen; misses are
+# cached too. Writes go to SQLite first and then update the cache. The SQLite
+# calls run in to_thread workers, so the cache itself is guarded by a lock.
+
+DEFAULT_CACHE_SIZE = 4096
+BUSY_TIMEOUT = 5.0  # Seconds to wait on a write lock held by another worker
+
+
+class GuildConfig:
+    __slots__ = ("guild_id", "channel_id", "start_message_id", "purge_on_start")
+
+    def __init__(self, guild_id: int, channel_id: int, start_message_id: int | None = None, purge_on_start: bool = True):
+        self.guild_id = guild_id
+        self.channel_id = channel_id
+        self.start_message_id = start_message_id
+        self.purge_on_start = purge_on_start  # Clear old bot messages before posting a new start message
+
+
+_MISSING = object()
+
+
+class GuildConfigStore:
+    def __init__(self, path: str, cache_size: int = DEFAULT_CACHE_SIZE):
+        self.path = path
+        self.cache_size = cache_size
+        self._cache: OrderedDict[int, GuildConfig | None] = OrderedDict()
+        self._lock = threading.Lock()  # For _cache and the counters; never held across SQLite calls
+        self.hits = 0
+        self.misses = 0
+        self._table_ready = False
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=BUSY_TIMEOUT)
+        if not self._table_ready:
+            with conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS guild_config ("
+                    "guild_id INTEGER PRIMARY KEY, channel_id INTEGER NOT NULL, "
+                    "start_message_id INTEGER, purge_on_start INTEGER NOT NULL DEFAULT 1)"
+                )
+            self._table_ready = True
+        return conn
+
+    def _remember(self, *entries: tuple[int, GuildConfig | None]):
+        with self._lock:
+            for guild_id, config in entries:
+                self._cache[guild_id] = config
+                self._cache.move_to_end(guild_id)
+            while len(self._cache) > self.cache_size:
+                self._cache.popitem(last=False)
+
+    @staticmethod
+    def _from_row(row) -> GuildConfig:
+        guild_id, channel_id, start_message_id, purge_on_start = row
+        return GuildConfig(guild_id, channel_id, start_message_id, bool(purge_on_start))
+
+    def get(self, guild_id: int) -> GuildConfig | None:
+        with self._lock:
+            config = self._cache.get(guild_id, _MISSING)
+            if config is not _MISSING:
+                self.hits += 1
+                self._cache.move_to_end(guild_id)
+                return config
+            self.misses += 1
+        conn = self._connect()
+        try:
+            row = conn.execute(
+                "SELECT guild_id, channel_id, start_message_id, purge_on_start FROM guild_config WHERE guild_id = ?",
+                (guild_id,)
+            ).fetchone()
+        finally:
+            conn.close()
+        config = self._from_row(row) if row else None
+        self._remember((guild_id, config))
+        return config
+
+    def load(self, guild_ids) -> list[GuildConfig]:
+        # Bulk read-through for startup: one query for every guild this process can see
+        wanted = list(guild_ids)
+        configs = []
+        conn = self._connect()
+        try:
+            for i in range(0, len(wanted), 500):  # Stay under SQLite's bound-parameter limit
+                chunk = wanted[i:i + 500]
+                rows = conn.execute(
+                    "SELECT guild_id, channel_id, start_message_id, purge_on_start FROM guild_config "
+                    f"WHERE guild_id IN ({','.join('?' * len(chunk))})",
+                    chunk
+                ).fetchall()
+                configs.extend(self._from_row(row) for row in rows)
+        finally:
+            conn.close()
+        found = {config.guild_id: config for config in configs}
+        self._remember(*((guild_id, found.get(guild_id)) for guild_id in wanted))
+        return configs
+
+    def save(self, config: GuildConfig):
+        self.save_many([config])
+
+    def save_many(self, configs: list[GuildConfig]):
+        if not configs:
+            return
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany(
+                    "INSERT INTO guild_config (guild_id, channel_id, start_message_id, purge_on_start) VALUES (?, ?, ?, ?) "
+                    "ON CONFLICT(guild_id) DO UPDATE SET channel_id = excluded.channel_id, "
+                    "start_message_id = excluded.start_message_id, purge_on_start = excluded.purge_on_start",
+                    [(c.guild_id, c.channel_id, c.start_message_id, int(c.purge_on_start)) for c in configs]
+                )
+        finally:
+            conn.close()
+        self._remember(*((config.guild_id, config) for config in configs))
+
+    def delete(self, guild_id: int):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.execute("DELETE FROM guild_config WHERE guild_id = ?", (guild_id,))
+        finally:
+            conn.close()
+        self._remember((guild_id, None))
@@ -0,0 +1,198 @@
+import asyncio
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Callable
+
+import aiohttp
+from aiohttp import web
+
+# HTTP interactions endpoint.
+#
+# Discord can deliver interactions as signed POST requests to a URL instead of
+# over the gateway. Each request is checked against the application's Ed25519
+# public key and then handed to discord.py as if it were a gateway
+# INTERACTION_CREATE, so the same views, dynamic items and handlers run.
+#
+# A handler's first response (send_message, edit_message, defer) is not sent as
+# a separate callback request. bot.py hands it to respond_inline(), which makes
+# it the body of the HTTP reply and lets the handler carry on once that reply
+# has been written. If a handler hasn't responded within `ack_timeout`, the
+# request is acknowledged with a deferred response, and late_response() turns
+# the handler's response into a request on the interaction webhook instead.
+#
+# Nothing is kept between requests apart from those short-lived replies, so any
+# number of replicas can run behind a load balancer when the quiz itself is
+# stateless.
+
+PING = 1
+APPLICATION_COMMAND = 2
+MESSAGE_COMPONENT = 3
+
+PONG = 1
+CHANNEL_MESSAGE = 4
+DEFERRED_CHANNEL_MESSAGE = 5
+DEFERRED_UPDATE_MESSAGE = 6
+UPDATE_MESSAGE = 7
+
+SIGNATURE_HEADER = "X-Signature-Ed25519"
+TIMESTAMP_HEADER = "X-Signature-Timestamp"
+DEFAULT_ACK_TIMEOUT = 2.5  # Discord fails the interaction if the reply takes more than 3 seconds
+DEFAULT_MAX_SKEW = 300.0  # Seconds a signed timestamp may be off, to limit replays
+LATE_RESPONSE_WINDOW = 900.0  # Interaction tokens stay valid for 15 minutes
+
+
+def load_verify_key(public_key: str):
+    from nacl.signing import VerifyKey
+    return VerifyKey(bytes.fromhex(public_key))
+
+
+def sign(signing_key, timestamp: str, body: bytes) -> str:
+    # What Discord puts in X-Signature-Ed25519; used by the local request generator
+    return signing_key.sign(timestamp.encode() + body).signature.hex()
+
+
+def signature_valid(verify_key, signature: str, timestamp: str, body: bytes) -> bool:
+    from nacl.exceptions import BadSignatureError
+    try:
+        verify_key.verify(timestamp.encode() + body, bytes.fromhex(signature))
+    except (BadSignatureError, ValueError):
+        return False
+    return True
+
+
+class InlineReply:
+    __slots__ = ("interaction_id", "interaction_type", "application_id", "token", "future", "delivered", "deferred",
+                 "created_at")
+
+    def __init__(self, data: dict, loop: asyncio.AbstractEventLoop):
+        self.interaction_id = int(data["id"])
+        self.interaction_type = data["type"]
+        self.application_id = data["application_id"]
+        self.token = data["token"]
+        self.future = loop.create_future()  # (payload, multipart) of the handler's first response
+        self.delivered = asyncio.Event()  # Set once the HTTP reply has been written
+        self.deferred = False
+        self.created_at = time.monotonic()
+
+
+class InteractionsEndpoint:
+    def __init__(self, public_key: str, dispatch: Callable[[dict], None], ack_timeout: float = DEFAULT_ACK_TIMEOUT,
+                 max_skew: float = DEFAULT_MAX_SKEW, clock: Callable[[], float] = time.time):
+        self.verify_key = load_verify_key(public_key)
+        self.dispatch = dispatch  # Takes the interaction payload, e.g. ConnectionState.parse_interaction_create
+        self.ack_timeout = ack_timeout
+        self.max_skew = max_skew
+        self.clock = clock
+        self._replies: dict[int, InlineReply] = {}
+        self._deferred: OrderedDict[int, InlineReply] = OrderedDict()
+        self.handled = 0
+        self.rejected = 0
+        self.inlined = 0
+        self.deferred = 0
+
+    # --- Hooks for the callback request ---
+
+    def pending(self, interaction_id) -> InlineReply | None:
+        # The reply for an interaction this endpoint received, if it can still take a response
+        interaction_id = int(interaction_id)
+        return self._replies.get(interaction_id) or self._deferred.get(interaction_id)
+
+    async def respond_inline(self, reply: InlineReply, payload: dict | None, multipart: list | None) -> dict:
+        # Stands in for POST /interactions/{id}/{token}/callback: the response goes out as the HTTP reply
+        if reply.future.done():
+            raise RuntimeError(f"Interaction {reply.interaction_id} has already been responded to")
+        reply.future.set_result((payload, multipart))
+        await reply.delivered.wait()
+        response_data = (payload or json.loads(multipart[0]["value"])).get("data") or {}
+        return {"interaction": {"id": str(reply.interaction_id), "type": reply.interaction_type,
+                                "response_message_ephemeral": bool(response_data.get("flags", 0) & 64)}}
+
+    def late_response(self, reply: InlineReply, payload: dict | None, multipart: list | None) -> tuple[str, str, dict | None]:
+        # A response that missed the HTTP reply, as (method, path, payload) on the interaction webhook;
+        # the method is empty if there's nothing left to send
+        if not reply.future.done():
+            reply.future.set_result((payload, multipart))
+        self._deferred.pop(reply.interaction_id, None)
+        if payload is None:
+            payload = json.loads(multipart[0]["value"])
+            logging.warning(f"Dropping the attachments of the late response to interaction {reply.interaction_id}")
+        data = payload.get("data")
+        if payload.get("type") == UPDATE_MESSAGE:
+            return "PATCH", "/webhooks/{webhook_id}/{webhook_token}/messages/@original", data
+        if payload.get("type") == CHANNEL_MESSAGE:
+            return "POST", "/webhooks/{webhook_id}/{webhook_token}", data
+        return "", "", None  # Another deferral: the request has already been acknowledged
+
+    # --- HTTP ---
+
+    def _reply_body(self, payload: dict | None, multipart: list | None) -> web.Response:
+        if multipart is None:
+            return web.json_response(payload)
+        form = aiohttp.FormData()
+        for part in multipart:
+            form.add_field(part["name"], part["value"], filename=part.get("filename"), content_type=part.get("content_type"))
+        return web.Response(body=form())
+
+    def _forget_deferred(self):
+        cutoff = time.monotonic() - LATE_RESPONSE_WINDOW
+        while self._deferred:
+            interaction_id, reply = next(iter(self._deferred.items()))
+            if reply.created_at > cutoff and not reply.future.done():
+                break
+            del self._deferred[interaction_id]
+
+    async def handle(self, request: web.Request) -> web.StreamResponse:
+        body = await request.read()
+        signature = request.headers.get(SIGNATURE_HEADER, "")
+        timestamp = request.headers.get(TIMESTAMP_HEADER, "")
+        try:
+            skew = abs(self.clock() - int(timestamp))
+        except ValueError:
+            skew = None
+        if skew is None or skew > self.max_skew or not signature_valid(self.verify_key, signature, timestamp, body):
+            self.rejected += 1
+            return web.Response(status=401, text="invalid request signature")
+
+        try:
+            data = json.loads(body)
+            if data["type"] == PING:
+                return web.json_response({"type": PONG})
+            reply = InlineReply(data, asyncio.get_running_loop())
+        except (ValueError, KeyError, TypeError):
+            return web.Response(status=400, text="malformed interaction")
+
+        self.handled += 1
+        self._forget_deferred()
+        self._replies[reply.interaction_id] = reply
+        try:
+            self.dispatch(data)
+            await asyncio.wait((reply.future,), timeout=self.ack_timeout)
+            if reply.future.done():
+                payload, multipart = reply.future.result()
+                self.inlined += 1
+            else:
+                # Acknowledge now; whatever the handler sends later goes to the interaction webhook
+                reply.deferred = True
+                self.deferred += 1
+                self._deferred[reply.interaction_id] = reply
+                logging.warning(f"No response to interaction {reply.interaction_id} within {self.ack_timeout}s; deferring it")
+                deferred_type = DEFERRED_UPDATE_MESSAGE if reply.interaction_type == MESSAGE_COMPONENT else DEFERRED_CHANNEL_MESSAGE
+                payload, multipart = {"type": deferred_type}, None
+            response = self._reply_body(payload, multipart)
+            await response.prepare(request)
+            await response.write_eof()
+            return response
+        finally:
+            self._replies.pop(reply.interaction_id, None)
+            reply.delivered.set()
+
+    async def start(self, host: str, port: int, path: str = "/interactions") -> web.AppRunner:
+        app = web.Application()
+        app.router.add_post(path, self.handle)
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        await web.TCPSite(runner, host, port).start()
+        return runner
+
@@ -0,0 +1,81 @@
+import atexit
+import json
+import logging
+import logging.handlers
+import queue
+import random
+
+# Logging configuration.
+#
+# "text" keeps the classic basicConfig output. "json" hands records to a queue
+# on the calling thread and does all formatting and I/O on a background
+# listener thread, emitting one JSON object per line. Per-click INFO lines go to
+# the CLICK_LOGGER logger and can be sampled; warnings and errors always pass.
+
+TEXT_FORMAT = '%(asctime)s %(levelname)s [%(funcName)s]: %(message)s'
+CLICK_LOGGER = "fairy.click"
+STRUCTURED_FIELDS = ("interaction_id", "user_id", "guild_id")
+
+
+class ClickSampler(logging.Filter):
+    def __init__(self, rate: float):
+        super().__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return record.levelno >= logging.WARNING or random.random() < self.rate
+
+
+class JsonFormatter(logging.Formatter):
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": self.formatTime(record),
+            "level": record.levelname,
+            "logger": record.name,
+            "func": record.funcName,
+            "message": record.getMessage(),
+        }
+        for field in STRUCTURED_FIELDS:
+            value = getattr(record, field, None)
+            if value is not None:
+                entry[field] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(logging.handlers.QueueHandler):
+    # The stock QueueHandler formats the message before enqueueing it, which is the
+    # work we want off the event loop. Records are passed through as-is instead and
+    # formatted by the listener thread.
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+def configure_logging(mode: str = "text", click_sample_rate: float = 1.0, level: int = logging.INFO):
+    root = logging.getLogger()
+    if mode == "json":
+        log_queue = queue.SimpleQueue()
+        stream_handler = logging.StreamHandler()
+        stream_handler.setFormatter(JsonFormatter())
+        listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+        listener.start()
+        atexit.register(listener.stop)  # Drains whatever is still queued on exit
+        for handler in list(root.handlers):
+            root.removeHandler(handler)
+        root.addHandler(LazyQueueHandler(log_queue))
+        root.setLevel(level)
+    elif not root.hasHandlers():
+        logging.basicConfig(level=level, format=TEXT_FORMAT)
+
+    if click_sample_rate < 1.0:
+        logging.getLogger(CLICK_LOGGER).addFilter(ClickSampler(click_sample_rate))
+
+
+def click_fields(interaction) -> dict:
+    # `extra=` fields for a per-click record
+    return {
+        "interaction_id": interaction.id,
+        "user_id": interaction.user.id,
+        "guild_id": getattr(interaction, "guild_id", None),
+    }
@@ -0,0 +1,175 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+from collections import deque
+
+# Outbound message scheduler.
+#
+# Sends and edits are queued per channel with a few requests in flight at a
+# time, so a burst of quiz takers finishing together can't fire dozens of
+# requests into the same rate-limit bucket at once; discord.py's HTTP client
+# still owns the bucket accounting for the requests we do let through. Live quiz
+# traffic jumps ahead of cosmetic edits (timeouts), edits to a message that is
+# still waiting in the queue are merged into the pending one, and edits to the
+# same message never overlap, so they land in the order they were queued. Each request runs in the context of the handler
+# that queued it, so per-handler and per-quiz REST accounting stays with its caller.
+
+PRIORITY_LIVE = 0
+PRIORITY_COSMETIC = 1
+
+WAIT_SAMPLES = 2048  # Recent queue waits kept for percentiles
+
+
+class _Job:
+    __slots__ = ("priority", "func", "kwargs", "future", "enqueued_at", "coalesce_key", "started", "context")
+
+    def __init__(self, priority, func, kwargs, future, enqueued_at, coalesce_key):
+        self.priority = priority
+        self.func = func
+        self.kwargs = kwargs
+        self.future = future
+        self.enqueued_at = enqueued_at
+        self.coalesce_key = coalesce_key
+        self.started = False
+        self.context = contextvars.copy_context()  # The queuing handler's contextvars
+
+
+class OutboundScheduler:
+    def __init__(self, min_interval: float = 0.0, concurrency: int = 4):
+        self.min_interval = min_interval  # Extra pause each in-flight slot takes between requests
+        self.concurrency = max(1, concurrency)  # Requests in flight at once per channel
+        self._heaps: dict[int, list] = {}
+        self._workers: dict[int, set[asyncio.Task]] = {}
+        self._pending: dict[tuple, _Job] = {}
+        self._running: set[tuple] = set()  # Coalesce keys with a request in flight
+        self._parked: dict[int, dict[tuple, _Job]] = {}  # Edits waiting on an earlier edit of the same message
+        self._seq = itertools.count()
+        self._waits = deque(maxlen=WAIT_SAMPLES)
+        self._depth = 0
+        self.completed = 0
+        self.coalesced = 0
+
+    # --- Public API ---
+
+    async def send(self, channel, priority: int = PRIORITY_LIVE, **kwargs):
+        return await self.submit(channel.id, channel.send, priority, kwargs)
+
+    async def edit(self, message, priority: int = PRIORITY_COSMETIC, **kwargs):
+        return await self.submit(message.channel.id, message.edit, priority, kwargs,
+                                 coalesce_key=("message", message.id))
+
+    async def edit_original_response(self, interaction, priority: int = PRIORITY_COSMETIC, **kwargs):
+        return await self.submit(interaction.channel_id, interaction.edit_original_response, priority, kwargs,
+                                 coalesce_key=("interaction", interaction.id))
+
+    def submit(self, key: int, func, priority: int, kwargs: dict, coalesce_key: tuple | None = None) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        if coalesce_key is not None:
+            job = self._pending.get(coalesce_key)
+            if job is not None:
+                # Still queued: fold this edit into it; later keyword arguments win
+                job.kwargs.update(kwargs)
+                self.coalesced += 1
+                if priority < job.priority:
+                    job.priority = priority
+                    heapq.heappush(self._heaps[key], (priority, next(self._seq), job))
+                return job.future
+
+        job = _Job(priority, func, kwargs, loop.create_future(), loop.time(), coalesce_key)
+        if coalesce_key is not None:
+            self._pending[coalesce_key] = job
+        heapq.heappush(self._heaps.setdefault(key, []), (priority, next(self._seq), job))
+        self._depth += 1
+        workers = self._workers.setdefault(key, set())
+        if len(workers) < self.concurrency:
+            # Workers belong to no handler; each job runs in its own context
+            workers.add(loop.create_task(self._run(key), context=contextvars.Context()))
+        return job.future
+
+    def queue_depth(self) -> int:
+        return self._depth
+
+    def wait_percentiles(self) -> dict[str, float]:
+        # Seconds between enqueue and the request starting, over the recent window
+        if not self._waits:
+            return {"p50": 0.0, "p99": 0.0, "max": 0.0}
+        waits = sorted(self._waits)
+        return {
+            "p50": waits[len(waits) // 2],
+            "p99": waits[min(len(waits) - 1, int(len(waits) * 0.99))],
+            "max": waits[-1],
+        }
+
+    async def flush(self, timeout: float | None = None) -> bool:
+        # Waits for every queued request to finish; returns False if the timeout hit first
+        loop = asyncio.get_running_loop()
+        deadline = None if timeout is None else loop.time() + timeout
+        while self._workers:
+            remaining = None if deadline is None else deadline - loop.time()
+            if remaining is not None and remaining <= 0:
+                return False
+            await asyncio.wait([task for tasks in self._workers.values() for task in tasks], timeout=remaining)
+        return True
+
+    # --- Worker ---
+
+    async def _run(self, key: int):
+        loop = asyncio.get_running_loop()
+        heap = self._heaps[key]
+        parked = self._parked.setdefault(key, {})
+        try:
+            while heap:
+                _, _, job = heapq.heappop(heap)
+                if job.started:
+                    continue  # Stale heap entry left behind by a priority bump
+                if job.coalesce_key in self._running:
+                    # An earlier edit of this message is still in flight; later edits keep merging in here
+                    parked[job.coalesce_key] = job
+                    continue
+                job.started = True
+                self._depth -= 1
+                if job.coalesce_key is not None:
+                    self._pending.pop(job.coalesce_key, None)
+                    self._running.add(job.coalesce_key)
+                self._waits.append(loop.time() - job.enqueued_at)
+
+                try:
+                    result = await asyncio.create_task(job.func(**job.kwargs), context=job.context)
+                except asyncio.CancelledError:
+                    if not job.future.done():
+                        job.future.cancel()
+                    if asyncio.current_task().cancelling():
+                        raise
+                except Exception as e:
+                    if not job.future.done():
+                        job.future.set_exception(e)
+                else:
+                    if not job.future.done():
+                        job.future.set_result(result)
+                finally:
+                    if job.coalesce_key is not None:
+                        self._running.discard(job.coalesce_key)
+                        waiting = parked.pop(job.coalesce_key, None)
+                        if waiting is not None:
+                            heapq.heappush(heap, (waiting.priority, next(self._seq), waiting))
+                self.completed += 1
+
+                if self.min_interval and heap:
+                    await asyncio.sleep(self.min_interval)
+        finally:
+            workers = self._workers[key]
+            workers.discard(asyncio.current_task())
+            if not workers:
+                # Only left non-empty when the last worker is cancelled
+                for job in [entry[2] for entry in heap] + list(parked.values()):
+                    if not job.started:
+                        job.started = True
+                        self._depth -= 1
+                        if job.coalesce_key is not None:
+                            self._pending.pop(job.coalesce_key, None)
+                        if not job.future.done():
+                            job.future.cancel()
+                del self._heaps[key]
+                del self._parked[key]
+                del self._workers[key]
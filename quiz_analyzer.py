@@ -0,0 +1,113 @@
+# Offline result-distribution analyzer for quiz content authors.
+#
+# Scores every answer combination (or a random sample when there are too many to
+# enumerate) in vectorised batches and prints how often each fairy type wins, so
+# the quiz can be balanced without hand-testing.
+#
+#   python quiz_analyzer.py                  # exhaustive if small enough, else sampled
+#   python quiz_analyzer.py --samples 1000000
+#   python quiz_analyzer.py --pack packs/classic.toml
+
+import argparse
+import math
+import os
+from typing import NamedTuple
+
+import numpy as np
+
+from scoring import ScoringEngine
+
+DEFAULT_MAX_EXHAUSTIVE = 1 << 24
+DEFAULT_SAMPLES = 1_000_000
+DEFAULT_BATCH_SIZE = 1 << 16
+
+
+class Distribution(NamedTuple):
+    fairy_types: tuple[str, ...]
+    wins: np.ndarray  # Combinations won per fairy type
+    tie_breaks: np.ndarray  # Of those, wins decided by the tie-break rule
+    combinations: int
+    exhaustive: bool
+
+
+def enumerate_answers(option_counts: np.ndarray, batch_size: int):
+    # Mixed-radix counting: combination code -> one option index per question
+    total = math.prod(int(count) for count in option_counts)
+    place_values = np.ones(len(option_counts), dtype=np.int64)
+    for i in range(len(option_counts) - 2, -1, -1):
+        place_values[i] = place_values[i + 1] * option_counts[i + 1]
+    for start in range(0, total, batch_size):
+        codes = np.arange(start, min(start + batch_size, total), dtype=np.int64)
+        yield (codes[:, None] // place_values) % option_counts
+
+
+def sample_answers(option_counts: np.ndarray, samples: int, batch_size: int, rng: np.random.Generator):
+    for start in range(0, samples, batch_size):
+        size = min(batch_size, samples - start)
+        yield rng.integers(0, option_counts, size=(size, len(option_counts)), dtype=np.int64)
+
+
+def analyze(engine: ScoringEngine, samples: int | None = None, max_exhaustive: int = DEFAULT_MAX_EXHAUSTIVE,
+            batch_size: int = DEFAULT_BATCH_SIZE, seed: int | None = None) -> Distribution:
+    total = math.prod(int(count) for count in engine.option_counts)
+    exhaustive = samples is None and total <= max_exhaustive
+    if exhaustive:
+        batches = enumerate_answers(engine.option_counts, batch_size)
+        combinations = total
+    else:
+        combinations = samples or DEFAULT_SAMPLES
+        batches = sample_answers(engine.option_counts, combinations, batch_size, np.random.default_rng(seed))
+
+    type_count = len(engine.fairy_types)
+    wins = np.zeros(type_count, dtype=np.int64)
+    tie_breaks = np.zeros(type_count, dtype=np.int64)
+    for answer_matrix in batches:
+        winners, tied = engine.batch_results(answer_matrix)
+        wins += np.bincount(winners, minlength=type_count)
+        tie_breaks += np.bincount(winners[tied], minlength=type_count)
+    return Distribution(engine.fairy_types, wins, tie_breaks, combinations, exhaustive)
+
+
+def format_distribution(distribution: Distribution) -> str:
+    mode = "all" if distribution.exhaustive else "a random sample of"
+    lines = [
+        f"Scored {mode} {distribution.combinations:,} answer combinations.",
+        f"{'Fairy type':<16}{'wins':>14}{'share':>9}{'via tie-break':>15}",
+    ]
+    order = np.argsort(-distribution.wins, kind="stable")
+    for i in order:
+        share = distribution.wins[i] / distribution.combinations * 100
+        lines.append(f"{distribution.fairy_types[i]:<16}{distribution.wins[i]:>14,}{share:>8.2f}%{distribution.tie_breaks[i]:>15,}")
+    unreachable = [distribution.fairy_types[i] for i in order if distribution.wins[i] == 0]
+    if unreachable:
+        lines.append(f"Never the result{'' if distribution.exhaustive else ' in this sample'}: {', '.join(unreachable)}")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Show how often each fairy type wins across answer combinations.")
+    parser.add_argument("--samples", type=int, help="Score this many random combinations instead of enumerating them all.")
+    parser.add_argument("--max-exhaustive", type=int, default=DEFAULT_MAX_EXHAUSTIVE,
+                        help="Enumerate every combination when there are at most this many (default: %(default)s).")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--seed", type=int)
+    parser.add_argument("--pack", help="Analyze this quiz pack (.json/.toml) instead of the bot's current one.")
+    args = parser.parse_args()
+
+    if args.pack:
+        from quiz_pack import load_pack
+        quiz = load_pack(args.pack).quiz
+    else:
+        # The built-in quiz content lives in bot.py, which reads its configuration on import
+        os.environ.setdefault("CHANNEL_ID", "0")
+        os.environ.setdefault("SESSION_SNAPSHOT_PATH", "")
+        import bot
+        quiz = bot.packs.current.quiz
+
+    distribution = analyze(quiz.scoring, samples=args.samples, max_exhaustive=args.max_exhaustive,
+                           batch_size=args.batch_size, seed=args.seed)
+    print(format_distribution(distribution))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,147 @@
+import hashlib
+import json
+import os
+import time
+import tomllib
+import weakref
+from collections import deque
+
+from compiled_quiz import CompiledQuiz, compile_quiz
+
+# Quiz content packs.
+#
+# A pack is a JSON or TOML file with the same four pieces bot.py used to
+# define inline: questions, fairy_lore, prefixes and suffixes. Loading
+# validates it, compiles it into the read-only CompiledQuiz form and tags it
+# with a version derived from the content, so reloading an unchanged file is a
+# no-op.
+#
+# Sessions hold a reference to the pack they started with. The registry only
+# keeps the current pack alive itself; older versions stay reachable through
+# a WeakValueDictionary for as long as some session still points at them.
+# Stateless quizzes have no session, so the registry can also hold on to the
+# last few retired versions for them.
+
+MAX_OPTIONS = 10  # The stateless flow encodes each answer as a single digit
+MAX_STATELESS_QUESTIONS = 62  # Gender, realm and one digit per answer have to fit the 64-digit custom_id state
+MAX_LABEL_LENGTH = 80  # Discord's button label limit
+MAX_FIELD_LENGTH = 1024  # Discord's embed field value limit, for the lore text
+
+
+class PackError(ValueError):
+    pass
+
+
+class QuizPack:
+    __slots__ = ("name", "version", "source", "quiz", "loaded_at", "__weakref__")
+
+    def __init__(self, name: str, version: str, source: str, quiz: CompiledQuiz):
+        self.name = name
+        self.version = version
+        self.source = source
+        self.quiz = quiz
+        self.loaded_at = time.time()
+
+
+def _require(condition: bool, message: str):
+    if not condition:
+        raise PackError(message)
+
+
+def _is_str_list(value) -> bool:
+    return isinstance(value, list) and bool(value) and all(isinstance(item, str) and item for item in value)
+
+
+def validate_pack(data, max_questions: int | None = None) -> None:
+    _require(isinstance(data, dict), "pack must be a table/object")
+    questions = data.get("questions")
+    _require(isinstance(questions, list) and questions, "'questions' must be a non-empty list")
+    if max_questions is not None:
+        _require(len(questions) <= max_questions, f"pack has {len(questions)} questions; at most {max_questions} are supported")
+    for n, q_data in enumerate(questions, 1):
+        where = f"question {n}"
+        _require(isinstance(q_data, dict), f"{where} must be a table/object")
+        _require(isinstance(q_data.get("question"), str) and q_data["question"], f"{where} needs a 'question' text")
+        options = q_data.get("options")
+        _require(_is_str_list(options), f"{where} needs a non-empty 'options' list of strings")
+        _require(len(options) <= MAX_OPTIONS, f"{where} has {len(options)} options; at most {MAX_OPTIONS} are supported")
+        for option in options:
+            _require(len(option) <= MAX_LABEL_LENGTH, f"{where} option '{option[:20]}...' is longer than {MAX_LABEL_LENGTH} characters")
+        scores = q_data.get("scores")
+        _require(isinstance(scores, list) and len(scores) == len(options),
+                 f"{where} needs one 'scores' entry per option")
+        for entry in scores:
+            if isinstance(entry, str):
+                _require(bool(entry), f"{where} has an empty fairy type in 'scores'")
+            else:
+                _require(isinstance(entry, dict) and entry and all(
+                    isinstance(k, str) and k and isinstance(v, (int, float)) and not isinstance(v, bool)
+                    for k, v in entry.items()), f"{where} 'scores' entries must be a fairy type or a {{type: weight}} table")
+
+    fairy_lore = data.get("fairy_lore")
+    _require(isinstance(fairy_lore, dict) and fairy_lore, "'fairy_lore' must be a non-empty {type: text} table")
+    for fairy_type, lore in fairy_lore.items():
+        _require(isinstance(lore, str) and lore, f"lore for '{fairy_type}' must be non-empty text")
+        _require(len(lore) + 2 <= MAX_FIELD_LENGTH, f"lore for '{fairy_type}' is longer than {MAX_FIELD_LENGTH - 2} characters")
+    _require(_is_str_list(data.get("prefixes")), "'prefixes' must be a non-empty list of strings")
+    _require(_is_str_list(data.get("suffixes")), "'suffixes' must be a non-empty list of strings")
+
+
+def content_version(data: dict) -> str:
+    canonical = json.dumps({key: data[key] for key in ("questions", "fairy_lore", "prefixes", "suffixes")},
+                           sort_keys=True, ensure_ascii=False, separators=(",", ":"))
+    return hashlib.sha256(canonical.encode()).hexdigest()[:12]
+
+
+def build_pack(data: dict, source: str, name: str | None = None, max_questions: int | None = None) -> QuizPack:
+    validate_pack(data, max_questions)
+    try:
+        quiz = compile_quiz(data["questions"], data["fairy_lore"], data["prefixes"], data["suffixes"])
+    except ValueError as e:
+        raise PackError(str(e)) from e
+    return QuizPack(name or data.get("name") or os.path.basename(source), content_version(data), source, quiz)
+
+
+def load_pack(path: str, max_questions: int | None = None) -> QuizPack:
+    extension = os.path.splitext(path)[1].lower()
+    try:
+        with open(path, "rb") as f:
+            if extension == ".toml":
+                data = tomllib.load(f)
+            elif extension == ".json":
+                data = json.load(f)
+            else:
+                raise PackError(f"unsupported pack format '{extension}' (use .json or .toml)")
+    except (tomllib.TOMLDecodeError, json.JSONDecodeError, UnicodeDecodeError) as e:
+        raise PackError(f"couldn't parse {path}: {e}") from e
+    return build_pack(data, path, max_questions=max_questions)
+
+
+class PackRegistry:
+    def __init__(self, pack: QuizPack, keep_previous: int = 0):
+        self.current = pack
+        self._versions: weakref.WeakValueDictionary[str, QuizPack] = weakref.WeakValueDictionary({pack.version: pack})
+        self._retired: deque[QuizPack] = deque(maxlen=keep_previous)  # Kept alive whether or not a session uses them
+
+    def get(self, version: str) -> QuizPack | None:
+        return self._versions.get(version)
+
+    def find(self, prefix: str) -> QuizPack | None:
+        # Looks a version up by its leading characters, which is all a stateless custom_id has room for
+        for version, pack in list(self._versions.items()):
+            if version.startswith(prefix):
+                return pack
+        return None
+
+    def install(self, pack: QuizPack) -> bool:
+        # Makes `pack` the one new sessions start on; False if that version is already current
+        if pack.version == self.current.version:
+            return False
+        self._versions[pack.version] = pack
+        self._retired.append(self.current)
+        self.current = pack  # A single assignment: every click sees either the old or the new pack
+        return True
+
+    def live_versions(self) -> list[str]:
+        # Versions still referenced by the current pack or by some session
+        return list(self._versions.keys())
@@ -0,0 +1,290 @@
+import asyncio
+import logging
+import sqlite3
+import time
+from collections import Counter, deque
+
+# Completed quiz results and the aggregates behind !fairystats.
+#
+# record() and record_abandoned() only touch memory: the result goes into a
+# buffer and the per-guild aggregates are bumped in place. A background task
+# writes the buffer to SQLite in batches, together with the aggregate deltas,
+# in one transaction. Stats and leaderboard lookups read the in-memory
+# aggregates and never scan the results table; it is only read back on
+# startup, through the aggregate tables. Processes that share one file but not
+# their memory, like HTTP interaction replicas, read a guild's aggregate rows
+# from the file with read_guild() instead.
+
+DEFAULT_FLUSH_INTERVAL = 2.0
+DEFAULT_BATCH_SIZE = 500
+DEFAULT_MAX_BUFFER = 100000  # Oldest unwritten results (and their totals) are dropped past this if SQLite stays unavailable
+LEADERBOARD_SIZE = 10
+NO_GUILD = 0  # Aggregate key for quizzes taken outside a guild
+
+
+class QuizResult:
+    __slots__ = ("user_id", "guild_id", "gender", "realm", "answers", "fairy_type", "started_at", "completed_at")
+
+    def __init__(self, user_id: int, guild_id: int | None, gender: str | None, realm: str | None, answers: bytes,
+                 fairy_type: str, started_at: float | None, completed_at: float):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.gender = gender
+        self.realm = realm
+        self.answers = answers
+        self.fairy_type = fairy_type
+        self.started_at = started_at  # None for stateless quizzes, which keep no start time
+        self.completed_at = completed_at
+
+    def row(self) -> tuple:
+        return (self.user_id, self.guild_id, self.gender, self.realm, self.answers, self.fairy_type,
+                self.started_at, self.completed_at)
+
+
+class GuildStats:
+    __slots__ = ("completed", "type_counts", "abandoned", "user_counts", "top")
+
+    def __init__(self):
+        self.completed = 0
+        self.type_counts: Counter[str] = Counter()
+        self.abandoned: Counter[int] = Counter()  # Quiz step -> sessions dropped there
+        self.user_counts: dict[int, int] = {}
+        self.top: dict[int, int] = {}  # The LEADERBOARD_SIZE users with the most completions
+
+    def add_completion(self, user_id: int, count: int = 1):
+        total = self.user_counts.get(user_id, 0) + count
+        self.user_counts[user_id] = total
+        if user_id in self.top or len(self.top) < LEADERBOARD_SIZE:
+            self.top[user_id] = total
+            return
+        lowest = min(self.top, key=self.top.__getitem__)
+        if total > self.top[lowest]:
+            del self.top[lowest]
+            self.top[user_id] = total
+
+    def funnel(self, step_order: list[int]) -> list[tuple[int, int, int]]:
+        # (step, sessions that reached it, sessions abandoned there) in quiz order
+        rows = []
+        reached = self.completed + sum(self.abandoned.values())
+        for step in step_order:
+            rows.append((step, reached, self.abandoned[step]))
+            reached -= self.abandoned[step]
+        return rows
+
+
+class ResultsStore:
+    def __init__(self, path: str | None, flush_interval: float = DEFAULT_FLUSH_INTERVAL,
+                 batch_size: int = DEFAULT_BATCH_SIZE, max_buffer: int = DEFAULT_MAX_BUFFER):
+        self.path = path
+        self.flush_interval = flush_interval
+        self.batch_size = batch_size
+        self._buffer: deque[tuple] = deque(maxlen=max_buffer)
+        self._type_deltas: Counter[tuple] = Counter()
+        self._abandon_deltas: Counter[tuple] = Counter()
+        self._user_deltas: Counter[tuple] = Counter()
+        self._guilds: dict[int, GuildStats] = {}
+        self._wakeup: asyncio.Event | None = None
+        self._task: asyncio.Task | None = None
+        self.written = 0
+        self.write_errors = 0
+        self.dropped = 0  # Unwritten results pushed out of a full buffer
+        self._schema_ready = False
+
+    def guild(self, guild_id: int | None) -> GuildStats:
+        key = guild_id or NO_GUILD
+        stats = self._guilds.get(key)
+        if stats is None:
+            stats = self._guilds[key] = GuildStats()
+        return stats
+
+    # --- Recording (event loop, no I/O) ---
+
+    def record(self, result: QuizResult):
+        key = result.guild_id or NO_GUILD
+        stats = self.guild(key)
+        stats.completed += 1
+        stats.type_counts[result.fairy_type] += 1
+        stats.add_completion(result.user_id)
+        if self.path:
+            self._type_deltas[(key, result.fairy_type)] += 1
+            self._user_deltas[(key, result.user_id)] += 1
+            if len(self._buffer) == self._buffer.maxlen:
+                self._forget(self._buffer.popleft())
+            self._buffer.append(result.row())
+            if len(self._buffer) >= self.batch_size and self._wakeup is not None:
+                self._wakeup.set()
+
+    def record_abandoned(self, guild_id: int | None, step: int):
+        key = guild_id or NO_GUILD
+        self.guild(key).abandoned[step] += 1
+        if self.path:
+            self._abandon_deltas[(key, step)] += 1
+
+    def pending(self) -> int:
+        return len(self._buffer)
+
+    def _forget(self, row: tuple):
+        # Takes a dropped result back out of the unwritten totals, so the totals tables keep matching quiz_results
+        user_id, guild_id, fairy_type = row[0], row[1] or NO_GUILD, row[5]
+        for deltas, key in ((self._type_deltas, (guild_id, fairy_type)), (self._user_deltas, (guild_id, user_id))):
+            deltas[key] -= 1
+            if deltas[key] <= 0:
+                del deltas[key]
+        self.dropped += 1
+
+    # --- SQLite ---
+
+    def _connect(self) -> sqlite3.Connection:
+        conn = sqlite3.connect(self.path, timeout=5.0)
+        if self._schema_ready:
+            return conn
+        with conn:
+            conn.execute(
+                "CREATE TABLE IF NOT EXISTS quiz_results ("
+                "user_id INTEGER NOT NULL, guild_id INTEGER, gender TEXT, realm TEXT, answers BLOB NOT NULL, "
+                "fairy_type TEXT NOT NULL, started_at REAL, completed_at REAL NOT NULL)"
+            )
+            conn.execute("CREATE TABLE IF NOT EXISTS type_totals ("
+                         "guild_id INTEGER NOT NULL, fairy_type TEXT NOT NULL, n INTEGER NOT NULL, "
+                         "PRIMARY KEY (guild_id, fairy_type))")
+            conn.execute("CREATE TABLE IF NOT EXISTS abandon_totals ("
+                         "guild_id INTEGER NOT NULL, step INTEGER NOT NULL, n INTEGER NOT NULL, "
+                         "PRIMARY KEY (guild_id, step))")
+            conn.execute("CREATE TABLE IF NOT EXISTS user_totals ("
+                         "guild_id INTEGER NOT NULL, user_id INTEGER NOT NULL, n INTEGER NOT NULL, "
+                         "PRIMARY KEY (guild_id, user_id))")
+        self._schema_ready = True
+        return conn
+
+    def load(self) -> int:
+        # Rebuilds the in-memory aggregates; returns the number of completed quizzes on record
+        if not self.path:
+            return 0
+        conn = self._connect()
+        try:
+            type_rows = conn.execute("SELECT guild_id, fairy_type, n FROM type_totals").fetchall()
+            abandon_rows = conn.execute("SELECT guild_id, step, n FROM abandon_totals").fetchall()
+            user_rows = conn.execute("SELECT guild_id, user_id, n FROM user_totals").fetchall()
+        finally:
+            conn.close()
+        total = 0
+        for guild_id, fairy_type, n in type_rows:
+            stats = self.guild(guild_id)
+            stats.type_counts[fairy_type] += n
+            stats.completed += n
+            total += n
+        for guild_id, step, n in abandon_rows:
+            self.guild(guild_id).abandoned[step] += n
+        for guild_id, user_id, n in user_rows:
+            self.guild(guild_id).add_completion(user_id, n)
+        return total
+
+    def read_guild(self, guild_id: int | None) -> GuildStats:
+        # One guild's totals as every process sharing the file has written them; the leaderboard
+        # comes back as `top` only, without the per-user counts behind it
+        key = guild_id or NO_GUILD
+        stats = GuildStats()
+        conn = self._connect()
+        try:
+            type_rows = conn.execute("SELECT fairy_type, n FROM type_totals WHERE guild_id = ?", (key,)).fetchall()
+            abandon_rows = conn.execute("SELECT step, n FROM abandon_totals WHERE guild_id = ?", (key,)).fetchall()
+            top_rows = conn.execute("SELECT user_id, n FROM user_totals WHERE guild_id = ? ORDER BY n DESC LIMIT ?",
+                                    (key, LEADERBOARD_SIZE)).fetchall()
+        finally:
+            conn.close()
+        for fairy_type, n in type_rows:
+            stats.type_counts[fairy_type] += n
+            stats.completed += n
+        for step, n in abandon_rows:
+            stats.abandoned[step] += n
+        stats.top = dict(top_rows)
+        return stats
+
+    def _write(self, rows: list[tuple], type_deltas: Counter, abandon_deltas: Counter, user_deltas: Counter):
+        conn = self._connect()
+        try:
+            with conn:
+                conn.executemany("INSERT INTO quiz_results VALUES (?, ?, ?, ?, ?, ?, ?, ?)", rows)
+                conn.executemany(
+                    "INSERT INTO type_totals VALUES (?, ?, ?) "
+                    "ON CONFLICT(guild_id, fairy_type) DO UPDATE SET n = n + excluded.n",
+                    [(guild_id, fairy_type, n) for (guild_id, fairy_type), n in type_deltas.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO abandon_totals VALUES (?, ?, ?) "
+                    "ON CONFLICT(guild_id, step) DO UPDATE SET n = n + excluded.n",
+                    [(guild_id, step, n) for (guild_id, step), n in abandon_deltas.items()]
+                )
+                conn.executemany(
+                    "INSERT INTO user_totals VALUES (?, ?, ?) "
+                    "ON CONFLICT(guild_id, user_id) DO UPDATE SET n = n + excluded.n",
+                    [(guild_id, user_id, n) for (guild_id, user_id), n in user_deltas.items()]
+                )
+        finally:
+            conn.close()
+
+    def _take(self) -> tuple:
+        # Everything recorded so far; new results keep buffering while a thread writes these
+        rows = list(self._buffer)
+        self._buffer.clear()
+        deltas = (self._type_deltas, self._abandon_deltas, self._user_deltas)
+        self._type_deltas, self._abandon_deltas, self._user_deltas = Counter(), Counter(), Counter()
+        return rows, deltas
+
+    def _restore(self, rows: list[tuple], deltas: tuple):
+        # Puts a failed batch back in front of anything recorded meanwhile, to retry next round
+        self.write_errors += 1
+        room = self._buffer.maxlen - len(self._buffer)
+        if len(rows) > room:
+            # extendleft on a full deque would push out the newest results; drop the oldest instead
+            logging.warning(f"Results buffer full ({self._buffer.maxlen}); dropped the {len(rows) - room} oldest unwritten results")
+            dropped, rows = rows[:len(rows) - room], rows[len(rows) - room:]
+        else:
+            dropped = []
+        self._buffer.extendleft(reversed(rows))
+        self._type_deltas.update(deltas[0])
+        self._abandon_deltas.update(deltas[1])
+        self._user_deltas.update(deltas[2])
+        for row in dropped:
+            self._forget(row)
+
+    async def flush(self) -> int:
+        if not self.path or not (self._buffer or self._abandon_deltas):
+            return 0
+        rows, deltas = self._take()
+        try:
+            await asyncio.to_thread(self._write, rows, *deltas)
+        except Exception as e:
+            logging.error(f"Failed to write {len(rows)} quiz results to {self.path}: {e}")
+            self._restore(rows, deltas)
+            return 0
+        self.written += len(rows)
+        return len(rows)
+
+    def flush_sync(self) -> int:
+        # For shutdown, after the event loop has stopped; errors are left to the caller
+        if not self.path or not (self._buffer or self._abandon_deltas):
+            return 0
+        rows, deltas = self._take()
+        self._write(rows, *deltas)
+        self.written += len(rows)
+        return len(rows)
+
+    # --- Background writer ---
+
+    def start(self):
+        if self.path and self._task is None:
+            self._wakeup = asyncio.Event()
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout=self.flush_interval)
+            except asyncio.TimeoutError:
+                pass
+            self._wakeup.clear()
+            started = time.perf_counter()
+            written = await self.flush()
+            if written >= self.batch_size:
+                logging.info(f"Wrote {written} quiz results in {(time.perf_counter() - started) * 1000:.0f}ms")
@@ -0,0 +1,73 @@
+from typing import Mapping, Sequence
+
+import numpy as np
+
+# Weighted quiz scoring.
+#
+# Every answer option maps to one or more fairy types with a weight. The weights
+# are flattened into a read-only (total options x fairy types) matrix, so scoring
+# a quiz is a row gather plus a sum, and the analyzer can score whole batches of
+# answer combinations at once.
+#
+# Tie-break rule: when several types share the highest total, the type that comes
+# first in `fairy_types` wins (fairy_lore order, then order of first appearance
+# in the questions). Reorder fairy_lore to change who wins ties.
+
+TIE_DECIMALS = 9  # Totals are rounded before comparing so float noise can't break ties
+
+
+def option_weights(entry: str | Mapping[str, float]) -> dict[str, float]:
+    # A plain fairy type scores 1 for that type; a mapping gives weights per type
+    if isinstance(entry, str):
+        return {entry: 1.0}
+    weights = {fairy_type: float(weight) for fairy_type, weight in entry.items()}
+    if not weights:
+        raise ValueError("An option must score at least one fairy type")
+    return weights
+
+
+class ScoringEngine:
+    def __init__(self, fairy_types: Sequence[str], question_weights: Sequence[Sequence[Mapping[str, float]]]):
+        self.fairy_types = tuple(fairy_types)
+        type_index = {fairy_type: i for i, fairy_type in enumerate(self.fairy_types)}
+
+        self.option_counts = np.array([len(options) for options in question_weights], dtype=np.int64)
+        self.offsets = np.concatenate(([0], np.cumsum(self.option_counts)[:-1])).astype(np.int64)
+
+        matrix = np.zeros((int(self.option_counts.sum()), len(self.fairy_types)), dtype=np.float64)
+        for q_index, options in enumerate(question_weights):
+            for o_index, weights in enumerate(options):
+                row = self.offsets[q_index] + o_index
+                for fairy_type, weight in weights.items():
+                    matrix[row, type_index[fairy_type]] += weight
+        matrix.setflags(write=False)
+        self.matrix = matrix
+
+    @property
+    def question_count(self) -> int:
+        return len(self.option_counts)
+
+    def totals(self, answers: Sequence[int]) -> np.ndarray:
+        rows = self.offsets[:len(answers)] + np.asarray(answers, dtype=np.int64)
+        return self.matrix[rows].sum(axis=0)
+
+    def result(self, answers: Sequence[int]) -> str | None:
+        if not len(answers):
+            return None
+        return self.fairy_types[int(np.argmax(np.round(self.totals(answers), TIE_DECIMALS)))]
+
+    def batch_totals(self, answer_matrix: np.ndarray) -> np.ndarray:
+        # answer_matrix is (combinations, questions) of option indexes -> (combinations, types)
+        totals = np.zeros((answer_matrix.shape[0], len(self.fairy_types)), dtype=np.float64)
+        for q_index in range(answer_matrix.shape[1]):
+            # One gather per question keeps memory at O(batch x types) instead of O(batch x questions x types)
+            totals += self.matrix[self.offsets[q_index] + answer_matrix[:, q_index]]
+        return np.round(totals, TIE_DECIMALS, out=totals)
+
+    def batch_results(self, answer_matrix: np.ndarray) -> tuple[np.ndarray, np.ndarray]:
+        # Returns (winning type index, whether the win came from a tie-break) per combination
+        totals = self.batch_totals(answer_matrix)
+        winners = np.argmax(totals, axis=1)
+        best = totals[np.arange(totals.shape[0]), winners]
+        tied = (totals == best[:, None]).sum(axis=1) > 1
+        return winners, tied
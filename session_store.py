@@ -0,0 +1,192 @@
+import logging
+import sqlite3
+import sys
+import time
+from collections import OrderedDict
+
+# Session store for the in-memory quiz flow.
+#
+# Sessions are kept in an OrderedDict in least-recently-touched order, so TTL
+# eviction only has to look at the front and the hard cap drops the most stale
+# entry first. Snapshots go to a local SQLite file so quizzes survive restarts,
+# and a draining process hands its sessions to the next one through the same file.
+
+DEFAULT_MAX_SESSIONS = 50000
+DEFAULT_TTL_SECONDS = 900
+
+
+class QuizSession:
+    __slots__ = ("user_id", "guild_id", "pack", "step", "gender", "realm", "answers", "started_at", "touched_at", "restored",
+                 "rest_calls", "message_id", "channel_id")
+
+    def __init__(self, user_id: int, step: int, started_at: float, guild_id: int | None = None, pack=None):
+        self.user_id = user_id
+        self.guild_id = guild_id
+        self.pack = pack  # Quiz pack the session is pinned to; keeps that version alive until the session ends
+        self.step = step
+        self.gender: str | None = None
+        self.realm: str | None = None
+        self.answers = bytearray()  # One option index per answered question
+        self.started_at = started_at
+        self.touched_at = started_at
+        self.restored = False
+        self.rest_calls = 0  # REST calls made on behalf of this quiz
+        self.message_id: int | None = None  # Channel message holding the live question's buttons, if it isn't ephemeral
+        self.channel_id: int | None = None  # Channel that message was posted in
+
+    def size_bytes(self) -> int:
+        # gender/realm point at shared option strings, so only the record and its answers count
+        return sys.getsizeof(self) + sys.getsizeof(self.answers)
+
+
+class SessionStore:
+    def __init__(self, max_sessions: int = DEFAULT_MAX_SESSIONS, ttl: float = DEFAULT_TTL_SECONDS,
+                 snapshot_path: str | None = None, on_evict=None):
+        self.max_sessions = max_sessions
+        self.ttl = ttl
+        self.snapshot_path = snapshot_path
+        self.on_evict = on_evict  # Called with each session dropped for inactivity or to make room
+        self._sessions: OrderedDict[int, QuizSession] = OrderedDict()
+
+    def __len__(self) -> int:
+        return len(self._sessions)
+
+    def __contains__(self, user_id: int) -> bool:
+        return self.get(user_id, touch=False) is not None
+
+    def _evicted(self, session: QuizSession):
+        if self.on_evict is not None:
+            self.on_evict(session)
+
+    def start(self, user_id: int, step: int, guild_id: int | None = None, pack=None) -> QuizSession:
+        now = time.time()
+        self._sessions.pop(user_id, None)
+        session = QuizSession(user_id, step, now, guild_id, pack)
+        self._sessions[user_id] = session
+        while len(self._sessions) > self.max_sessions:
+            evicted_id, evicted = self._sessions.popitem(last=False)
+            logging.warning(f"Session store full ({self.max_sessions}); evicted session for user {evicted_id}")
+            self._evicted(evicted)
+        return session
+
+    def get(self, user_id: int, touch: bool = True) -> QuizSession | None:
+        session = self._sessions.get(user_id)
+        if session is None:
+            return None
+        now = time.time()
+        if now - session.touched_at > self.ttl:
+            del self._sessions[user_id]
+            self._evicted(session)
+            return None
+        if touch:
+            session.touched_at = now
+            self._sessions.move_to_end(user_id)
+        return session
+
+    def pop(self, user_id: int) -> QuizSession | None:
+        return self._sessions.pop(user_id, None)
+
+    def evict_expired(self) -> int:
+        cutoff = time.time() - self.ttl
+        evicted = 0
+        while self._sessions:
+            user_id, session = next(iter(self._sessions.items()))
+            if session.touched_at > cutoff:
+                break
+            del self._sessions[user_id]
+            self._evicted(session)
+            evicted += 1
+        return evicted
+
+    def restored_sessions(self) -> list[QuizSession]:
+        # Sessions loaded from a snapshot that nobody has clicked on since
+        return [session for session in self._sessions.values() if session.restored]
+
+    def count_by_step(self) -> dict[int, int]:
+        counts: dict[int, int] = {}
+        for session in self._sessions.values():
+            counts[session.step] = counts.get(session.step, 0) + 1
+        return counts
+
+    def memory_usage(self) -> tuple[int, float]:
+        # Returns (total bytes, bytes per session), including the dict slot for each entry
+        if not self._sessions:
+            return sys.getsizeof(self._sessions), 0.0
+        record_bytes = sum(session.size_bytes() for session in self._sessions.values())
+        total = sys.getsizeof(self._sessions) + record_bytes
+        return total, total / len(self._sessions)
+
+    # --- Snapshots ---
+
+    def snapshot_rows(self) -> list[tuple]:
+        # Copied on the event loop so write_snapshot can run in a worker thread
+        return [
+            (s.user_id, s.guild_id, s.pack.version if s.pack is not None else None, s.step, s.gender, s.realm,
+             bytes(s.answers), s.started_at, s.touched_at, s.message_id, s.channel_id)
+            for s in self._sessions.values()
+        ]
+
+    def write_snapshot(self, rows: list[tuple] | None = None) -> int:
+        if not self.snapshot_path:
+            return 0
+        if rows is None:
+            rows = self.snapshot_rows()
+        conn = sqlite3.connect(self.snapshot_path)
+        try:
+            with conn:
+                # Every snapshot is a full rewrite, so the table is recreated in the current layout
+                conn.execute("DROP TABLE IF EXISTS sessions")
+                conn.execute(
+                    "CREATE TABLE sessions ("
+                    "user_id INTEGER PRIMARY KEY, guild_id INTEGER, pack_version TEXT, step INTEGER NOT NULL, gender TEXT, "
+                    "realm TEXT, answers BLOB NOT NULL, started_at REAL NOT NULL, touched_at REAL NOT NULL, message_id INTEGER, "
+                    "channel_id INTEGER)"
+                )
+                conn.executemany("INSERT INTO sessions VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)", rows)
+        finally:
+            conn.close()
+        return len(rows)
+
+    def load_snapshot(self, resolve_pack=None) -> int:
+        # resolve_pack maps a stored pack version to a loaded pack; sessions whose version
+        # isn't available any more are dropped, since their answers index different questions
+        if not self.snapshot_path:
+            return 0
+        conn = sqlite3.connect(self.snapshot_path)
+        try:
+            # Snapshots from before message_id/channel_id were stored still load, without them
+            columns = {row[1] for row in conn.execute("PRAGMA table_info(sessions)")}
+            message_column = "message_id" if "message_id" in columns else "NULL"
+            channel_column = "channel_id" if "channel_id" in columns else "NULL"
+            rows = conn.execute(
+                "SELECT user_id, guild_id, pack_version, step, gender, realm, answers, started_at, touched_at, "
+                f"{message_column}, {channel_column} FROM sessions ORDER BY touched_at"
+            ).fetchall()
+        except sqlite3.OperationalError:
+            return 0  # No snapshot written yet, or one in an older layout
+        finally:
+            conn.close()
+
+        cutoff = time.time() - self.ttl
+        loaded = 0
+        for user_id, guild_id, pack_version, step, gender, realm, answers, started_at, touched_at, message_id, channel_id in rows:
+            if touched_at <= cutoff or user_id in self._sessions:
+                continue
+            pack = None
+            if resolve_pack is not None:
+                pack = resolve_pack(pack_version)
+                if pack is None:
+                    continue
+            session = QuizSession(user_id, step, started_at, guild_id, pack)
+            session.gender = sys.intern(gender) if gender else None
+            session.realm = sys.intern(realm) if realm else None
+            session.answers = bytearray(answers)
+            session.touched_at = touched_at
+            session.message_id = message_id
+            session.channel_id = channel_id
+            session.restored = True
+            self._sessions[user_id] = session
+            loaded += 1
+        while len(self._sessions) > self.max_sessions:
+            self._sessions.popitem(last=False)
+        return loaded
@@ -0,0 +1,120 @@
+import asyncio
+import contextlib
+import time
+from collections import OrderedDict
+from typing import Callable
+
+# Per-user serialization and interaction dedupe for the quiz handlers.
+#
+# A quiz step reads the session, answers the interaction and only then moves
+# the session on, with REST calls in between. Two fast clicks from the same
+# user could both pass the step check and both advance the quiz. hold() gives
+# each user one lock, so their clicks run one after another and the second
+# sees the step the first left behind. Locks exist only while someone holds
+# or waits on them, so idle users cost nothing.
+#
+# seen() remembers recently handled interaction IDs for `dedupe_ttl` seconds,
+# so an interaction delivered twice (a gateway replay or an HTTP retry) is
+# only handled once. Stateless quizzes have no session step to check, so two
+# real clicks on the same button would both go through the lock. Once a click's
+# response has gone out, mark_handled() remembers the state it produced for the
+# same TTL and handled() checks it, so a click whose response failed can still
+# be retried. forget() clears them when the user starts a new quiz.
+#
+# Since every click holds its user's lock while it runs, wait_idle() doubles as
+# the "in-flight handlers have finished" check for a draining process.
+
+DEFAULT_DEDUPE_TTL = 60.0
+DEFAULT_DEDUPE_MAX = 100_000
+
+
+class _UserLock:
+    __slots__ = ("lock", "holders")
+
+    def __init__(self):
+        self.lock = asyncio.Lock()
+        self.holders = 0  # Tasks holding or waiting on the lock
+
+
+class UserGuard:
+    def __init__(self, dedupe_ttl: float = DEFAULT_DEDUPE_TTL, dedupe_max: int = DEFAULT_DEDUPE_MAX,
+                 clock: Callable[[], float] = time.monotonic):
+        self.dedupe_ttl = dedupe_ttl
+        self.dedupe_max = dedupe_max
+        self.clock = clock
+        self._locks: dict[int, _UserLock] = {}
+        self._seen: OrderedDict[int, float] = OrderedDict()  # Interaction ID -> when it arrived, oldest first
+        self._handled: OrderedDict[int, tuple[float, set]] = OrderedDict()  # User ID -> (last click, states), oldest first
+        self._idle = asyncio.Event()  # Set while no user holds or waits on a lock
+        self._idle.set()
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+    def seen(self, interaction_id: int) -> bool:
+        # Records the interaction; True if it was already handled within the TTL
+        now = self.clock()
+        cutoff = now - self.dedupe_ttl
+        while self._seen:
+            oldest_id, arrived = next(iter(self._seen.items()))
+            if arrived > cutoff and len(self._seen) < self.dedupe_max:
+                break
+            del self._seen[oldest_id]
+        if interaction_id in self._seen:
+            return True
+        self._seen[interaction_id] = now
+        return False
+
+    def _prune_handled(self, now: float):
+        cutoff = now - self.dedupe_ttl
+        while self._handled:
+            oldest_id, (last_click, _) = next(iter(self._handled.items()))
+            if last_click > cutoff and len(self._handled) < self.dedupe_max:
+                break
+            del self._handled[oldest_id]
+
+    def handled(self, user_id: int, state) -> bool:
+        # True if the stateless quiz state was marked handled for the user within the TTL
+        self._prune_handled(self.clock())
+        entry = self._handled.get(user_id)
+        return entry is not None and state in entry[1]
+
+    def mark_handled(self, user_id: int, state):
+        now = self.clock()
+        self._prune_handled(now)
+        entry = self._handled.pop(user_id, None)
+        states = entry[1] if entry is not None else set()
+        states.add(state)
+        self._handled[user_id] = (now, states)
+
+    def forget(self, user_id: int):
+        self._handled.pop(user_id, None)
+
+    def busy(self, user_id: int) -> bool:
+        # True while another click from this user is being handled or waiting
+        return user_id in self._locks
+
+    async def wait_idle(self, timeout: float | None = None) -> bool:
+        # Waits until no click is being handled or waiting; False if the timeout hit first
+        try:
+            await asyncio.wait_for(self._idle.wait(), timeout)
+        except asyncio.TimeoutError:
+            return False
+        return True
+
+    @contextlib.asynccontextmanager
+    async def hold(self, user_id: int):
+        entry = self._locks.get(user_id)
+        if entry is None:
+            entry = self._locks[user_id] = _UserLock()
+            self._idle.clear()
+        entry.holders += 1
+        try:
+            async with entry.lock:
+                yield
+        finally:
+            entry.holders -= 1
+            if not entry.holders:
+                del self._locks[user_id]
+                if not self._locks:
+                    self._idle.set()